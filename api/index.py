@@ -3,20 +3,29 @@ Vercel entry point - FastAPI app cho Vercel
 Lazy load services để tránh lỗi khi import
 """
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
-import json
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
 import hmac
 import hashlib
 import os
+import threading
 
 # Import từ root (Vercel tự động thêm root vào PYTHONPATH)
-from config import ZALO_SECRET_KEY, validate_config
+from utils.metrics import metrics
+from utils.logger import get_logger, debug_sampled, annotate, request_log
+from config import (
+    ZALO_SECRET_KEY, validate_config, BULK_IMPORT_MAX_LINES,
+    WEBHOOK_ASYNC_ENABLED, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, SHEETS_ASYNC_WORKERS,
+    WEBHOOK_DEDUP_ENABLED, WEBHOOK_DEDUP_MAX_SIZE, WEBHOOK_DEDUP_TTL_SECONDS, WEBHOOK_DEDUP_DB_PATH
+)
+
+logger = get_logger('webhook')
 
 # Validate config khi khởi tạo
 try:
     validate_config()
 except ValueError as e:
-    print(f"⚠️  Config validation warning: {e}")
+    logger.warning("Config validation warning: %s", e)
     # Không raise để tránh fail build, nhưng sẽ fail khi runtime
 
 # Khởi tạo FastAPI app
@@ -24,34 +33,93 @@ app = FastAPI(title="Bot Chi Tieu", description="Zalo Bot for expense tracking")
 
 # Lazy load services (chỉ khởi tạo khi cần)
 _sheets_service = None
+_async_sheets_service = None
 _zalo_service = None
+_async_zalo_service = None
+_webhook_worker = None
+_dedup_cache = None
+# Getter được gọi từ nhiều thread (BackgroundWorker, thread pool Sheets): khóa để chỉ khởi tạo 1 lần.
+# Khóa riêng cho Sheets vì khởi tạo có gọi mạng, không chặn các service khác
+_sheets_lock = threading.Lock()
+_zalo_lock = threading.Lock()
+_init_lock = threading.Lock()
 
 def get_sheets_service():
-    """Lazy load Google Sheets service"""
+    """Lazy load nơi lưu giao dịch (Google Sheets hoặc engine cục bộ theo STORAGE_BACKEND)"""
     global _sheets_service
     if _sheets_service is None:
-        from services.google_sheets import GoogleSheetsService
-        _sheets_service = GoogleSheetsService()
+        with _sheets_lock:
+            if _sheets_service is None:
+                from services.storage import create_storage
+                _sheets_service = create_storage()
     return _sheets_service
 
+def get_async_sheets_service():
+    """Lazy load client Sheets async (thread pool riêng, GoogleSheetsService khởi tạo trong pool)"""
+    global _async_sheets_service
+    if _async_sheets_service is None:
+        with _init_lock:
+            if _async_sheets_service is None:
+                from services.google_sheets_async import AsyncSheetsService
+                _async_sheets_service = AsyncSheetsService(get_sheets_service, max_workers=SHEETS_ASYNC_WORKERS)
+    return _async_sheets_service
+
 def get_zalo_service():
     """Lazy load Zalo service"""
     global _zalo_service
     if _zalo_service is None:
-        from services.zalo_bot import ZaloBotService
-        _zalo_service = ZaloBotService()
+        with _zalo_lock:
+            if _zalo_service is None:
+                from services.zalo_bot import ZaloBotService
+                _zalo_service = ZaloBotService()
     return _zalo_service
 
+def get_async_zalo_service():
+    """Lazy load Zalo client async (None nếu chưa cài httpx)"""
+    global _async_zalo_service
+    if _async_zalo_service is None:
+        from services.zalo_bot_async import AsyncZaloBotService, HTTPX_AVAILABLE
+        if not HTTPX_AVAILABLE:
+            return None
+        with _zalo_lock:
+            if _async_zalo_service is None:
+                _async_zalo_service = AsyncZaloBotService()
+    return _async_zalo_service
+
+def get_webhook_worker():
+    """Lazy load background worker (chỉ dùng khi WEBHOOK_ASYNC_ENABLED)"""
+    global _webhook_worker
+    if _webhook_worker is None:
+        with _init_lock:
+            if _webhook_worker is None:
+                from services.background_worker import BackgroundWorker
+                _webhook_worker = BackgroundWorker(num_workers=WEBHOOK_WORKERS, max_queue=WEBHOOK_QUEUE_SIZE)
+    return _webhook_worker
+
+def get_dedup_cache():
+    """Lazy load cache chống xử lý trùng sự kiện webhook"""
+    global _dedup_cache
+    if _dedup_cache is None:
+        with _init_lock:
+            if _dedup_cache is None:
+                from services.dedup_cache import DedupCache
+                _dedup_cache = DedupCache(
+                    max_size=WEBHOOK_DEDUP_MAX_SIZE,
+                    ttl=WEBHOOK_DEDUP_TTL_SECONDS,
+                    db_path=WEBHOOK_DEDUP_DB_PATH or None
+                )
+    return _dedup_cache
+
 def verify_zalo_signature(data: bytes, signature: str) -> bool:
     """Xác thực signature từ Zalo"""
     # Nếu không có secret key, bỏ qua verification (tạm thời để test)
     if not ZALO_SECRET_KEY or ZALO_SECRET_KEY.strip() == '':
-        print("⚠️  Warning: ZALO_SECRET_KEY not set - skipping verification (for testing)")
+        debug_sampled(logger, "ZALO_SECRET_KEY not set - skipping verification (for testing)")
         # Tạm thời cho phép pass để test, sau đó nên set secret key
         return True
     
     if not signature:
-        print("⚠️  Warning: No signature in request header")
+        logger.warning("No signature in request header")
         # Nếu không có signature và không có secret key, cho phép pass để test
         return True
     
@@ -63,30 +131,62 @@ def verify_zalo_signature(data: bytes, signature: str) -> bool:
         ).hexdigest()
         is_valid = hmac.compare_digest(signature, expected_signature)
         if not is_valid:
-            print(f"❌ Signature mismatch. Expected: {expected_signature[:20]}..., Got: {signature[:20]}...")
+            logger.warning("Signature mismatch")
         return is_valid
     except Exception as e:
-        print(f"Error verifying signature: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error verifying signature: %s", e)
         # Tạm thời cho phép pass để test
         return True
 
+def format_statistics(stats: dict, month: int = None, year: int = None, period: str = None) -> str:
+    """Dựng nội dung phản hồi cho lệnh thống kê (period: mô tả khoảng ngày, ưu tiên hơn month/year)"""
+    total_thu = stats.get('total_thu', 0)
+    total_chi = stats.get('total_chi', 0)
+    chenh_lech = total_thu - total_chi
+    
+    response = f"📊 THỐNG KÊ THU CHI"
+    if period:
+        response += f" - {period}\n\n"
+    elif month and year:
+        response += f" - {month}/{year}\n\n"
+    elif year:
+        response += f" - Năm {year}\n\n"
+    else:
+        response += "\n\n"
+    
+    response += f"💰 Tổng Thu: {total_thu:,.0f} VNĐ\n"
+    response += f"💸 Tổng Chi: {total_chi:,.0f} VNĐ\n"
+    response += f"📈 Chênh lệch: {chenh_lech:,.0f} VNĐ\n"
+    response += f"📝 Số giao dịch: {stats.get('so_luong', 0)}\n\n"
+    
+    danh_muc_stats = stats.get('danh_muc_stats', {})
+    if danh_muc_stats:
+        response += "📋 Theo danh mục:\n"
+        for danh_muc, data in sorted(danh_muc_stats.items(), 
+                                    key=lambda x: x[1]['Thu'] + x[1]['Chi'], 
+                                    reverse=True)[:5]:
+            thu = data.get('Thu', 0)
+            chi = data.get('Chi', 0)
+            if thu > 0 or chi > 0:
+                response += f"• {danh_muc}: Thu {thu:,.0f} | Chi {chi:,.0f}\n"
+    else:
+        response += "📋 Chưa có dữ liệu theo danh mục\n"
+    
+    return response
+
 def handle_statistics_command(user_id: str, message: str) -> str:
     """Xử lý lệnh thống kê"""
     try:
         import re
-        print(f"📊 Processing statistics - user_id: {user_id}, message: {message}")
+        logger.debug("Processing statistics - user_id: %s, message: %s", user_id, message)
         
         # Khởi tạo service
         try:
             sheets_service = get_sheets_service()
-            print("✅ Google Sheets service initialized")
+            logger.debug("Google Sheets service initialized")
         except Exception as e:
             error_msg = str(e)
-            print(f"❌ Error initializing Google Sheets: {error_msg}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error initializing Google Sheets: %s", error_msg)
             # Trả về thông báo lỗi cụ thể
             if "credentials" in error_msg.lower() or "credential" in error_msg.lower():
                 return "❌ Lỗi: Google Credentials không hợp lệ. Kiểm tra GOOGLE_CREDENTIALS_BASE64"
@@ -95,6 +195,21 @@ def handle_statistics_command(user_id: str, message: str) -> str:
             else:
                 return f"❌ Lỗi kết nối Google Sheets: {error_msg[:100]}"
         
+        # Khoảng ngày: 'tuần này', '7 ngày qua', 'từ 01/03 đến 15/03' (tra bằng date index)
+        from services.date_range import parse_date_range
+        date_range = parse_date_range(message)
+        if date_range:
+            logger.debug("Getting range statistics - start: %s, end: %s", date_range.start, date_range.end)
+            try:
+                stats, response = sheets_service.get_range_statistics_report(
+                    user_id, date_range.start, date_range.end,
+                    lambda stats: format_statistics(stats, period=date_range.describe())
+                )
+            except Exception as e:
+                logger.exception("Error getting statistics: %s", e)
+                return f"❌ Lỗi khi lấy thống kê: {str(e)[:100]}"
+            return response
+        
         month = None
         year = None
         
@@ -110,65 +225,33 @@ def handle_statistics_command(user_id: str, message: str) -> str:
         if year_match:
             year = int(year_match.group(1))
         
-        print(f"📊 Getting statistics - month: {month}, year: {year}")
+        logger.debug("Getting statistics - month: %s, year: %s", month, year)
         
-        # Lấy thống kê
+        # Lấy thống kê (báo cáo đã render được cache, hỏi lại không cần gọi Google Sheets)
         try:
-            stats = sheets_service.get_statistics(user_id=user_id, month=month, year=year)
-            print(f"✅ Statistics retrieved: {stats.get('so_luong', 0)} transactions")
+            stats, response = sheets_service.get_statistics_report(
+                user_id, month, year, lambda stats: format_statistics(stats, month, year)
+            )
+            logger.debug("Statistics retrieved: %s transactions", stats.get('so_luong', 0))
         except Exception as e:
             error_msg = str(e)
-            print(f"❌ Error getting statistics: {error_msg}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error getting statistics: %s", error_msg)
             return f"❌ Lỗi khi lấy thống kê: {error_msg[:100]}"
         
-        total_thu = stats.get('total_thu', 0)
-        total_chi = stats.get('total_chi', 0)
-        chenh_lech = total_thu - total_chi
-        
-        response = f"📊 THỐNG KÊ THU CHI"
-        if month and year:
-            response += f" - {month}/{year}\n\n"
-        elif year:
-            response += f" - Năm {year}\n\n"
-        else:
-            response += "\n\n"
-        
-        response += f"💰 Tổng Thu: {total_thu:,.0f} VNĐ\n"
-        response += f"💸 Tổng Chi: {total_chi:,.0f} VNĐ\n"
-        response += f"📈 Chênh lệch: {chenh_lech:,.0f} VNĐ\n"
-        response += f"📝 Số giao dịch: {stats.get('so_luong', 0)}\n\n"
-        
-        danh_muc_stats = stats.get('danh_muc_stats', {})
-        if danh_muc_stats:
-            response += "📋 Theo danh mục:\n"
-            for danh_muc, data in sorted(danh_muc_stats.items(), 
-                                        key=lambda x: x[1]['Thu'] + x[1]['Chi'], 
-                                        reverse=True)[:5]:
-                thu = data.get('Thu', 0)
-                chi = data.get('Chi', 0)
-                if thu > 0 or chi > 0:
-                    response += f"• {danh_muc}: Thu {thu:,.0f} | Chi {chi:,.0f}\n"
-        else:
-            response += "📋 Chưa có dữ liệu theo danh mục\n"
-        
         return response
     except Exception as e:
-        print(f"❌ Error handling statistics: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error handling statistics: %s", e)
         return f"❌ Có lỗi xảy ra: {str(e)[:100]}"
 
 def handle_transaction(user_id: str, message: str) -> str:
     """Xử lý giao dịch thu chi"""
     try:
         sheets_service = get_sheets_service()
-        categories = sheets_service.get_categories()
-        
-        from services.nlp_processor import NLPProcessor
-        nlp_processor = NLPProcessor(categories=categories)
-        transaction = nlp_processor.process(message)
+        # NLPProcessor dựng sẵn theo version danh mục (không đọc sheet mỗi tin nhắn)
+        nlp_processor = sheets_service.get_nlp_processor()
+        categories = nlp_processor.categories
+        with metrics.stage('nlp'):
+            transaction = nlp_processor.process(message)
         
         if not transaction.get('is_valid'):
             return (
@@ -192,33 +275,102 @@ def handle_transaction(user_id: str, message: str) -> str:
         else:
             return "❌ Có lỗi xảy ra khi ghi dữ liệu. Vui lòng thử lại sau."
     except Exception as e:
-        print(f"Error handling transaction: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error handling transaction: %s", e)
         return "❌ Có lỗi xảy ra. Vui lòng thử lại sau."
 
+def handle_bulk_import(user_id: str, message: str) -> str:
+    """Nhập nhiều giao dịch trong 1 tin nhắn (mỗi dòng 1 giao dịch hoặc CSV), ghi bằng 1 lần append_rows"""
+    try:
+        from services.bulk_import import parse_bulk_message, format_bulk_summary
+        sheets_service = get_sheets_service()
+        with metrics.stage('nlp'):
+            result = parse_bulk_message(sheets_service.get_nlp_processor(), message, BULK_IMPORT_MAX_LINES)
+        saved = sheets_service.add_transactions(
+            [line.transaction for line in result.accepted], user_id=user_id
+        )
+        annotate(bulk_accepted=len(result.accepted), bulk_rejected=len(result.rejected))
+        return format_bulk_summary(result, saved)
+    except Exception as e:
+        logger.exception("Error handling bulk import: %s", e)
+        return "❌ Có lỗi xảy ra. Vui lòng thử lại sau."
+
+def build_response_message(user_id: str, message_text: str) -> str:
+    """Xử lý 1 tin nhắn (nhập hàng loạt, thống kê hoặc giao dịch) và trả về nội dung phản hồi"""
+    from services.bulk_import import is_bulk_message, is_statistics_command
+    # Kiểm tra lệnh thống kê trước: lệnh viết nhiều dòng không phải nhập hàng loạt
+    if is_statistics_command(message_text):
+        annotate(command='statistics')
+        with metrics.stage('statistics'):
+            return handle_statistics_command(user_id, message_text)
+    if is_bulk_message(message_text):
+        annotate(command='bulk_import')
+        with metrics.stage('transaction'):
+            return handle_bulk_import(user_id, message_text)
+    annotate(command='transaction')
+    with metrics.stage('transaction'):
+        return handle_transaction(user_id, message_text)
+
+def process_message(user_id: str, message_text: str):
+    """Xử lý 1 tin nhắn và gửi phản hồi về Zalo (đồng bộ, dùng trong background worker)"""
+    response_message = build_response_message(user_id, message_text)
+    
+    if response_message:
+        debug_sampled(logger, "Sending response: %.100s", response_message)
+        zalo_service = get_zalo_service()
+        success = zalo_service.send_text_message(user_id, response_message)
+        if success:
+            annotate(reply_sent=True)
+        else:
+            logger.warning("Failed to send message to user %s", user_id)
+    else:
+        logger.warning("No response message to send")
+
+async def send_reply(user_id: str, response_message: str):
+    """Gửi phản hồi từ handler async mà không chặn event loop"""
+    if not response_message:
+        logger.warning("No response message to send")
+        return
+    debug_sampled(logger, "Sending response: %.100s", response_message)
+    async_zalo_service = get_async_zalo_service()
+    if async_zalo_service is not None:
+        success = await async_zalo_service.send_text_message(user_id, response_message)
+    else:
+        # Chưa cài httpx: chạy client sync trong thread pool
+        loop = asyncio.get_running_loop()
+        success = await loop.run_in_executor(
+            None, get_zalo_service().send_text_message, user_id, response_message
+        )
+    if success:
+        annotate(reply_sent=True)
+    else:
+        logger.warning("Failed to send message to user %s", user_id)
+
 @app.post('/webhook')
 async def webhook(request: Request):
     """Webhook endpoint cho Zalo Bot"""
+    metrics.inc('webhook_requests_total')
+    # 1 dòng log JSON cho mỗi request: request_id, thời gian từng stage, kết quả
+    with request_log(logger, request_id=request.headers.get('X-Request-ID'), route='/webhook'):
+        with metrics.stage('webhook_total'):
+            return await _handle_webhook(request)
+
+async def _handle_webhook(request: Request):
+    """Xử lý webhook (tách riêng để đo tổng thời gian)"""
     try:
-        # Log tất cả headers để debug
-        print(f"📥 Headers: {dict(request.headers)}")
-        
         # Đọc raw body để verify signature
         raw_data = await request.body()
         signature = request.headers.get('X-Zalo-Signature', '')
         
-        print(f"📥 Signature from header: {signature}")
-        print(f"📥 Raw data length: {len(raw_data)}")
+        debug_sampled(logger, "Webhook body: %d bytes", len(raw_data))
         
-        if not verify_zalo_signature(raw_data, signature):
-            print("❌ Signature verification failed")
+        with metrics.stage('verify_signature'):
+            signature_ok = verify_zalo_signature(raw_data, signature)
+        if not signature_ok:
+            logger.warning("Signature verification failed")
             raise HTTPException(status_code=401, detail='Invalid signature')
         
-        print("✅ Signature verified")
-        
         data = await request.json()
-        print(f"📥 Received webhook data: {json.dumps(data, ensure_ascii=False, indent=2)}")
+        debug_sampled(logger, "Received webhook data: %s", data)
         
         # Hỗ trợ cả Zalo Bot Platform mới và API cũ
         event = data.get('event') or data.get('event_name')
@@ -226,7 +378,7 @@ async def webhook(request: Request):
         # Zalo Bot Platform: "message.text.received"
         # API cũ: "user_send_text"
         if event not in ['user_send_text', 'message.text.received']:
-            print(f"⚠️  Ignoring event: {event}")
+            annotate(ignored_event=event)
             return JSONResponse(content={'status': 'ok'})
         
         # Lấy message text và user_id (hỗ trợ cả 2 format)
@@ -242,41 +394,47 @@ async def webhook(request: Request):
             message_text = message_obj.get('text', '').strip()
             user_id = str(data.get('sender', {}).get('id', ''))
         
-        print(f"💬 Message from user {user_id}: {message_text}")
+        annotate(user_id=user_id)
+        debug_sampled(logger, "Message from user %s: %s", user_id, message_text)
         
         if not message_text or not user_id:
-            print("⚠️  Missing message_text or user_id")
+            logger.warning("Missing message_text or user_id")
             return JSONResponse(content={'status': 'ok'})
         
-        response_message = ""
+        dedup_key = None
+        if WEBHOOK_DEDUP_ENABLED:
+            # Zalo gửi lại sự kiện khi xử lý chậm: bỏ qua nếu đã nhận (không chạm Sheets/Zalo)
+            from services.dedup_cache import webhook_event_key
+            dedup_key = webhook_event_key(data, user_id, message_text)
+            if get_dedup_cache().check_and_add(dedup_key):
+                annotate(duplicate=True)
+                return JSONResponse(content={'status': 'ok', 'duplicate': True})
         
-        # Kiểm tra lệnh thống kê
-        if any(keyword in message_text.lower() for keyword in ['thống kê', 'thong ke', 'tk', 'stat']):
-            print("📊 Processing statistics command")
-            response_message = handle_statistics_command(user_id, message_text)
-        else:
-            print("💰 Processing transaction")
-            response_message = handle_transaction(user_id, message_text)
-        
-        if response_message:
-            print(f"📤 Sending response: {response_message[:100]}...")
-            zalo_service = get_zalo_service()
-            success = zalo_service.send_text_message(user_id, response_message)
-            if success:
-                print("✅ Message sent successfully")
+        try:
+            if WEBHOOK_ASYNC_ENABLED:
+                # Trả 200 ngay, NLP + ghi sheet + gửi Zalo chạy ở background worker
+                if not get_webhook_worker().submit(process_message, user_id, message_text):
+                    logger.warning("Webhook queue full - rejecting event")
+                    raise HTTPException(status_code=503, detail='Queue full')
+                response_message = None
             else:
-                print("❌ Failed to send message")
-        else:
-            print("⚠️  No response message to send")
+                # Handler đồng bộ (gspread) chạy trên thread pool của Sheets, event loop tiếp tục nhận request khác
+                response_message = await get_async_sheets_service().run(build_response_message, user_id, message_text)
+        except Exception:
+            # Chưa nhận/xử lý được: bỏ khóa để lần Zalo gửi lại không bị coi là trùng
+            if dedup_key is not None:
+                get_dedup_cache().discard(dedup_key)
+            raise
+        if response_message is not None:
+            await send_reply(user_id, response_message)
         
         return JSONResponse(content={'status': 'ok'})
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in webhook: {e}")
-        import traceback
-        traceback.print_exc()
+        metrics.inc('errors_total', source='webhook')
+        logger.exception("Error in webhook: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get('/')
@@ -287,7 +445,9 @@ async def root():
         'message': 'Bot Chi Tieu API',
         'endpoints': {
             'webhook': '/webhook (POST)',
-            'health': '/health (GET)'
+            'health': '/health (GET)',
+            'metrics': '/metrics (GET)',
+            'queue': '/queue (GET)'
         }
     })
 
@@ -296,6 +456,35 @@ async def health():
     """Health check endpoint"""
     return JSONResponse(content={'status': 'ok'})
 
+@app.get('/metrics')
+async def metrics_endpoint():
+    """Metrics theo Prometheus text format (latency p50/p95/p99 từng stage, counter)"""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+@app.get('/queue')
+async def queue_status():
+    """Độ sâu hàng đợi webhook, số việc đã xử lý và số lời gọi Sheets đang chờ quota"""
+    sheets = _sheets_service.queue_stats() if _sheets_service is not None else {}
+    if not WEBHOOK_ASYNC_ENABLED:
+        return JSONResponse(content={'status': 'ok', 'async': False, 'sheets': sheets})
+    return JSONResponse(content={'status': 'ok', 'async': True, 'sheets': sheets, **get_webhook_worker().stats()})
+
+@app.on_event('shutdown')
+def shutdown():
+    """Xử lý hết tin nhắn đang chờ trước khi tắt server"""
+    if _webhook_worker is not None:
+        _webhook_worker.close()
+    if _async_sheets_service is not None:
+        _async_sheets_service.close()
+    if _sheets_service is not None:
+        _sheets_service.close()
+
+@app.on_event('shutdown')
+async def close_async_clients():
+    """Đóng connection pool của client Zalo async"""
+    if _async_zalo_service is not None:
+        await _async_zalo_service.aclose()
+
 @app.post('/test-webhook')
 async def test_webhook(request: Request):
     """Test endpoint - không cần signature (chỉ để debug)"""
@@ -305,16 +494,14 @@ async def test_webhook(request: Request):
         if body:
             try:
                 data = await request.json()
-                print(f"🧪 Test webhook received JSON: {json.dumps(data, ensure_ascii=False, indent=2)}")
+                logger.info("Test webhook received JSON: %s", data)
                 return JSONResponse(content={'status': 'ok', 'received': data})
             except:
-                print(f"🧪 Test webhook received raw body: {body.decode('utf-8', errors='ignore')}")
+                logger.info("Test webhook received raw body: %s", body.decode('utf-8', errors='ignore'))
                 return JSONResponse(content={'status': 'ok', 'received_raw': body.decode('utf-8', errors='ignore')})
         else:
-            print("🧪 Test webhook received empty body")
+            logger.info("Test webhook received empty body")
             return JSONResponse(content={'status': 'ok', 'message': 'Empty body received'})
     except Exception as e:
-        print(f"🧪 Test webhook error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Test webhook error: %s", e)
         return JSONResponse(content={'status': 'error', 'error': str(e)}, status_code=500)
@@ -7,19 +7,32 @@ Lưu ý: Cần cài fastapi và uvicorn cho local dev:
 """
 try:
     from fastapi import FastAPI, Request, HTTPException
-    from fastapi.responses import JSONResponse
+    from fastapi.responses import JSONResponse, PlainTextResponse
     FASTAPI_AVAILABLE = True
 except ImportError:
     FASTAPI_AVAILABLE = False
     print("⚠️  FastAPI not installed. Install with: pip install fastapi uvicorn")
 
-import json
+import asyncio
 import hmac
 import hashlib
-from services.nlp_processor import NLPProcessor
-from services.google_sheets import GoogleSheetsService
+from services.storage import create_storage
+from services.google_sheets_async import AsyncSheetsService
 from services.zalo_bot import ZaloBotService
-from config import ZALO_SECRET_KEY, validate_config
+from services.zalo_bot_async import AsyncZaloBotService, HTTPX_AVAILABLE
+from services.background_worker import BackgroundWorker
+from services.dedup_cache import DedupCache, webhook_event_key
+from services.bulk_import import is_bulk_message, is_statistics_command, parse_bulk_message, format_bulk_summary
+from services.date_range import parse_date_range
+from utils.metrics import metrics
+from utils.logger import get_logger, debug_sampled, annotate, request_log
+from config import (
+    ZALO_SECRET_KEY, validate_config, BULK_IMPORT_MAX_LINES,
+    WEBHOOK_ASYNC_ENABLED, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, SHEETS_ASYNC_WORKERS,
+    WEBHOOK_DEDUP_ENABLED, WEBHOOK_DEDUP_MAX_SIZE, WEBHOOK_DEDUP_TTL_SECONDS, WEBHOOK_DEDUP_DB_PATH
+)
+
+logger = get_logger('webhook')
 
 if FASTAPI_AVAILABLE:
     app = FastAPI(title="Bot Chi Tieu", description="Zalo Bot for expense tracking")
@@ -30,11 +43,20 @@ else:
 try:
     validate_config()
 except ValueError as e:
-    print(f"⚠️  Config validation warning: {e}")
+    logger.warning("Config validation warning: %s", e)
 
 # Khởi tạo services
-sheets_service = GoogleSheetsService()
+# Google Sheets hoặc engine cục bộ (SQLite/bộ nhớ, có thể sao chép sang Sheets) theo STORAGE_BACKEND
+sheets_service = create_storage()
+async_sheets_service = AsyncSheetsService(lambda: sheets_service, max_workers=SHEETS_ASYNC_WORKERS)
 zalo_service = ZaloBotService()
+async_zalo_service = AsyncZaloBotService() if HTTPX_AVAILABLE else None
+dedup_cache = DedupCache(
+    max_size=WEBHOOK_DEDUP_MAX_SIZE,
+    ttl=WEBHOOK_DEDUP_TTL_SECONDS,
+    db_path=WEBHOOK_DEDUP_DB_PATH or None
+) if WEBHOOK_DEDUP_ENABLED else None
+webhook_worker = BackgroundWorker(num_workers=WEBHOOK_WORKERS, max_queue=WEBHOOK_QUEUE_SIZE) if WEBHOOK_ASYNC_ENABLED else None
 
 def verify_zalo_signature(data: bytes, signature: str) -> bool:
     """
@@ -42,7 +64,7 @@ def verify_zalo_signature(data: bytes, signature: str) -> bool:
     Nếu không có ZALO_SECRET_KEY thì bỏ qua verification (chỉ cho local dev)
     """
     if not ZALO_SECRET_KEY or ZALO_SECRET_KEY.strip() == '':
-        print("⚠️  Warning: ZALO_SECRET_KEY không có, bỏ qua verification (local only)")
+        debug_sampled(logger, "ZALO_SECRET_KEY không có, bỏ qua verification (local only)")
         return True
     
     try:
@@ -53,15 +75,58 @@ def verify_zalo_signature(data: bytes, signature: str) -> bool:
         ).hexdigest()
         return hmac.compare_digest(signature, expected_signature)
     except Exception as e:
-        print(f"Error verifying signature: {e}")
+        logger.error("Error verifying signature: %s", e)
         # Local dev: cho phép pass để test
         return True
 
+def format_statistics(stats: dict, month: int = None, year: int = None, period: str = None) -> str:
+    """Dựng nội dung phản hồi cho lệnh thống kê (period: mô tả khoảng ngày, ưu tiên hơn month/year)"""
+    total_thu = stats.get('total_thu', 0)
+    total_chi = stats.get('total_chi', 0)
+    chenh_lech = total_thu - total_chi
+    
+    response = f"📊 THỐNG KÊ THU CHI"
+    if period:
+        response += f" - {period}\n\n"
+    elif month and year:
+        response += f" - {month}/{year}\n\n"
+    elif year:
+        response += f" - Năm {year}\n\n"
+    else:
+        response += "\n\n"
+    
+    response += f"💰 Tổng Thu: {total_thu:,.0f} VNĐ\n"
+    response += f"💸 Tổng Chi: {total_chi:,.0f} VNĐ\n"
+    response += f"📈 Chênh lệch: {chenh_lech:,.0f} VNĐ\n"
+    response += f"📝 Số giao dịch: {stats.get('so_luong', 0)}\n\n"
+    
+    danh_muc_stats = stats.get('danh_muc_stats', {})
+    if danh_muc_stats:
+        response += "📋 Theo danh mục:\n"
+        for danh_muc, data in sorted(danh_muc_stats.items(), 
+                                    key=lambda x: x[1]['Thu'] + x[1]['Chi'], 
+                                    reverse=True)[:5]:
+            thu = data.get('Thu', 0)
+            chi = data.get('Chi', 0)
+            if thu > 0 or chi > 0:
+                response += f"• {danh_muc}: Thu {thu:,.0f} | Chi {chi:,.0f}\n"
+    
+    return response
+
 def handle_statistics_command(user_id: str, message: str) -> str:
     """Xử lý lệnh thống kê"""
     try:
         import re
         
+        # Khoảng ngày: 'tuần này', '7 ngày qua', 'từ 01/03 đến 15/03' (tra bằng date index)
+        date_range = parse_date_range(message)
+        if date_range:
+            stats, response = sheets_service.get_range_statistics_report(
+                user_id, date_range.start, date_range.end,
+                lambda stats: format_statistics(stats, period=date_range.describe())
+            )
+            return response
+        
         month = None
         year = None
         
@@ -77,48 +142,25 @@ def handle_statistics_command(user_id: str, message: str) -> str:
         if year_match:
             year = int(year_match.group(1))
         
-        stats = sheets_service.get_statistics(user_id=user_id, month=month, year=year)
-        
-        total_thu = stats.get('total_thu', 0)
-        total_chi = stats.get('total_chi', 0)
-        chenh_lech = total_thu - total_chi
-        
-        response = f"📊 THỐNG KÊ THU CHI"
-        if month and year:
-            response += f" - {month}/{year}\n\n"
-        elif year:
-            response += f" - Năm {year}\n\n"
-        else:
-            response += "\n\n"
-        
-        response += f"💰 Tổng Thu: {total_thu:,.0f} VNĐ\n"
-        response += f"💸 Tổng Chi: {total_chi:,.0f} VNĐ\n"
-        response += f"📈 Chênh lệch: {chenh_lech:,.0f} VNĐ\n"
-        response += f"📝 Số giao dịch: {stats.get('so_luong', 0)}\n\n"
-        
-        danh_muc_stats = stats.get('danh_muc_stats', {})
-        if danh_muc_stats:
-            response += "📋 Theo danh mục:\n"
-            for danh_muc, data in sorted(danh_muc_stats.items(), 
-                                        key=lambda x: x[1]['Thu'] + x[1]['Chi'], 
-                                        reverse=True)[:5]:
-                thu = data.get('Thu', 0)
-                chi = data.get('Chi', 0)
-                if thu > 0 or chi > 0:
-                    response += f"• {danh_muc}: Thu {thu:,.0f} | Chi {chi:,.0f}\n"
+        # Báo cáo đã render được cache, hỏi lại không cần gọi Google Sheets
+        stats, response = sheets_service.get_statistics_report(
+            user_id, month, year, lambda stats: format_statistics(stats, month, year)
+        )
         
         return response
         
     except Exception as e:
-        print(f"Error handling statistics: {e}")
+        logger.exception("Error handling statistics: %s", e)
         return "❌ Có lỗi xảy ra khi lấy thống kê. Vui lòng thử lại sau."
 
 def handle_transaction(user_id: str, message: str) -> str:
     """Xử lý giao dịch thu chi"""
     try:
-        categories = sheets_service.get_categories()
-        nlp_processor = NLPProcessor(categories=categories)
-        transaction = nlp_processor.process(message)
+        # NLPProcessor dựng sẵn theo version danh mục (không đọc sheet mỗi tin nhắn)
+        nlp_processor = sheets_service.get_nlp_processor()
+        categories = nlp_processor.categories
+        with metrics.stage('nlp'):
+            transaction = nlp_processor.process(message)
         
         if not transaction.get('is_valid'):
             missing = []
@@ -151,25 +193,95 @@ def handle_transaction(user_id: str, message: str) -> str:
             return "❌ Có lỗi xảy ra khi ghi dữ liệu. Vui lòng thử lại sau."
             
     except Exception as e:
-        print(f"Error handling transaction: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error handling transaction: %s", e)
         return "❌ Có lỗi xảy ra. Vui lòng thử lại sau."
 
+def handle_bulk_import(user_id: str, message: str) -> str:
+    """Nhập nhiều giao dịch trong 1 tin nhắn (mỗi dòng 1 giao dịch hoặc CSV), ghi bằng 1 lần append_rows"""
+    try:
+        with metrics.stage('nlp'):
+            result = parse_bulk_message(sheets_service.get_nlp_processor(), message, BULK_IMPORT_MAX_LINES)
+        saved = sheets_service.add_transactions(
+            [line.transaction for line in result.accepted], user_id=user_id
+        )
+        annotate(bulk_accepted=len(result.accepted), bulk_rejected=len(result.rejected))
+        return format_bulk_summary(result, saved)
+    except Exception as e:
+        logger.exception("Error handling bulk import: %s", e)
+        return "❌ Có lỗi xảy ra. Vui lòng thử lại sau."
+
+def build_response_message(user_id: str, message_text: str) -> str:
+    """Xử lý 1 tin nhắn (nhập hàng loạt, thống kê hoặc giao dịch) và trả về nội dung phản hồi"""
+    # Kiểm tra lệnh thống kê trước: lệnh viết nhiều dòng không phải nhập hàng loạt
+    if is_statistics_command(message_text):
+        annotate(command='statistics')
+        with metrics.stage('statistics'):
+            return handle_statistics_command(user_id, message_text)
+    if is_bulk_message(message_text):
+        annotate(command='bulk_import')
+        with metrics.stage('transaction'):
+            return handle_bulk_import(user_id, message_text)
+    annotate(command='transaction')
+    with metrics.stage('transaction'):
+        return handle_transaction(user_id, message_text)
+
+def process_message(user_id: str, message_text: str):
+    """Xử lý 1 tin nhắn và gửi phản hồi về Zalo (đồng bộ, dùng trong background worker)"""
+    response_message = build_response_message(user_id, message_text)
+    
+    if response_message:
+        debug_sampled(logger, "Sending response: %.100s", response_message)
+        success = zalo_service.send_text_message(user_id, response_message)
+        if success:
+            annotate(reply_sent=True)
+        else:
+            logger.warning("Failed to send message to user %s", user_id)
+    else:
+        logger.warning("No response message to send")
+
+async def send_reply(user_id: str, response_message: str):
+    """Gửi phản hồi từ handler async mà không chặn event loop"""
+    if not response_message:
+        logger.warning("No response message to send")
+        return
+    debug_sampled(logger, "Sending response: %.100s", response_message)
+    if async_zalo_service is not None:
+        success = await async_zalo_service.send_text_message(user_id, response_message)
+    else:
+        # Chưa cài httpx: chạy client sync trong thread pool
+        loop = asyncio.get_running_loop()
+        success = await loop.run_in_executor(
+            None, zalo_service.send_text_message, user_id, response_message
+        )
+    if success:
+        annotate(reply_sent=True)
+    else:
+        logger.warning("Failed to send message to user %s", user_id)
+
 if FASTAPI_AVAILABLE:
     @app.post('/webhook')
     async def webhook(request: Request):
         """Webhook endpoint cho Zalo Bot"""
+        metrics.inc('webhook_requests_total')
+        # 1 dòng log JSON cho mỗi request: request_id, thời gian từng stage, kết quả
+        with request_log(logger, request_id=request.headers.get('X-Request-ID'), route='/webhook'):
+            with metrics.stage('webhook_total'):
+                return await _handle_webhook(request)
+
+    async def _handle_webhook(request: Request):
+        """Xử lý webhook (tách riêng để đo tổng thời gian)"""
         try:
             # Đọc raw body để verify signature
             raw_data = await request.body()
             signature = request.headers.get('X-Zalo-Signature', '')
             
-            if not verify_zalo_signature(raw_data, signature):
+            with metrics.stage('verify_signature'):
+                signature_ok = verify_zalo_signature(raw_data, signature)
+            if not signature_ok:
                 raise HTTPException(status_code=401, detail='Invalid signature')
             
             data = await request.json()
-            print(f"📥 Received webhook data: {json.dumps(data, ensure_ascii=False, indent=2)}")
+            debug_sampled(logger, "Received webhook data: %s", data)
             
             # Hỗ trợ cả Zalo Bot Platform mới và API cũ
             event = data.get('event') or data.get('event_name')
@@ -177,7 +289,7 @@ if FASTAPI_AVAILABLE:
             # Zalo Bot Platform: "message.text.received"
             # API cũ: "user_send_text"
             if event not in ['user_send_text', 'message.text.received']:
-                print(f"⚠️  Ignoring event: {event}")
+                annotate(ignored_event=event)
                 return JSONResponse(content={'status': 'ok'})
             
             # Lấy message text và user_id (hỗ trợ cả 2 format)
@@ -194,46 +306,52 @@ if FASTAPI_AVAILABLE:
                 message_text = message_obj.get('text', '').strip()
                 user_id = str(data.get('sender', {}).get('id', ''))
             
-            print(f"💬 Message from user {user_id}: {message_text}")
+            annotate(user_id=user_id)
+            debug_sampled(logger, "Message from user %s: %s", user_id, message_text)
             
             if not message_text or not user_id:
-                print("⚠️  Missing message_text or user_id")
+                logger.warning("Missing message_text or user_id")
                 return JSONResponse(content={'status': 'ok'})
             
-            response_message = ""
-            
-            # Kiểm tra lệnh thống kê
-            if any(keyword in message_text.lower() for keyword in ['thống kê', 'thong ke', 'tk', 'stat']):
-                print("📊 Processing statistics command")
-                response_message = handle_statistics_command(user_id, message_text)
-            else:
-                print("💰 Processing transaction")
-                response_message = handle_transaction(user_id, message_text)
+            dedup_key = None
+            if dedup_cache is not None:
+                # Zalo gửi lại sự kiện khi xử lý chậm: bỏ qua nếu đã nhận (không chạm Sheets/Zalo)
+                dedup_key = webhook_event_key(data, user_id, message_text)
+                if dedup_cache.check_and_add(dedup_key):
+                    annotate(duplicate=True)
+                    return JSONResponse(content={'status': 'ok', 'duplicate': True})
             
-            if response_message:
-                print(f"📤 Sending response: {response_message[:100]}...")
-                success = zalo_service.send_text_message(user_id, response_message)
-                if success:
-                    print("✅ Message sent successfully")
+            try:
+                if webhook_worker is not None:
+                    # Trả 200 ngay, NLP + ghi sheet + gửi Zalo chạy ở background worker
+                    if not webhook_worker.submit(process_message, user_id, message_text):
+                        logger.warning("Webhook queue full - rejecting event")
+                        raise HTTPException(status_code=503, detail='Queue full')
+                    response_message = None
                 else:
-                    print("❌ Failed to send message")
-            else:
-                print("⚠️  No response message to send")
+                    # Handler đồng bộ (gspread) chạy trên thread pool của Sheets, event loop tiếp tục nhận request khác
+                    response_message = await async_sheets_service.run(build_response_message, user_id, message_text)
+            except Exception:
+                # Chưa nhận/xử lý được: bỏ khóa để lần Zalo gửi lại không bị coi là trùng
+                if dedup_key is not None:
+                    dedup_cache.discard(dedup_key)
+                raise
+            if response_message is not None:
+                await send_reply(user_id, response_message)
             
             return JSONResponse(content={'status': 'ok'})
             
         except HTTPException:
             raise
         except Exception as e:
-            print(f"Error in webhook: {e}")
-            import traceback
-            traceback.print_exc()
+            metrics.inc('errors_total', source='webhook')
+            logger.exception("Error in webhook: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
 
     @app.post('/')
     async def root_webhook(request: Request):
         """Webhook endpoint tại root path (fallback)"""
-        print("📥 Received request at root path /")
+        debug_sampled(logger, "Received request at root path /")
         # Redirect đến webhook handler
         return await webhook(request)
 
@@ -245,7 +363,9 @@ if FASTAPI_AVAILABLE:
             'message': 'Bot Chi Tieu API',
             'endpoints': {
                 'webhook': '/webhook (POST)',
-                'health': '/health (GET)'
+                'health': '/health (GET)',
+                'metrics': '/metrics (GET)',
+                'queue': '/queue (GET)'
             }
         })
 
@@ -254,6 +374,29 @@ if FASTAPI_AVAILABLE:
         """Health check endpoint"""
         return JSONResponse(content={'status': 'ok'})
 
+    @app.get('/metrics')
+    async def metrics_endpoint():
+        """Metrics theo Prometheus text format (latency p50/p95/p99 từng stage, counter)"""
+        return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+    @app.get('/queue')
+    async def queue_status():
+        """Độ sâu hàng đợi webhook, số việc đã xử lý và số lời gọi Sheets đang chờ quota"""
+        sheets = sheets_service.queue_stats()
+        if webhook_worker is None:
+            return JSONResponse(content={'status': 'ok', 'async': False, 'sheets': sheets})
+        return JSONResponse(content={'status': 'ok', 'async': True, 'sheets': sheets, **webhook_worker.stats()})
+
+    @app.on_event('shutdown')
+    async def shutdown():
+        """Xử lý hết tin nhắn đang chờ và đóng client Zalo async trước khi tắt server"""
+        if webhook_worker is not None:
+            webhook_worker.close()
+        async_sheets_service.close()
+        sheets_service.close()
+        if async_zalo_service is not None:
+            await async_zalo_service.aclose()
+
     if __name__ == '__main__':
         try:
             import uvicorn
@@ -0,0 +1,3 @@
+"""
+Benchmark offline: server giả cho Zalo/Google Sheets, corpus tin nhắn và load test /webhook
+"""
@@ -0,0 +1,164 @@
+"""
+Đo cold start của entry point Vercel (api/index.py)
+
+Chạy:
+  python -m benchmarks.cold_start                      # profile import (python -X importtime)
+  python -m benchmarks.cold_start --max-import-ms 600  # exit 1 nếu import chậm hơn ngưỡng
+  python -m benchmarks.cold_start --service            # + khởi tạo GoogleSheetsService với server giả
+
+Exit 1 nếu import vượt ngưỡng hoặc 1 module phải được import trễ (gspread, google-auth, ...)
+bị kéo vào lúc import entry point.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Chỉ được import khi xử lý request đầu tiên cần tới, không phải lúc import entry point
+DEFERRED_MODULES = ('gspread', 'google.auth', 'google.oauth2', 'requests', 'httpx', 'numpy')
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+class ImportEntry(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+def _env() -> Dict[str, str]:
+    """Env tối thiểu để import entry point không cảnh báo thiếu config"""
+    env = dict(os.environ)
+    env.setdefault('ZALO_ACCESS_TOKEN', 'cold-start-token')
+    env.setdefault('GOOGLE_SHEET_ID', 'cold-start-sheet')
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+def import_profile(module: str) -> List[ImportEntry]:
+    """Chạy `python -X importtime -c 'import module'` trong process mới và parse kết quả"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=_env(), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append(ImportEntry(name, int(self_us), int(cumulative_us), max(0, len(indent) - 1) // 2))
+    return entries
+
+def import_wall_time(module: str, rounds: int) -> float:
+    """Thời gian import (giây) đo trong process mới, lấy lần nhanh nhất (không bật importtime)"""
+    code = f'import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)'
+    best = float('inf')
+    for _ in range(rounds):
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=_env(),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        best = min(best, float(result.stdout.strip().splitlines()[-1]))
+    return best
+
+def summarize(entries: List[ImportEntry], top: int) -> Dict:
+    """Tổng self time theo package gốc + các module import trễ bị kéo vào"""
+    by_package: Dict[str, int] = defaultdict(int)
+    for entry in entries:
+        by_package[entry.module.split('.')[0]] += entry.self_us
+    imported = {entry.module for entry in entries}
+    return {
+        'modules': len(entries),
+        'top_packages_ms': {
+            name: round(us / 1000, 1)
+            for name, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+        'deferred_imported': sorted(
+            name for name in DEFERRED_MODULES
+            if name in imported or any(m.startswith(name + '.') for m in imported)
+        ),
+    }
+
+def service_init(rounds: int = 2) -> List[Dict]:
+    """
+    Khởi tạo GoogleSheetsService với server Sheets giả: lần đầu (cache rỗng) và các lần sau (dùng cache)
+
+    Returns:
+        List {'init_ms', 'sheets_calls'} theo thứ tự các lần khởi tạo
+    """
+    from benchmarks.corpus import DEFAULT_CATEGORIES
+    from benchmarks.fake_servers import FakeSheetsServer
+
+    sheets = FakeSheetsServer(sheets={
+        'Giao dịch': [['Ngày giờ', 'Loại', 'Số tiền', 'Danh mục', 'Ghi chú', 'User ID']],
+        'Danh mục': [['Tên danh mục', 'Loại', 'Mô tả']] + DEFAULT_CATEGORIES,
+    }, summaries={'Tổng hợp': 'Giao dịch'}).start()
+    cache_dir = tempfile.mkdtemp(prefix='botchitieu-cold-')
+    os.environ.update({
+        'GOOGLE_SHEET_ID': 'cold-start-sheet',
+        'GOOGLE_SHEETS_API_BASE_URL': sheets.url,
+        'COLD_START_CACHE_DIR': cache_dir,
+        'LOCAL_REPLICA_PATH': os.path.join(cache_dir, 'replica.db'),
+        'WRITE_BUFFER_ENABLED': 'false',
+    })
+    sys.path.insert(0, ROOT)
+    from services.google_sheets import GoogleSheetsService
+
+    results = []
+    try:
+        for _ in range(rounds):
+            sheets.reset_counters()
+            started = time.perf_counter()
+            GoogleSheetsService()
+            results.append({
+                'init_ms': round((time.perf_counter() - started) * 1000, 1),
+                'sheets_calls': sum(sheets.calls.values()),
+            })
+    finally:
+        sheets.stop()
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Profile cold start của api/index.py')
+    parser.add_argument('--module', default='api.index', help='Module entry point cần đo')
+    parser.add_argument('--rounds', type=int, default=3, help='Số lần đo thời gian import, lấy lần nhanh nhất')
+    parser.add_argument('--top', type=int, default=10, help='Số package nặng nhất cần in')
+    parser.add_argument('--max-import-ms', type=float, default=0, help='Ngưỡng thời gian import (0 = không kiểm tra)')
+    parser.add_argument('--service', action='store_true', help='Đo thêm khởi tạo GoogleSheetsService (cần gspread)')
+    parser.add_argument('--json', action='store_true', help='In báo cáo dạng JSON')
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = summarize(import_profile(args.module), args.top)
+    report['import_ms'] = round(import_wall_time(args.module, max(1, args.rounds)) * 1000, 1)
+    if args.service:
+        report['service_init'] = service_init()
+
+    problems = []
+    if args.max_import_ms and report['import_ms'] > args.max_import_ms:
+        problems.append(f"import {args.module} took {report['import_ms']}ms > {args.max_import_ms}ms")
+    for name in report['deferred_imported']:
+        problems.append(f"{name} is imported at startup (should be deferred until first use)")
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Import {args.module}: {report['import_ms']}ms ({report['modules']} modules)")
+        print("Heaviest packages (self time, ms): "
+              + '  '.join(f'{name} {ms}' for name, ms in report['top_packages_ms'].items()))
+        for i, result in enumerate(report.get('service_init', [])):
+            label = 'cold' if i == 0 else 'cached'
+            print(f"GoogleSheetsService init ({label}): {result['init_ms']}ms, {result['sheets_calls']} Sheets calls")
+    for problem in problems:
+        print(f"❌ {problem}")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
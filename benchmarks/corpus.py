@@ -0,0 +1,196 @@
+"""
+Sinh corpus tin nhắn tiếng Việt (giao dịch + lệnh thống kê) cho load test
+và corpus có nhãn cho bộ regression của NLPProcessor
+"""
+import random
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Danh mục mặc định của sheet 'Danh mục' (services.google_sheets._init_sheets)
+DEFAULT_CATEGORIES = [
+    ['Ăn uống', 'Chi', ''],
+    ['Lương', 'Thu', ''],
+    ['Mua sắm', 'Chi', ''],
+    ['Giao thông', 'Chi', ''],
+    ['Giải trí', 'Chi', ''],
+    ['Khác', 'Cả hai', ''],
+]
+
+# Mẫu câu: {amount} số tiền, {category} danh mục, {note} ghi chú mong đợi.
+# Từ nối khác (cho, hôm nay, ...) là từ thừa nên không nằm trong ghi chú.
+CHI_TEMPLATES = [
+    'chi {amount} {category} {note}',
+    'Chi {amount} cho {category} {note}',
+    'mua {note} {amount} {category}',
+    'chi {category} {amount} {note}',
+    'thanh toán {category} {amount}',
+    'tốn {amount} {category} hôm nay',
+    '{amount} {category} {note} chi',
+    'hôm nay chi {amount} {category} {note}',
+]
+THU_TEMPLATES = [
+    'nhận {amount} {category}',
+    'thu {amount} {category} {note}',
+    'nhận được {amount} {category}',
+    'nhận {category} {amount} {note}',
+]
+STATISTICS_TEMPLATES = [
+    'thống kê',
+    'thong ke',
+    'thống kê tháng {month}',
+    'tk {month}/{year}',
+    'thống kê tháng {month} năm {year}',
+]
+
+CHI_NOTES = {
+    'Ăn uống': ['phở', 'bún bò', 'cà phê', 'trà sữa', 'cơm trưa', 'bánh mì'],
+    'Mua sắm': ['áo', 'giày', 'sách', 'tai nghe', 'đồ gia dụng'],
+    'Giao thông': ['xăng', 'grab', 'gửi xe', 'vé xe buýt'],
+    'Giải trí': ['xem phim', 'karaoke', 'game', 'du lịch'],
+    'Khác': ['quà sinh nhật', 'từ thiện', 'sửa điện thoại'],
+}
+THU_NOTES = {
+    'Lương': ['công ty', 'tháng trước'],
+    'Khác': ['thưởng', 'bán đồ cũ', 'lì xì'],
+}
+CHI_CATEGORIES = list(CHI_NOTES)
+THU_CATEGORIES = list(THU_NOTES)
+
+def strip_diacritics(text: str) -> str:
+    """Bỏ dấu tiếng Việt ('ăn uống' -> 'an uong'), như khi người dùng gõ không dấu"""
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return text.replace('đ', 'd').replace('Đ', 'D')
+
+def format_amount(rng: random.Random, so_tien: int) -> str:
+    """Viết số tiền theo 1 trong các kiểu người dùng hay gõ"""
+    if so_tien >= 1000000 and so_tien % 100000 == 0:
+        value = so_tien / 1000000
+        number = f'{value:g}'
+        return rng.choice([f'{number} triệu', f'{number}tr', f'{number} tr', f'{number} trieu'])
+    if so_tien % 1000 == 0:
+        number = so_tien // 1000
+        return rng.choice([f'{number}k', f'{number} k', f'{number}K', f'{number} nghìn', f'{number} nghin',
+                           str(so_tien)])
+    return str(so_tien)
+
+def labeled_transaction(rng: random.Random) -> Tuple[str, Dict]:
+    """
+    1 tin nhắn giao dịch ngẫu nhiên kèm kết quả mong đợi
+
+    Returns:
+        (message, {'loai', 'so_tien', 'danh_muc', 'ghi_chu'})
+    """
+    if rng.random() < 0.15:
+        loai = 'Thu'
+        template = rng.choice(THU_TEMPLATES)
+        category = rng.choice(THU_CATEGORIES)
+        so_tien = rng.choice([500000, 1500000, 3000000, 8000000, 15000000])
+        note = rng.choice(THU_NOTES[category]) if '{note}' in template else ''
+    else:
+        loai = 'Chi'
+        template = rng.choice(CHI_TEMPLATES)
+        category = rng.choice(CHI_CATEGORIES)
+        so_tien = rng.choice([15000, 25000, 30000, 45000, 50000, 120000, 250000, 1200000])
+        note = rng.choice(CHI_NOTES[category]) if '{note}' in template else ''
+    message = template.format(amount=format_amount(rng, so_tien), category=category.lower(), note=note)
+    expected = {'loai': loai, 'so_tien': float(so_tien), 'danh_muc': category, 'ghi_chu': note}
+    return ' '.join(message.split()), expected
+
+def hard_amount(rng: random.Random, so_tien: int) -> Optional[str]:
+    """Cách viết số tiền khó hơn: '50.000đ', '50 ngàn', '1tr5' (None nếu không áp dụng được)"""
+    if 1000000 < so_tien < 10000000 and so_tien % 1000000 and so_tien % 100000 == 0:
+        return f'{so_tien // 1000000}tr{(so_tien % 1000000) // 100000}'
+    if so_tien < 1000000 and so_tien % 1000 == 0:
+        number = so_tien // 1000
+        return rng.choice([f'{number}.000đ', f'{number}.000 đồng', f'{number} ngàn'])
+    return None
+
+# Tag NLPProcessor chưa xử lý được (lỗi đã biết): vẫn giữ trong corpus để theo dõi,
+# nhưng không tính vào accuracy/regression cho đến khi được sửa
+KNOWN_GAP_TAGS = ('no_diacritics', 'amount_format')
+
+def golden_corpus(count: int, seed: Optional[int] = None,
+                  no_diacritics_ratio: float = 0.1, hard_amount_ratio: float = 0.05) -> List[Dict]:
+    """
+    Sinh corpus có nhãn cho bộ regression của NLPProcessor
+
+    Mỗi dòng có tags: 'standard', 'no_diacritics' (gõ không dấu)
+    hoặc 'amount_format' (số tiền viết kiểu khó). Dòng thuộc KNOWN_GAP_TAGS có known_gap=True.
+
+    Returns:
+        List {'message', 'tags', 'expected', 'known_gap'}
+    """
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < count:
+        message, expected = labeled_transaction(rng)
+        roll = rng.random()
+        tag = 'standard'
+        if roll < no_diacritics_ratio:
+            tag = 'no_diacritics'
+            message = strip_diacritics(message)
+            expected['ghi_chu'] = strip_diacritics(expected['ghi_chu'])
+        elif roll < no_diacritics_ratio + hard_amount_ratio:
+            amount = hard_amount(rng, int(expected['so_tien']))
+            if amount is None or expected['loai'] != 'Chi':
+                continue
+            tag = 'amount_format'
+            message = f"chi {amount} {expected['danh_muc'].lower()}"
+            expected['ghi_chu'] = ''
+        corpus.append({'message': message, 'tags': [tag], 'expected': expected,
+                       'known_gap': tag in KNOWN_GAP_TAGS})
+    return corpus
+
+def transaction_message(rng: random.Random) -> str:
+    """1 tin nhắn giao dịch ngẫu nhiên"""
+    return labeled_transaction(rng)[0]
+
+def statistics_message(rng: random.Random, year: int = 2026) -> str:
+    """1 lệnh thống kê ngẫu nhiên"""
+    return rng.choice(STATISTICS_TEMPLATES).format(month=rng.randint(1, 12), year=year)
+
+def generate_corpus(count: int, statistics_ratio: float = 0.1,
+                    seed: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    Sinh corpus tin nhắn
+
+    Args:
+        count: Số tin nhắn
+        statistics_ratio: Tỉ lệ lệnh thống kê (phần còn lại là giao dịch)
+        seed: Seed để corpus lặp lại được giữa các lần chạy
+
+    Returns:
+        List (kind, message) với kind là 'transaction' hoặc 'statistics'
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        if rng.random() < statistics_ratio:
+            corpus.append(('statistics', statistics_message(rng)))
+        else:
+            corpus.append(('transaction', transaction_message(rng)))
+    return corpus
+
+def seed_transaction_rows(count: int, users: List[str], seed: Optional[int] = None) -> List[List]:
+    """
+    Sinh các dòng giao dịch có sẵn cho sheet giả (để lệnh thống kê có dữ liệu)
+
+    Returns:
+        List dòng [Ngày giờ, Loại, Số tiền, Danh mục, Ghi chú, User ID]
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 28)
+        if rng.random() < 0.15:
+            loai, category, so_tien, note = 'Thu', rng.choice(THU_CATEGORIES), rng.choice([3000000, 15000000]), ''
+        else:
+            category = rng.choice(CHI_CATEGORIES)
+            loai, so_tien, note = 'Chi', rng.choice([25000, 50000, 120000]), rng.choice(CHI_NOTES[category])
+        rows.append([
+            f'2026-{month:02d}-{day:02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00',
+            loai, so_tien, category, note, rng.choice(users)
+        ])
+    return rows
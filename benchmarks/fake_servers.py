@@ -0,0 +1,262 @@
+"""
+Server HTTP giả lập Zalo send API và Google Sheets values API (chỉ dùng thư viện chuẩn)
+
+Mỗi server chạy trong 1 thread riêng, có độ trễ cấu hình được và tỉ lệ trả 429
+để đo hành vi retry/backpressure của bot mà không gọi dịch vụ thật.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse, parse_qs
+
+class _Handler(BaseHTTPRequestHandler):
+    """Chuyển mọi request cho FakeServer.handle"""
+    protocol_version = 'HTTP/1.1'
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, payload, headers = self.server.fake.handle(self.command, self.path, body)
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeServer:
+    """Khung chung: độ trễ, chèn 429, đếm số lần gọi theo endpoint"""
+
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0, retry_after: float = 0.1,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Độ trễ cố định mỗi request (ms)
+            error_rate: Tỉ lệ request bị trả 429 (0-1)
+            retry_after: Giá trị header Retry-After (giây) khi trả 429
+            seed: Seed cho việc chọn request bị 429 (None = ngẫu nhiên)
+        """
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> 'FakeServer':
+        """Chạy server ở thread nền (port 0 = tự chọn port trống)"""
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def handle(self, method: str, path: str, body: bytes):
+        """Xử lý 1 request, trả về (status, payload JSON, headers)"""
+        if self.latency:
+            time.sleep(self.latency)
+        endpoint = self.endpoint_name(method, path)
+        self._count(endpoint)
+        with self._lock:
+            throttled = self.error_rate and self._random.random() < self.error_rate
+        if throttled:
+            self._count('throttled')
+            return 429, self.throttled_payload(), {'Retry-After': str(self.retry_after)}
+        return self.respond(method, path, body)
+
+    def endpoint_name(self, method: str, path: str) -> str:
+        return f'{method} {urlparse(path).path}'
+
+    def throttled_payload(self) -> Dict:
+        return {'error': 'rate limited'}
+
+    def respond(self, method: str, path: str, body: bytes):
+        raise NotImplementedError
+
+class FakeZaloServer(FakeServer):
+    """Giả lập Zalo Bot Platform (/bot<token>/sendMessage, sendPhoto) và OA API cũ (/v2.0/oa/message)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages: List[Dict] = []
+
+    def endpoint_name(self, method: str, path: str) -> str:
+        path = urlparse(path).path
+        if path.endswith('/sendMessage') or path.endswith('/v2.0/oa/message'):
+            return 'send_message'
+        if path.endswith('/sendPhoto'):
+            return 'send_photo'
+        return 'other'
+
+    def throttled_payload(self) -> Dict:
+        return {'ok': False, 'error_code': 429, 'description': 'Too Many Requests'}
+
+    def respond(self, method: str, path: str, body: bytes):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'ok': False, 'description': 'Bad JSON'}, {}
+        with self._lock:
+            self.messages.append(data)
+            message_id = len(self.messages)
+        if urlparse(path).path.endswith('/v2.0/oa/message'):
+            return 200, {'error': 0, 'message': 'Success', 'data': {'message_id': str(message_id)}}, {}
+        return 200, {'ok': True, 'result': {'message_id': str(message_id)}}, {}
+
+class FakeSheetsServer(FakeServer):
+    """
+    Giả lập các endpoint Sheets API v4 mà gspread dùng:
+    metadata spreadsheet, values get và values append
+
+    Sheet tổng hợp (công thức QUERY trên sheet thật) được tính lại từ sheet nguồn mỗi lần đọc.
+    """
+
+    VALUES_PATTERN = re.compile(r'^/v4/spreadsheets/(?P<id>[^/]+)/values/(?P<range>[^/]+?)(?P<append>:append)?$')
+    META_PATTERN = re.compile(r'^/v4/spreadsheets/(?P<id>[^/:]+)$')
+    A1_PATTERN = re.compile(r'^[A-Z]+(\d+)')
+
+    def __init__(self, *args, sheets: Optional[Dict[str, List[List]]] = None,
+                 summaries: Optional[Dict[str, str]] = None, **kwargs):
+        """
+        Args:
+            sheets: Dữ liệu ban đầu {tên sheet: list dòng (gồm dòng header)}
+            summaries: Sheet tổng hợp {tên sheet tổng hợp: tên sheet giao dịch nguồn}
+        """
+        super().__init__(*args, **kwargs)
+        self.sheets: Dict[str, List[List]] = {title: [list(row) for row in rows]
+                                              for title, rows in (sheets or {}).items()}
+        self.summaries: Dict[str, str] = dict(summaries or {})
+        for title in self.summaries:
+            self.sheets.setdefault(title, [['User ID', 'Tháng', 'Danh mục', 'Loại', 'Tổng tiền', 'Số giao dịch']])
+
+    def endpoint_name(self, method: str, path: str) -> str:
+        path = urlparse(path).path
+        if path.endswith(':append'):
+            return 'values_append'
+        if '/values/' in path:
+            return 'values_get'
+        if self.META_PATTERN.match(path):
+            return 'metadata'
+        return 'other'
+
+    def throttled_payload(self) -> Dict:
+        return {'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}
+
+    @staticmethod
+    def _split_range(range_name: str):
+        """'Giao dịch'!A5:F -> ('Giao dịch', 5); 'Danh mục' -> ('Danh mục', 1)"""
+        title, _, cells = range_name.partition('!')
+        title = title.strip("'").replace("''", "'")
+        match = FakeSheetsServer.A1_PATTERN.match(cells)
+        return title, int(match.group(1)) if match else 1
+
+    @staticmethod
+    def _quote_title(title: str) -> str:
+        return "'" + title.replace("'", "''") + "'"
+
+    def _summary_rows(self, title: str) -> List[List]:
+        """Kết quả công thức QUERY của sheet tổng hợp: nhóm theo (user, tháng, danh mục, loại)"""
+        groups: Dict[tuple, List] = {}
+        for row in self.sheets[self.summaries[title]][1:]:
+            row = list(row) + [''] * (6 - len(row))
+            if not str(row[0]):
+                continue
+            key = (str(row[5]), str(row[0])[:7], row[3], row[1])
+            cell = groups.setdefault(key, [0, 0])
+            try:
+                cell[0] += float(row[2] or 0)
+            except (TypeError, ValueError):
+                pass
+            cell[1] += 1
+        return self.sheets[title][:1] + [list(key) + cell for key, cell in sorted(groups.items())]
+
+    def _metadata(self, spreadsheet_id: str) -> Dict:
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'properties': {'title': 'Bot Chi Tieu (fake)', 'locale': 'vi_VN', 'timeZone': 'Asia/Ho_Chi_Minh'},
+            'sheets': [
+                {'properties': {
+                    'sheetId': index,
+                    'title': title,
+                    'index': index,
+                    'sheetType': 'GRID',
+                    'gridProperties': {'rowCount': max(1000, len(rows)), 'columnCount': 26},
+                }}
+                for index, (title, rows) in enumerate(self.sheets.items())
+            ],
+        }
+
+    def respond(self, method: str, path: str, body: bytes):
+        parsed = urlparse(path)
+        match = self.META_PATTERN.match(parsed.path)
+        if match and method == 'GET':
+            with self._lock:
+                return 200, self._metadata(match.group('id')), {}
+        match = self.VALUES_PATTERN.match(parsed.path)
+        if not match:
+            return 404, {'error': {'code': 404, 'message': f'Unknown path {parsed.path}'}}, {}
+        range_name = unquote(match.group('range'))
+        title, start_row = self._split_range(range_name)
+        with self._lock:
+            rows = self.sheets.get(title)
+            if rows is None:
+                return 400, {'error': {'code': 400, 'message': f'Unable to parse range: {range_name}'}}, {}
+            if match.group('append'):
+                values = json.loads(body or b'{}').get('values', [])
+                first = len(rows) + 1
+                rows.extend(list(row) for row in values)
+                width = max((len(row) for row in values), default=0)
+                last_col = chr(ord('A') + max(width, 1) - 1)
+                updated_range = f'{self._quote_title(title)}!A{first}:{last_col}{first + len(values) - 1}'
+                return 200, {
+                    'spreadsheetId': match.group('id'),
+                    'tableRange': f'{self._quote_title(title)}!A1:{last_col}{first - 1}',
+                    'updates': {
+                        'spreadsheetId': match.group('id'),
+                        'updatedRange': updated_range,
+                        'updatedRows': len(values),
+                        'updatedColumns': width,
+                        'updatedCells': sum(len(row) for row in values),
+                    },
+                }, {}
+            if title in self.summaries:
+                rows = self._summary_rows(title)
+            values = [list(row) for row in rows[start_row - 1:]]
+        if parse_qs(parsed.query).get('majorDimension') == ['COLUMNS']:
+            width = max((len(row) for row in values), default=0)
+            values = [[row[i] if i < len(row) else '' for row in values] for i in range(width)]
+        return 200, {'range': range_name, 'majorDimension': 'ROWS', 'values': values}, {}
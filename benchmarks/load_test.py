@@ -0,0 +1,226 @@
+"""
+Load test offline cho /webhook: Zalo và Google Sheets được thay bằng server giả chạy local
+
+Chạy:
+  python -m benchmarks.load_test --requests 500 --concurrency 20
+  python -m benchmarks.load_test --sheets-latency-ms 150 --sheets-429-rate 0.05 --json
+
+Cần: fastapi, httpx, gspread, requests (như requirements.txt)
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+from benchmarks.corpus import DEFAULT_CATEGORIES, generate_corpus, seed_transaction_rows
+from benchmarks.fake_servers import FakeSheetsServer, FakeZaloServer
+
+SHEET_ID = 'bench-sheet'
+BOT_TOKEN = 'bench-token'
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+def webhook_payload(user_id: str, text: str) -> Dict:
+    """Payload webhook theo format Zalo Bot Platform (message.text.received)"""
+    return {
+        'event_name': 'message.text.received',
+        'message': {
+            'message_id': uuid.uuid4().hex,
+            'date': int(time.time() * 1000),
+            'text': text,
+            'from': {'id': user_id},
+            'chat': {'id': user_id},
+        },
+    }
+
+def configure_environment(args, zalo: FakeZaloServer, sheets: FakeSheetsServer):
+    """Trỏ bot về server giả; phải chạy trước khi import config/app"""
+    replica_dir = tempfile.mkdtemp(prefix='botchitieu-bench-')
+    os.environ.update({
+        'ZALO_ACCESS_TOKEN': BOT_TOKEN,
+        'ZALO_SECRET_KEY': '',
+        'ZALO_USE_NEW_API': 'true',
+        'ZALO_API_BASE_URL': zalo.url,
+        'GOOGLE_SHEET_ID': SHEET_ID,
+        'GOOGLE_SHEETS_API_BASE_URL': sheets.url,
+        'LOCAL_REPLICA_PATH': os.path.join(replica_dir, 'replica.db'),
+        'COLD_START_CACHE_DIR': replica_dir,
+        'STORAGE_BACKEND': args.storage,
+        'STORAGE_SQLITE_PATH': os.path.join(replica_dir, 'storage.db'),
+        'STORAGE_MIRROR_TO_SHEETS': 'true' if args.mirror else 'false',
+        'WEBHOOK_DEDUP_DB_PATH': '',
+        'WEBHOOK_ASYNC_ENABLED': 'true' if args.async_webhook else 'false',
+        'LOG_LEVEL': args.log_level,
+        'SHEETS_READ_QUOTA_PER_MINUTE': str(args.sheets_read_quota),
+        'SHEETS_WRITE_QUOTA_PER_MINUTE': str(args.sheets_write_quota),
+    })
+
+async def replay(app, corpus: List[Tuple[str, str]], users: List[str],
+                 concurrency: int) -> Tuple[List[float], Dict[int, int], float]:
+    """
+    Gửi corpus vào app (in-process qua ASGI) với số request đồng thời cố định
+
+    Returns:
+        (latency từng request (giây), số lần theo status code, tổng thời gian)
+    """
+    import httpx
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, (_, text) in enumerate(corpus):
+        queue.put_nowait((users[i % len(users)], text))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench',
+                                 timeout=None) as client:
+        async def worker():
+            while True:
+                try:
+                    user_id, text = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.post('/webhook', json=webhook_payload(user_id, text))
+                    status = response.status_code
+                except Exception:
+                    status = 0
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+def build_report(args, corpus, latencies, statuses, elapsed, drain_seconds,
+                 zalo: FakeZaloServer, sheets: FakeSheetsServer) -> Dict:
+    count = len(latencies)
+    ordered = sorted(latencies)
+    kinds: Dict[str, int] = {}
+    for kind, _ in corpus:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    per_request = lambda value: round(value / count, 4) if count else 0.0
+    return {
+        'requests': count,
+        'concurrency': args.concurrency,
+        'mix': kinds,
+        'mode': 'async' if args.async_webhook else 'sync',
+        'elapsed_s': round(elapsed, 3),
+        'drain_s': round(drain_seconds, 3),
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(ordered, 0.5) * 1000, 2),
+            'p90': round(percentile(ordered, 0.9) * 1000, 2),
+            'p99': round(percentile(ordered, 0.99) * 1000, 2),
+            'max': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        },
+        'status': {str(code): n for code, n in sorted(statuses.items())},
+        'outbound': {
+            'zalo': dict(zalo.calls),
+            'sheets': dict(sheets.calls),
+        },
+        'outbound_per_request': {
+            'zalo_send': per_request(zalo.calls['send_message']),
+            'sheets_read': per_request(sheets.calls['values_get'] + sheets.calls['metadata']),
+            'sheets_write': per_request(sheets.calls['values_append']),
+            'throttled': per_request(zalo.calls['throttled'] + sheets.calls['throttled']),
+        },
+    }
+
+def print_report(report: Dict):
+    latency = report['latency_ms']
+    per_request = report['outbound_per_request']
+    print(f"Requests:     {report['requests']} ({report['mode']}, concurrency {report['concurrency']}, mix {report['mix']})")
+    print(f"Elapsed:      {report['elapsed_s']}s (+{report['drain_s']}s drain)")
+    print(f"Throughput:   {report['throughput_rps']} req/s")
+    print(f"Latency (ms): p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"Status:       {report['status']}")
+    print(f"Per request:  zalo_send {per_request['zalo_send']}  sheets_read {per_request['sheets_read']}"
+          f"  sheets_write {per_request['sheets_write']}  throttled {per_request['throttled']}")
+    print(f"Outbound:     zalo {report['outbound']['zalo']}  sheets {report['outbound']['sheets']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test offline cho /webhook với Zalo/Sheets giả')
+    parser.add_argument('--requests', type=int, default=500, help='Số webhook gửi vào')
+    parser.add_argument('--concurrency', type=int, default=20, help='Số request đồng thời')
+    parser.add_argument('--users', type=int, default=50, help='Số user khác nhau')
+    parser.add_argument('--statistics-ratio', type=float, default=0.1, help='Tỉ lệ lệnh thống kê')
+    parser.add_argument('--seed-rows', type=int, default=2000, help='Số giao dịch có sẵn trong sheet giả')
+    parser.add_argument('--zalo-latency-ms', type=float, default=50)
+    parser.add_argument('--zalo-429-rate', type=float, default=0.0)
+    parser.add_argument('--sheets-latency-ms', type=float, default=120)
+    parser.add_argument('--sheets-429-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Retry-After (giây) khi server giả trả 429')
+    parser.add_argument('--sheets-read-quota', type=float, default=0, help='Quota đọc Sheets/phút (0 = không giới hạn)')
+    parser.add_argument('--sheets-write-quota', type=float, default=0, help='Quota ghi Sheets/phút (0 = không giới hạn)')
+    parser.add_argument('--storage', choices=['sheets', 'sqlite', 'memory'], default='sheets',
+                        help='STORAGE_BACKEND của bot')
+    parser.add_argument('--mirror', action='store_true', help='Bật STORAGE_MIRROR_TO_SHEETS (với sqlite/memory)')
+    parser.add_argument('--async-webhook', action='store_true', help='Bật WEBHOOK_ASYNC_ENABLED (xử lý ở worker)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', action='store_true', help='In báo cáo dạng JSON')
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    users = [f'bench-user-{i}' for i in range(max(1, args.users))]
+
+    zalo = FakeZaloServer(args.zalo_latency_ms, args.zalo_429_rate, args.retry_after, seed=args.seed).start()
+    sheets = FakeSheetsServer(
+        args.sheets_latency_ms, args.sheets_429_rate, args.retry_after, seed=args.seed,
+        sheets={
+            'Giao dịch': [['Ngày giờ', 'Loại', 'Số tiền', 'Danh mục', 'Ghi chú', 'User ID']]
+                         + seed_transaction_rows(args.seed_rows, users, seed=args.seed),
+            'Danh mục': [['Tên danh mục', 'Loại', 'Mô tả']] + DEFAULT_CATEGORIES,
+        },
+        summaries={'Tổng hợp': 'Giao dịch'}
+    ).start()
+    configure_environment(args, zalo, sheets)
+
+    try:
+        from api.index import app, get_sheets_service, get_webhook_worker
+
+        # Khởi tạo service + nạp replica trước khi đo (cold start đo riêng)
+        started = time.perf_counter()
+        sheets_service = get_sheets_service()
+        sheets_service.sync_replica()
+        sheets_service.get_nlp_processor()
+        cold_start = time.perf_counter() - started
+        zalo.reset_counters()
+        sheets.reset_counters()
+
+        corpus = generate_corpus(args.requests, args.statistics_ratio, seed=args.seed)
+        latencies, statuses, elapsed = asyncio.run(replay(app, corpus, users, max(1, args.concurrency)))
+
+        # Chờ worker/write buffer xử lý hết để đếm đủ lời gọi ra ngoài
+        started = time.perf_counter()
+        if args.async_webhook:
+            get_webhook_worker().close()
+        sheets_service.flush_writes()
+        drain_seconds = time.perf_counter() - started
+
+        report = build_report(args, corpus, latencies, statuses, elapsed, drain_seconds, zalo, sheets)
+        report['cold_start_s'] = round(cold_start, 3)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print(f"Cold start:   {report['cold_start_s']}s")
+            print_report(report)
+        return 0
+    finally:
+        zalo.stop()
+        sheets.stop()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Microbenchmark + regression theo golden corpus cho NLPProcessor
+
+Chạy:
+  python -m benchmarks.nlp_bench                    # đo và so với baseline, exit 1 nếu tụt
+  python -m benchmarks.nlp_bench --show-failures 20 # in các tin nhắn parse sai
+  python -m benchmarks.nlp_bench --save-baseline    # ghi lại baseline sau khi cải thiện
+  python -m benchmarks.nlp_bench --regenerate       # sinh lại golden corpus (đổi nhãn mong đợi!)
+
+Throughput được so theo tỉ lệ với 1 vòng lặp hiệu chuẩn chạy cùng process (không phụ thuộc máy đo);
+--absolute-speed so thêm msg/s tuyệt đối (chỉ có nghĩa trên đúng máy đã ghi baseline).
+Dòng known_gap (lỗi đã biết, xem KNOWN_GAP_TAGS) được báo riêng, không tính vào accuracy.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.corpus import DEFAULT_CATEGORIES, golden_corpus
+from services.nlp_processor import NLPProcessor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+GOLDEN_PATH = os.path.join(DATA_DIR, 'nlp_golden.jsonl')
+BASELINE_PATH = os.path.join(DATA_DIR, 'nlp_baseline.json')
+FIELDS = ('loai', 'so_tien', 'danh_muc', 'ghi_chu')
+
+def load_golden(path: str = GOLDEN_PATH) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_golden(corpus: List[Dict], path: str = GOLDEN_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in corpus:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+def field_matches(field: str, expected, actual) -> bool:
+    if field == 'so_tien' and expected is not None and actual is not None:
+        return abs(expected - actual) < 1e-6
+    return expected == actual
+
+def evaluate(processor: NLPProcessor, corpus: List[Dict]) -> Dict:
+    """
+    Độ chính xác theo từng trường và theo tag (khớp cả 4 trường)
+
+    Dòng known_gap chỉ được đếm trong 'known_gaps' (theo tag), không vào exact/fields/tags/failures.
+    """
+    field_hits = dict.fromkeys(FIELDS, 0)
+    tag_totals: Dict[str, List[int]] = {}
+    gap_totals: Dict[str, List[int]] = {}
+    failures = []
+    count = 0
+    for item in corpus:
+        result = processor.process(item['message'])
+        wrong = [f for f in FIELDS if not field_matches(f, item['expected'][f], result[f])]
+        if item.get('known_gap'):
+            for tag in item['tags']:
+                totals = gap_totals.setdefault(tag, [0, 0])
+                totals[0] += not wrong
+                totals[1] += 1
+            continue
+        count += 1
+        for field in FIELDS:
+            if field not in wrong:
+                field_hits[field] += 1
+        for tag in item['tags']:
+            totals = tag_totals.setdefault(tag, [0, 0])
+            totals[0] += not wrong
+            totals[1] += 1
+        if wrong:
+            failures.append((item, {f: result[f] for f in FIELDS}, wrong))
+    return {
+        'exact': round(1 - len(failures) / count, 4) if count else 0.0,
+        'fields': {f: round(hits / count, 4) if count else 0.0 for f, hits in field_hits.items()},
+        'tags': {tag: round(ok / total, 4) for tag, (ok, total) in sorted(tag_totals.items())},
+        'known_gaps': {tag: round(ok / total, 4) for tag, (ok, total) in sorted(gap_totals.items())},
+        'failures': failures,
+    }
+
+def best_time(func: Callable, rounds: int) -> float:
+    """Thời gian nhỏ nhất qua nhiều lần chạy (ít nhiễu hơn trung bình)"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+_CALIBRATION_TEXT = 'Hôm nay chi 250k ăn uống phở bò với bạn'
+_CALIBRATION_RE = re.compile(r'\d+(?:[.,]\d+)?\s*(?:k|tr|triệu|nghìn)?')
+CALIBRATION_ITERATIONS = 20000
+
+def calibration_loop():
+    """Vòng lặp cố định cùng loại việc với NLP (lower/split/regex/dict) để đo tốc độ máy hiện tại"""
+    counts: Dict[str, int] = {}
+    for i in range(CALIBRATION_ITERATIONS):
+        words = _CALIBRATION_TEXT.lower().split()
+        word = words[i % len(words)]
+        counts[word] = counts.get(word, 0) + len(_CALIBRATION_RE.findall(_CALIBRATION_TEXT))
+    return counts
+
+def calibrate(rounds: int) -> float:
+    """Số vòng hiệu chuẩn/giây (lấy lần nhanh nhất)"""
+    calibration_loop()  # warm-up
+    return CALIBRATION_ITERATIONS / best_time(calibration_loop, rounds)
+
+def measure(processor: NLPProcessor, messages: List[str], rounds: int, processes: int = 0) -> Dict:
+    """Tin nhắn/giây của process(), process_many() và chi phí từng bước (µs/tin nhắn)"""
+    count = len(messages)
+    lowered = [m.lower().strip() for m in messages]
+
+    def run_process():
+        for message in messages:
+            processor.process(message)
+
+    def run_batch():
+        processor.process_many(messages)
+
+    def run_pool():
+        processor.process_many(messages, processes=processes)
+
+    # Đầu vào cho từng bước được tính sẵn để chỉ đo riêng bước đó
+    scanned = [
+        processor._scan_amounts(m) + processor._scan_categories(m) + processor._scan_keywords(m)
+        for m in lowered
+    ]
+    spans = [processor.tokenize(m) for m in lowered]
+    steps = {
+        'scan_amounts': lambda: [processor._scan_amounts(m) for m in lowered],
+        'scan_categories': lambda: [processor._scan_categories(m) for m in lowered],
+        'scan_keywords': lambda: [processor._scan_keywords(m) for m in lowered],
+        'scan_text': lambda: [processor._scan_text(m, s) for m, s in zip(lowered, scanned)],
+        'extract_loai': lambda: [processor._extract_loai(s) for s in spans],
+        'extract_so_tien': lambda: [processor._extract_so_tien(s) for s in spans],
+        'extract_danh_muc': lambda: [processor._extract_danh_muc(s) for s in spans],
+        'extract_ghi_chu': lambda: [processor._extract_ghi_chu(s) for s in spans],
+    }
+
+    run_process()  # warm-up
+    # Hiệu chuẩn trước và sau, lấy lần nhanh hơn: CPU đổi xung nhịp giữa chừng ảnh hưởng ít hơn
+    calibration = calibrate(rounds)
+    elapsed = best_time(run_process, rounds)
+    calibration = max(calibration, calibrate(rounds))
+    report = {
+        'messages': count,
+        'messages_per_second': round(count / elapsed, 1),
+        'calibration_per_second': round(calibration, 1),
+        # msg/s trên 1000 vòng hiệu chuẩn/s: so sánh được giữa các máy
+        'relative_throughput': round(count / elapsed / calibration * 1000, 3),
+        'us_per_message': round(elapsed / count * 1e6, 2),
+        'batch_messages_per_second': round(count / best_time(run_batch, rounds), 1),
+        'steps_us': {name: round(best_time(func, rounds) / count * 1e6, 2) for name, func in steps.items()},
+    }
+    if processes > 1:
+        report['pool_messages_per_second'] = round(count / best_time(run_pool, rounds), 1)
+    return report
+
+def check_regressions(report: Dict, baseline: Dict, accuracy_drop: float, max_slowdown: float,
+                      absolute_speed: bool = False) -> List[str]:
+    """
+    So với baseline, trả về danh sách vi phạm (rỗng = đạt)
+
+    Throughput so theo relative_throughput; msg/s tuyệt đối chỉ so khi absolute_speed=True.
+    """
+    problems = []
+    accuracy, base_accuracy = report['accuracy'], baseline.get('accuracy', {})
+    if accuracy['exact'] < base_accuracy.get('exact', 0) - accuracy_drop:
+        problems.append(f"exact accuracy {accuracy['exact']} < baseline {base_accuracy['exact']}")
+    for group in ('fields', 'tags'):
+        for name, value in base_accuracy.get(group, {}).items():
+            current = accuracy[group].get(name, 0)
+            if current < value - accuracy_drop:
+                problems.append(f"{group[:-1]} '{name}' accuracy {current} < baseline {value}")
+    base_relative = baseline.get('speed', {}).get('relative_throughput')
+    if base_relative and report['speed']['relative_throughput'] < base_relative * (1 - max_slowdown):
+        problems.append(
+            f"relative throughput {report['speed']['relative_throughput']} < "
+            f"{(1 - max_slowdown):.0%} of baseline {base_relative}"
+        )
+    base_mps = baseline.get('speed', {}).get('messages_per_second')
+    if absolute_speed and base_mps and report['speed']['messages_per_second'] < base_mps * (1 - max_slowdown):
+        problems.append(
+            f"throughput {report['speed']['messages_per_second']} msg/s < "
+            f"{(1 - max_slowdown):.0%} of baseline {base_mps} msg/s"
+        )
+    return problems
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark + golden-corpus regression cho NLPProcessor')
+    parser.add_argument('--golden', default=GOLDEN_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--rounds', type=int, default=5, help='Số lần đo, lấy lần nhanh nhất')
+    parser.add_argument('--processes', type=int, default=0, help='Đo thêm process_many với process pool')
+    parser.add_argument('--accuracy-drop', type=float, default=0.002, help='Mức tụt accuracy cho phép')
+    parser.add_argument('--max-slowdown', type=float, default=0.3, help='Mức chậm đi cho phép so với baseline')
+    parser.add_argument('--absolute-speed', action='store_true',
+                        help='So cả msg/s tuyệt đối với baseline (chỉ dùng trên máy đã ghi baseline)')
+    parser.add_argument('--show-failures', type=int, default=0, help='In N tin nhắn parse sai')
+    parser.add_argument('--save-baseline', action='store_true', help='Ghi kết quả hiện tại làm baseline')
+    parser.add_argument('--regenerate', action='store_true', help='Sinh lại golden corpus')
+    parser.add_argument('--count', type=int, default=3000, help='Số tin nhắn khi --regenerate')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--json', action='store_true', help='In báo cáo dạng JSON')
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.regenerate:
+        save_golden(golden_corpus(args.count, seed=args.seed), args.golden)
+        print(f"Wrote {args.count} messages to {args.golden}")
+
+    corpus = load_golden(args.golden)
+    processor = NLPProcessor(categories=[row[0] for row in DEFAULT_CATEGORIES])
+    accuracy = evaluate(processor, corpus)
+    failures = accuracy.pop('failures')
+    report = {
+        'accuracy': accuracy,
+        'speed': measure(processor, [item['message'] for item in corpus], max(1, args.rounds), args.processes),
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        speed = report['speed']
+        print(f"Corpus:     {len(corpus)} messages ({args.golden})")
+        print(f"Accuracy:   exact {accuracy['exact']:.2%}  "
+              + '  '.join(f'{f} {v:.2%}' for f, v in accuracy['fields'].items()))
+        print(f"By tag:     " + '  '.join(f'{t} {v:.2%}' for t, v in accuracy['tags'].items()))
+        if accuracy['known_gaps']:
+            print(f"Known gaps: " + '  '.join(f'{t} {v:.2%}' for t, v in accuracy['known_gaps'].items())
+                  + "  (không tính vào accuracy)")
+        print(f"Throughput: {speed['messages_per_second']} msg/s ({speed['us_per_message']} µs/msg), "
+              f"relative {speed['relative_throughput']}, "
+              f"process_many {speed['batch_messages_per_second']} msg/s"
+              + (f", pool {speed['pool_messages_per_second']} msg/s" if 'pool_messages_per_second' in speed else ''))
+        print(f"Steps (µs): " + '  '.join(f'{name} {us}' for name, us in speed['steps_us'].items()))
+    for item, actual, wrong in failures[:args.show_failures]:
+        print(f"  ✗ {item['message']!r} {item['tags']} wrong={wrong} expected={item['expected']} got={actual}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    problems = check_regressions(report, baseline, args.accuracy_drop, args.max_slowdown, args.absolute_speed)
+    for problem in problems:
+        print(f"❌ Regression: {problem}")
+    if not problems:
+        print("✅ No regression against baseline")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,22 +14,117 @@ ZALO_ACCESS_TOKEN = os.getenv('ZALO_ACCESS_TOKEN')
 ZALO_SECRET_KEY = os.getenv('ZALO_SECRET_KEY')
 ZALO_OA_ID = os.getenv('ZALO_OA_ID')
 ZALO_USE_NEW_API = os.getenv('ZALO_USE_NEW_API', 'false').lower() == 'true'
+ZALO_POOL_SIZE = int(os.getenv('ZALO_POOL_SIZE', '10'))
+ZALO_MAX_RETRIES = int(os.getenv('ZALO_MAX_RETRIES', '3'))
+ZALO_RETRY_BACKOFF = float(os.getenv('ZALO_RETRY_BACKOFF', '0.5'))
+ZALO_MAX_BACKOFF = float(os.getenv('ZALO_MAX_BACKOFF', '10'))
+ZALO_TIMEOUT = float(os.getenv('ZALO_TIMEOUT', '10'))
+# Ghi đè base URL của Zalo API (để trống = URL chính thức; dùng cho load test với server giả)
+ZALO_API_BASE_URL = os.getenv('ZALO_API_BASE_URL', '')
 
 # Google Sheets Config
 GOOGLE_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', './credentials/service_account.json')
 GOOGLE_SHEET_ID = os.getenv('GOOGLE_SHEET_ID')
+# Ghi đè base URL của Sheets API, bỏ qua xác thực (để trống = Google thật; dùng cho load test với server giả)
+GOOGLE_SHEETS_API_BASE_URL = os.getenv('GOOGLE_SHEETS_API_BASE_URL', '')
 
 # Sheet names
 SHEET_NAME_TRANSACTIONS = 'Giao dịch'
 SHEET_NAME_CATEGORIES = 'Danh mục'
+SHEET_NAME_SUMMARY = 'Tổng hợp'
+SHEET_NAME_ARCHIVE = 'Lưu trữ'
+
+# Sheet tổng hợp (công thức QUERY theo user/tháng/danh mục/loại): instance chưa có replica
+# trả lời thống kê bằng 1 lần đọc nhỏ thay vì tải toàn bộ sheet giao dịch
+SUMMARY_SHEET_ENABLED = os.getenv('SUMMARY_SHEET_ENABLED', 'true').lower() == 'true'
+
+# Chia sheet giao dịch theo tháng ('Giao dịch 2026-10'): ghi vào partition của tháng, truy vấn chỉ đọc
+# các partition giao với kỳ cần tính; partition cũ hơn N tháng được nén vào sheet 'Lưu trữ' (0 = không nén)
+TRANSACTION_PARTITIONS_ENABLED = os.getenv('TRANSACTION_PARTITIONS_ENABLED', 'false').lower() == 'true'
+PARTITION_ARCHIVE_AFTER_MONTHS = int(os.getenv('PARTITION_ARCHIVE_AFTER_MONTHS', '12'))
+
+# Nơi lưu giao dịch: 'sheets' (Google Sheets), 'sqlite' (file SQLite cục bộ) hoặc 'memory' (chỉ trong bộ nhớ,
+# mất khi tắt process - dùng cho test/benchmark). Với sqlite/memory, bật STORAGE_MIRROR_TO_SHEETS để ghi local
+# trước rồi sao chép sang Google Sheets ở background (chỉ dùng cho server thường trực, không dùng trên Vercel)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sheets').lower()
+STORAGE_SQLITE_PATH = os.getenv('STORAGE_SQLITE_PATH', '/tmp/botchitieu_storage.db')
+STORAGE_MIRROR_TO_SHEETS = os.getenv('STORAGE_MIRROR_TO_SHEETS', 'false').lower() == 'true'
+STORAGE_MIRROR_BATCH_SIZE = int(os.getenv('STORAGE_MIRROR_BATCH_SIZE', '200'))
+STORAGE_MIRROR_RETRY_SECONDS = float(os.getenv('STORAGE_MIRROR_RETRY_SECONDS', '5'))
+
+# Local replica (SQLite) của sheet giao dịch
+LOCAL_REPLICA_ENABLED = os.getenv('LOCAL_REPLICA_ENABLED', 'true').lower() == 'true'
+LOCAL_REPLICA_PATH = os.getenv('LOCAL_REPLICA_PATH', '/tmp/botchitieu_replica.db')
+LOCAL_REPLICA_RECONCILE_SECONDS = int(os.getenv('LOCAL_REPLICA_RECONCILE_SECONDS', '3600'))
+
+# Quota Google Sheets API của instance (lượt/phút, 0 = không giới hạn). Mặc định Google: 60 đọc + 60 ghi
+# mỗi phút cho 1 service account; chạy nhiều instance thì chia quota cho số instance
+SHEETS_READ_QUOTA_PER_MINUTE = float(os.getenv('SHEETS_READ_QUOTA_PER_MINUTE', '60'))
+SHEETS_WRITE_QUOTA_PER_MINUTE = float(os.getenv('SHEETS_WRITE_QUOTA_PER_MINUTE', '60'))
+SHEETS_QUOTA_BURST = int(os.getenv('SHEETS_QUOTA_BURST', '10'))
+SHEETS_MAX_QUEUE_WAIT_SECONDS = float(os.getenv('SHEETS_MAX_QUEUE_WAIT_SECONDS', '30'))
+# Retry khi bị 429/5xx: backoff lũy thừa từ SHEETS_RETRY_BACKOFF đến SHEETS_MAX_BACKOFF giây
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+SHEETS_RETRY_BACKOFF = float(os.getenv('SHEETS_RETRY_BACKOFF', '1.0'))
+SHEETS_MAX_BACKOFF = float(os.getenv('SHEETS_MAX_BACKOFF', '32'))
+
+# Cold start: cache access token OAuth + metadata sheet trong /tmp để khởi động lại không phải gọi Google
+COLD_START_CACHE_ENABLED = os.getenv('COLD_START_CACHE_ENABLED', 'true').lower() == 'true'
+COLD_START_CACHE_DIR = os.getenv('COLD_START_CACHE_DIR', '/tmp')
+COLD_START_METADATA_TTL_SECONDS = int(os.getenv('COLD_START_METADATA_TTL_SECONDS', '86400'))
+
+# Khi không dùng được SQLite (tắt hoặc filesystem chỉ đọc): giữ giao dịch trong bộ nhớ dạng cột
+COLUMNAR_STORE_ENABLED = os.getenv('COLUMNAR_STORE_ENABLED', 'true').lower() == 'true'
+
+# Write buffer: gom nhiều giao dịch vào 1 lần append_rows
+WRITE_BUFFER_ENABLED = os.getenv('WRITE_BUFFER_ENABLED', 'true').lower() == 'true'
+WRITE_BUFFER_MAX_ROWS = int(os.getenv('WRITE_BUFFER_MAX_ROWS', '20'))
+WRITE_BUFFER_MAX_DELAY_MS = int(os.getenv('WRITE_BUFFER_MAX_DELAY_MS', '200'))
+
+# Cache danh mục (giây)
+CATEGORY_CACHE_TTL_SECONDS = int(os.getenv('CATEGORY_CACHE_TTL_SECONDS', '300'))
+
+# Cache báo cáo thống kê theo (user, tháng, năm); bị xóa khi ghi giao dịch vào kỳ đó.
+# TTL chặn dữ liệu cũ khi có instance khác cùng ghi sheet
+STATS_CACHE_ENABLED = os.getenv('STATS_CACHE_ENABLED', 'true').lower() == 'true'
+STATS_CACHE_MAX_ENTRIES = int(os.getenv('STATS_CACHE_MAX_ENTRIES', '1000'))
+STATS_CACHE_MAX_BYTES = int(os.getenv('STATS_CACHE_MAX_BYTES', '1048576'))
+STATS_CACHE_TTL_SECONDS = int(os.getenv('STATS_CACHE_TTL_SECONDS', '300'))
+
+# Nhập hàng loạt: tin nhắn nhiều dòng / nội dung CSV, tối đa số dòng mỗi lần
+BULK_IMPORT_MAX_LINES = int(os.getenv('BULK_IMPORT_MAX_LINES', '500'))
+
+# Webhook async: trả 200 ngay, xử lý tin nhắn ở background worker
+# Lưu ý: trên Vercel function bị đóng băng sau khi trả response, chỉ bật khi chạy server thường trực
+WEBHOOK_ASYNC_ENABLED = os.getenv('WEBHOOK_ASYNC_ENABLED', 'false').lower() == 'true'
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '100'))
+
+# Thread pool riêng cho lời gọi Google Sheets từ handler async (không chặn event loop)
+SHEETS_ASYNC_WORKERS = int(os.getenv('SHEETS_ASYNC_WORKERS', '8'))
+
+# Chống xử lý trùng khi Zalo gửi lại webhook
+WEBHOOK_DEDUP_ENABLED = os.getenv('WEBHOOK_DEDUP_ENABLED', 'true').lower() == 'true'
+WEBHOOK_DEDUP_MAX_SIZE = int(os.getenv('WEBHOOK_DEDUP_MAX_SIZE', '10000'))
+WEBHOOK_DEDUP_TTL_SECONDS = int(os.getenv('WEBHOOK_DEDUP_TTL_SECONDS', '3600'))
+WEBHOOK_DEDUP_DB_PATH = os.getenv('WEBHOOK_DEDUP_DB_PATH', '')  # Để trống = chỉ giữ trong bộ nhớ
+
+# Metrics (endpoint /metrics, Prometheus format). Tắt thì gần như không tốn chi phí
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Logging có cấu trúc: level, tỉ lệ giữ lại log debug khối lượng lớn, JSON hay text
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+LOG_JSON = os.getenv('LOG_JSON', 'true').lower() == 'true'
 
 def validate_config():
     """Validate config khi cần (lazy validation)"""
     errors = []
     if not ZALO_ACCESS_TOKEN:
         errors.append("ZALO_ACCESS_TOKEN is required")
-    if not GOOGLE_SHEET_ID:
+    if STORAGE_BACKEND not in ('sheets', 'sqlite', 'memory'):
+        errors.append("STORAGE_BACKEND must be one of: sheets, sqlite, memory")
+    if (STORAGE_BACKEND == 'sheets' or STORAGE_MIRROR_TO_SHEETS) and not GOOGLE_SHEET_ID:
         errors.append("GOOGLE_SHEET_ID is required")
     if errors:
         raise ValueError("Config errors: " + ", ".join(errors))
-
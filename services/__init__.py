@@ -1,4 +1,20 @@
-from .nlp_processor import NLPProcessor
-from .google_sheets import GoogleSheetsService
-from .zalo_bot import ZaloBotService
+# Import khi truy cập lần đầu (PEP 562): import services.bulk_import, services.nlp_processor, ...
+# không kéo theo gspread/google-auth/requests, để cold start chỉ trả chi phí đó khi thật sự dùng Sheets/Zalo
+_EXPORTS = {
+    'NLPProcessor': 'nlp_processor',
+    'GoogleSheetsService': 'google_sheets',
+    'TransactionStorage': 'storage',
+    'create_storage': 'storage',
+    'ZaloBotService': 'zalo_bot',
+}
 
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f'{__name__}.{module}'), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,113 @@
+import contextvars
+import queue
+import threading
+from typing import Callable, Dict
+from utils.logger import get_logger
+
+logger = get_logger('worker')
+
+class BackgroundWorker:
+    """
+    Pool thread cố định + hàng đợi giới hạn để xử lý tin nhắn sau khi webhook đã trả 200
+
+    Khi hàng đợi đầy, submit() trả về False (backpressure) để webhook báo lỗi
+    cho Zalo gửi lại sau, thay vì nhận thêm việc không kịp xử lý.
+    """
+
+    def __init__(self, num_workers: int = 4, max_queue: int = 100, name: str = 'webhook-worker'):
+        """
+        Khởi tạo worker
+
+        Args:
+            num_workers: Số thread xử lý song song
+            max_queue: Số việc tối đa được chờ trong hàng đợi
+            name: Tiền tố tên thread (để debug)
+        """
+        self.num_workers = max(1, num_workers)
+        self.max_queue = max(1, max_queue)
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable, *args, **kwargs) -> bool:
+        """
+        Đưa 1 việc vào hàng đợi
+
+        Returns:
+            True nếu đã nhận, False nếu hàng đợi đầy hoặc worker đã dừng
+        """
+        with self._lock:
+            if self._closed:
+                self._rejected += 1
+                return False
+            self._ensure_started()
+        try:
+            # Giữ context (request_id) để log trong worker gắn đúng request
+            self._queue.put_nowait((contextvars.copy_context(), func, args, kwargs))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            context, func, args, kwargs = job
+            with self._lock:
+                self._in_flight += 1
+            try:
+                context.run(func, *args, **kwargs)
+                ok = True
+            except Exception as e:
+                logger.exception("Error in background job %s: %s", getattr(func, '__name__', func), e)
+                ok = False
+            with self._lock:
+                self._in_flight -= 1
+                if ok:
+                    self._processed += 1
+                else:
+                    self._failed += 1
+            self._queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        """Độ sâu hàng đợi và số việc đã xử lý (dùng cho endpoint /queue)"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self.max_queue,
+                'in_flight': self._in_flight,
+                'workers': self.num_workers,
+                'processed': self._processed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+            }
+
+    def close(self, timeout: float = 30):
+        """Ngừng nhận việc mới, xử lý hết việc đang chờ rồi dừng các thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=timeout)
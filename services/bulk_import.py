@@ -0,0 +1,187 @@
+import csv
+import re
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from services.date_range import _fold
+
+# Tiền tố ngày ở đầu dòng để nhập bù: "12/3 chi 50k ăn uống", "12/03/2026: chi 50k ăn uống"
+DATE_PREFIX_PATTERN = re.compile(r'^\s*(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\s*[:\-]?\s+')
+
+# Tên cột CSV được chấp nhận (so khớp sau khi bỏ dấu, viết thường)
+CSV_COLUMNS = {
+    'ngay': 'ngay_gio', 'ngay gio': 'ngay_gio', 'date': 'ngay_gio',
+    'loai': 'loai', 'type': 'loai',
+    'so tien': 'so_tien', 'amount': 'so_tien',
+    'danh muc': 'danh_muc', 'category': 'danh_muc',
+    'ghi chu': 'ghi_chu', 'note': 'ghi_chu',
+}
+CSV_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d/%m')
+# Từ khóa lệnh thống kê (so khớp chuỗi con, viết thường)
+STATISTICS_KEYWORDS = ('thống kê', 'thong ke', 'tk', 'stat')
+
+class BulkLine(NamedTuple):
+    """1 dòng trong lô nhập: line_no tính từ 1 theo tin nhắn gốc"""
+    line_no: int
+    text: str
+    transaction: Optional[Dict]
+    error: Optional[str]
+
+class BulkResult(NamedTuple):
+    accepted: List[BulkLine]
+    rejected: List[BulkLine]
+
+def is_statistics_command(text: str) -> bool:
+    """
+    Lệnh thống kê: có từ khóa ở dòng không rỗng đầu tiên
+
+    Kiểm tra trước is_bulk_message, để lệnh viết nhiều dòng ('thống kê\ntháng 3') không bị nhập như 1 lô.
+    """
+    first_line = next((line for line in text.splitlines() if line.strip()), '').lower()
+    return any(keyword in first_line for keyword in STATISTICS_KEYWORDS)
+
+def is_bulk_message(text: str) -> bool:
+    """Tin nhắn có từ 2 dòng không rỗng trở lên thì xử lý theo lô"""
+    return sum(1 for line in text.splitlines() if line.strip()) >= 2
+
+def _csv_header(line: str) -> Optional[List[str]]:
+    """Trả về tên trường chuẩn nếu dòng là header CSV (phải có ít nhất số tiền và danh mục)"""
+    if ',' not in line and ';' not in line:
+        return None
+    delimiter = ';' if line.count(';') > line.count(',') else ','
+    fields = [CSV_COLUMNS.get(_fold(name.strip())) for name in next(csv.reader([line], delimiter=delimiter))]
+    if 'so_tien' not in fields or 'danh_muc' not in fields:
+        return None
+    return fields
+
+def _parse_date(value: str, now: datetime) -> Optional[str]:
+    value = value.strip()
+    if not value:
+        return None
+    for fmt in CSV_DATE_FORMATS:
+        try:
+            if fmt == '%d/%m':
+                # strptime không có năm mặc định là 1900 (không nhuận): ghép năm hiện tại để '29/02' hợp lệ
+                parsed = datetime.strptime(f'{value}/{now.year}', '%d/%m/%Y')
+            else:
+                parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d/%m'):
+            parsed = parsed.replace(hour=now.hour, minute=now.minute, second=now.second)
+        return parsed.strftime('%Y-%m-%d %H:%M:%S')
+    raise ValueError(f"ngày không hợp lệ '{value}'")
+
+def _split_date_prefix(line: str, now: datetime) -> Tuple[Optional[str], str]:
+    match = DATE_PREFIX_PATTERN.match(line)
+    if not match:
+        return None, line
+    day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3) or now.year)
+    try:
+        date = now.replace(year=year, month=month, day=day)
+    except ValueError:
+        return None, line
+    return date.strftime('%Y-%m-%d %H:%M:%S'), line[match.end():]
+
+def _parse_csv(processor, lines: List[Tuple[int, str]], fields: List[str], now: datetime) -> BulkResult:
+    """Các dòng dữ liệu CSV: loại, số tiền, danh mục bắt buộc; ngày, ghi chú tùy chọn"""
+    categories = {category.lower(): category for category in processor.categories}
+    delimiter = ';' if lines[0][1].count(';') > lines[0][1].count(',') else ','
+    accepted, rejected = [], []
+    for line_no, text in lines[1:]:
+        values = next(csv.reader([text], delimiter=delimiter))
+        row = {field: value.strip() for field, value in zip(fields, values) if field}
+        try:
+            loai = {'thu': 'Thu', 'chi': 'Chi'}.get(_fold(row.get('loai', '').strip()))
+            if loai is None:
+                raise ValueError("thiếu loại (Thu/Chi)")
+            so_tien = processor.parse_amount(row.get('so_tien', ''))
+            if so_tien is None:
+                raise ValueError("số tiền không hợp lệ")
+            danh_muc = categories.get(row.get('danh_muc', '').lower())
+            if danh_muc is None:
+                raise ValueError(f"danh mục không có: '{row.get('danh_muc', '')}'")
+            transaction = {
+                'loai': loai,
+                'so_tien': so_tien,
+                'danh_muc': danh_muc,
+                'ghi_chu': row.get('ghi_chu', ''),
+                'ngay_gio': _parse_date(row.get('ngay_gio', ''), now),
+            }
+            accepted.append(BulkLine(line_no, text, transaction, None))
+        except ValueError as e:
+            rejected.append(BulkLine(line_no, text, None, str(e)))
+    return BulkResult(accepted, rejected)
+
+def _parse_free_text(processor, lines: List[Tuple[int, str]], now: datetime) -> BulkResult:
+    """Mỗi dòng là 1 tin nhắn giao dịch thường, có thể kèm tiền tố ngày"""
+    dated = [_split_date_prefix(text, now) for _, text in lines]
+    results = processor.process_many(message for _, message in dated)
+    accepted, rejected = [], []
+    for (line_no, text), (ngay_gio, _), transaction in zip(lines, dated, results):
+        if transaction.get('is_valid'):
+            transaction['ngay_gio'] = ngay_gio
+            accepted.append(BulkLine(line_no, text, transaction, None))
+            continue
+        missing = []
+        if not transaction.get('loai'):
+            missing.append("loại")
+        if not transaction.get('so_tien'):
+            missing.append("số tiền")
+        if not transaction.get('danh_muc'):
+            missing.append("danh mục")
+        rejected.append(BulkLine(line_no, text, None, "thiếu " + ", ".join(missing)))
+    return BulkResult(accepted, rejected)
+
+def parse_bulk_message(processor, text: str, max_lines: int = 500,
+                       now: Optional[datetime] = None) -> BulkResult:
+    """
+    Parse 1 tin nhắn nhiều dòng (hoặc nội dung CSV) thành các giao dịch
+
+    Dòng đầu là header CSV (vd 'Ngày,Loại,Số tiền,Danh mục,Ghi chú') thì đọc theo cột;
+    nếu không, mỗi dòng được parse như 1 tin nhắn qua NLPProcessor.process_many.
+
+    Args:
+        processor: NLPProcessor dựng sẵn theo danh mục hiện tại
+        text: Nội dung tin nhắn
+        max_lines: Số dòng tối đa mỗi lần nhập, phần dư bị từ chối
+        now: Thời điểm ghi cho dòng không có ngày (mặc định datetime.now())
+
+    Returns:
+        BulkResult(accepted, rejected)
+    """
+    now = now or datetime.now()
+    lines = [(i, line.strip()) for i, line in enumerate(text.splitlines(), start=1) if line.strip()]
+    if not lines:
+        return BulkResult([], [])
+    fields = _csv_header(lines[0][1])
+    limit = max_lines + 1 if fields else max_lines
+    overflow = [BulkLine(line_no, line, None, f"vượt quá {max_lines} dòng mỗi lần nhập")
+                for line_no, line in lines[limit:]]
+    lines = lines[:limit]
+    if fields:
+        result = _parse_csv(processor, lines, fields, now)
+    else:
+        result = _parse_free_text(processor, lines, now)
+    return BulkResult(result.accepted, result.rejected + overflow)
+
+def format_bulk_summary(result: BulkResult, saved: bool, max_listed: int = 20) -> str:
+    """Nội dung phản hồi: số dòng nhận, tổng Thu/Chi, danh sách dòng bị bỏ qua"""
+    total = len(result.accepted) + len(result.rejected)
+    lines = []
+    if result.accepted and saved:
+        total_thu = sum(line.transaction['so_tien'] for line in result.accepted if line.transaction['loai'] == 'Thu')
+        total_chi = sum(line.transaction['so_tien'] for line in result.accepted if line.transaction['loai'] == 'Chi')
+        lines.append(f"✅ Đã nhập {len(result.accepted)}/{total} giao dịch")
+        lines.append(f"• Tổng thu: {total_thu:,.0f} VNĐ")
+        lines.append(f"• Tổng chi: {total_chi:,.0f} VNĐ")
+    elif result.accepted:
+        lines.append("❌ Có lỗi xảy ra khi ghi dữ liệu. Vui lòng thử lại sau.")
+    else:
+        lines.append(f"❌ Không nhập được dòng nào ({total} dòng)")
+    if result.rejected:
+        lines.append(f"\n⚠️ Bỏ qua {len(result.rejected)} dòng:")
+        for line in result.rejected[:max_listed]:
+            lines.append(f"• Dòng {line.line_no}: {line.text[:40]} ({line.error})")
+        if len(result.rejected) > max_listed:
+            lines.append(f"• ... và {len(result.rejected) - max_listed} dòng khác")
+    return '\n'.join(lines)
@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from utils.metrics import metrics
+
+class CategoryCache:
+    """
+    Cache danh mục có TTL, invalidate thủ công và version
+
+    Mỗi version đi kèm 1 NLPProcessor dựng sẵn, dùng lại cho mọi tin nhắn
+    cho đến khi danh sách danh mục thay đổi.
+    """
+
+    def __init__(self, loader: Callable[[], List[str]], ttl: float = 300, retry_ttl: float = 30,
+                 fallback: Optional[List[str]] = None):
+        """
+        Khởi tạo cache
+
+        Args:
+            loader: Hàm đọc danh sách danh mục (ví dụ từ sheet 'Danh mục'), trả rỗng khi lỗi
+            ttl: Số giây trước khi tải lại danh mục
+            retry_ttl: Số giây chờ trước khi thử lại sau 1 lần tải lỗi
+            fallback: Danh mục dùng tạm khi chưa tải được lần nào (ví dụ danh mục mặc định)
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+        self.fallback = list(fallback or [])
+        self.version = 0
+        self._categories: List[str] = []
+        self._processor = None
+        self._expires_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        fresh = self._expires_at is not None and time.monotonic() < self._expires_at
+        metrics.inc('cache_hits_total' if fresh else 'cache_misses_total', cache='categories')
+        return fresh
+
+    def _refresh_locked(self):
+        """Tải lại danh mục, chỉ tăng version khi danh sách thay đổi"""
+        categories = self.loader()
+        if categories:
+            self._expires_at = time.monotonic() + self.ttl
+        else:
+            # Lỗi đọc sheet trả về rỗng: không đọc lại ở mọi tin nhắn, chờ retry_ttl rồi mới thử lại.
+            # Trong lúc đó giữ bản cũ; chưa có bản nào thì dùng fallback (không cache danh sách rỗng cả TTL)
+            self._expires_at = time.monotonic() + self.retry_ttl
+            if self._categories and self._processor is not None:
+                return
+            categories = self.fallback
+        if categories != self._categories or self._processor is None:
+            from services.nlp_processor import NLPProcessor
+            self._categories = list(categories)
+            self._processor = NLPProcessor(categories=self._categories)
+            self.version += 1
+
+    def get(self) -> Tuple[int, List[str]]:
+        """
+        Lấy danh mục hiện tại
+
+        Returns:
+            (version, danh sách danh mục)
+        """
+        with self._lock:
+            if not self._is_fresh():
+                self._refresh_locked()
+            return self.version, list(self._categories)
+
+    def get_processor(self):
+        """
+        Lấy NLPProcessor dựng sẵn cho version hiện tại
+
+        Returns:
+            NLPProcessor (dùng chung, không được sửa categories)
+        """
+        with self._lock:
+            if not self._is_fresh():
+                self._refresh_locked()
+            return self._processor
+
+    def invalidate(self):
+        """Buộc tải lại danh mục ở lần truy cập tiếp theo"""
+        with self._lock:
+            self._expires_at = None
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from utils.logger import get_logger
+
+logger = get_logger('cold_start')
+
+class ColdStartCache:
+    """
+    Cache trên đĩa (/tmp) cho những thứ mỗi lần khởi động phải lấy lại từ Google
+
+    - Access token OAuth: tiến trình mới trong cùng container dùng lại token còn hạn,
+      không phải gọi endpoint token.
+    - Metadata spreadsheet/worksheet: mở sheet không cần open_by_key + worksheet()
+      (3 lần đọc metadata).
+    File ghi nguyên tử (tạo file tạm rồi os.replace), quyền 0600.
+    """
+
+    # Token còn hạn ít hơn mức này thì coi như hết hạn, để google-auth tự refresh
+    TOKEN_MIN_REMAINING = 300
+
+    def __init__(self, cache_dir: str = '/tmp', metadata_ttl: float = 86400):
+        """
+        Args:
+            cache_dir: Thư mục lưu file cache
+            metadata_ttl: Số giây metadata còn được dùng (sheet bị đổi tên/xóa sẽ tự hết hạn)
+        """
+        self.cache_dir = cache_dir
+        self.metadata_ttl = metadata_ttl
+
+    def _path(self, kind: str, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'botchitieu_{kind}_{digest}.json')
+
+    def _read(self, kind: str, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(kind, key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, kind: str, key: str, data: Dict) -> None:
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.botchitieu_')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._path(kind, key))
+        except OSError as e:
+            logger.warning("Could not write cold start cache (%s): %s", kind, e)
+
+    def _drop(self, kind: str, key: str) -> None:
+        try:
+            os.unlink(self._path(kind, key))
+        except OSError:
+            pass
+
+    def load_token(self, credentials) -> bool:
+        """
+        Gắn access token đã cache vào credentials nếu còn hạn
+
+        Args:
+            credentials: google.oauth2.service_account.Credentials
+
+        Returns:
+            True nếu đã dùng token từ cache
+        """
+        data = self._read('token', credentials.service_account_email)
+        if not data or data.get('expiry', 0) - time.time() < self.TOKEN_MIN_REMAINING:
+            return False
+        credentials.token = data['token']
+        # google-auth so sánh expiry dạng datetime UTC không có tzinfo
+        credentials.expiry = datetime.utcfromtimestamp(data['expiry'])
+        return True
+
+    def save_token(self, credentials) -> None:
+        """Lưu access token hiện tại của credentials (nếu có)"""
+        if not credentials.token or not credentials.expiry:
+            return
+        expiry = (credentials.expiry - datetime(1970, 1, 1)).total_seconds()
+        self._write('token', credentials.service_account_email, {'token': credentials.token, 'expiry': expiry})
+
+    def load_metadata(self, spreadsheet_id: str) -> Optional[Dict]:
+        """
+        Metadata đã cache của spreadsheet
+
+        Returns:
+            {'spreadsheet': properties, 'worksheets': {title: properties}} hoặc None nếu chưa có / hết hạn
+        """
+        data = self._read('metadata', spreadsheet_id)
+        if not data or time.time() - data.get('saved_at', 0) >= self.metadata_ttl:
+            return None
+        return data
+
+    def save_metadata(self, spreadsheet_id: str, spreadsheet: Dict, worksheets: Dict[str, Dict]) -> None:
+        """Lưu properties của spreadsheet và các worksheet đang dùng"""
+        self._write('metadata', spreadsheet_id, {
+            'spreadsheet': spreadsheet,
+            'worksheets': worksheets,
+            'saved_at': time.time(),
+        })
+
+    def drop_metadata(self, spreadsheet_id: str) -> None:
+        """Xóa metadata đã cache (khi sheet trả lỗi do range/sheet không còn)"""
+        self._drop('metadata', spreadsheet_id)
@@ -0,0 +1,362 @@
+import calendar
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+from services.rollups import MonthlyRollups
+from services.date_index import DateIndex
+
+# Mốc cho dòng có 'Ngày giờ' sai format: xếp cũ nhất, không tính vào thống kê
+INVALID_TS = -(2 ** 62)
+FIELDS = ('Ngày giờ', 'Loại', 'Số tiền', 'Danh mục', 'Ghi chú', 'User ID')
+
+def parse_timestamp(ngay_gio: str) -> Optional[int]:
+    """'YYYY-MM-DD[ HH:MM:SS]' -> số giây (giờ địa phương coi như UTC), None nếu sai format"""
+    try:
+        year, month, day = int(ngay_gio[0:4]), int(ngay_gio[5:7]), int(ngay_gio[8:10])
+        hour = int(ngay_gio[11:13] or 0)
+        minute = int(ngay_gio[14:16] or 0)
+        second = int(ngay_gio[17:19] or 0)
+        if not 1 <= month <= 12 or not 1 <= day <= 31 or (day > 28 and day > calendar.monthrange(year, month)[1]):
+            return None
+        return calendar.timegm((year, month, day, hour, minute, second))
+    except (TypeError, ValueError):
+        return None
+
+def _is_canonical(ngay_gio: str) -> bool:
+    """Đúng dạng 'YYYY-MM-DD HH:MM:SS' thì dựng lại được từ timestamp, không cần giữ chuỗi gốc"""
+    return (len(ngay_gio) == 19 and ngay_gio[4] == ngay_gio[7] == '-' and ngay_gio[10] == ' '
+            and ngay_gio[13] == ngay_gio[16] == ':')
+
+def format_timestamp(ts: int) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+class _Interner:
+    """Bảng chuỗi: mỗi giá trị lặp lại (user, danh mục, loại, ghi chú) chỉ lưu 1 lần, cột giữ mã số nguyên"""
+
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class _TimeOrder:
+    """Chỉ số dòng sắp theo (timestamp, chỉ số): dòng mới nhất (thường gặp) chỉ cần append"""
+
+    __slots__ = ('timestamps', 'indices')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.indices = array('I')
+
+    def add(self, ts: int, index: int) -> None:
+        if not self.timestamps or ts >= self.timestamps[-1]:
+            self.timestamps.append(ts)
+            self.indices.append(index)
+            return
+        # Nhập bù ngày cũ: chỉ số mới luôn lớn nhất nên đứng sau các dòng cùng timestamp
+        pos = bisect_right(self.timestamps, ts)
+        self.timestamps.insert(pos, ts)
+        self.indices.insert(pos, index)
+
+    def newest(self, start: int, end: int, limit: int) -> List[int]:
+        """Chỉ số của `limit` dòng mới nhất có timestamp trong [start, end), O(log n + limit)"""
+        lo = bisect_left(self.timestamps, start)
+        hi = bisect_left(self.timestamps, end, lo)
+        return list(reversed(self.indices[max(lo, hi - limit):hi]))
+
+class _Columns:
+    """
+    Dữ liệu dạng cột, chỉ append
+
+    Rollup theo tháng, DateIndex và thứ tự thời gian theo user được cập nhật theo từng dòng
+    như LocalReplica, nên thống kê không phải duyệt lại các cột.
+    replace_all() tạo _Columns mới thay vì xóa, nên TransactionView
+    đang giữ bản cũ vẫn đọc đúng dòng của nó.
+    """
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.periods = array('i')       # năm * 12 + tháng - 1, -1 nếu ngày sai format
+        self.amounts = array('d')
+        self.types = array('I')
+        self.categories = array('I')
+        self.users = array('I')
+        self.notes = array('I')
+        self.type_table = _Interner()
+        self.category_table = _Interner()
+        self.user_table = _Interner()
+        self.note_table = _Interner()
+        # Chuỗi 'Ngày giờ' gốc của các dòng không đúng dạng 'YYYY-MM-DD HH:MM:SS'
+        self.raw_dates: Dict[int, str] = {}
+        self.rollups = MonthlyRollups()
+        self.date_index = DateIndex()
+        # Mã user -> thứ tự thời gian các dòng của user đó; all_order cho mọi user
+        self.orders: Dict[int, _TimeOrder] = {}
+        self.all_order = _TimeOrder()
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, row: List) -> bool:
+        """Thêm 1 dòng sheet, False nếu dòng rỗng (không có 'Ngày giờ')"""
+        row = list(row) + [''] * (6 - len(row))
+        ngay_gio, loai, so_tien, danh_muc, ghi_chu, user_id = row[:6]
+        ngay_gio = str(ngay_gio or '')
+        if not ngay_gio:
+            return False
+        try:
+            so_tien = float(so_tien or 0)
+        except (TypeError, ValueError):
+            so_tien = 0.0
+        loai, danh_muc, user_id = str(loai or ''), str(danh_muc or ''), str(user_id or '')
+        index = len(self.timestamps)
+        ts = parse_timestamp(ngay_gio)
+        if ts is None or not _is_canonical(ngay_gio):
+            self.raw_dates[index] = ngay_gio
+        if ts is None:
+            self.timestamps.append(INVALID_TS)
+            self.periods.append(-1)
+        else:
+            year, month = int(ngay_gio[0:4]), int(ngay_gio[5:7])
+            self.timestamps.append(ts)
+            self.periods.append(year * 12 + month - 1)
+            self.rollups.add(user_id, year, month, danh_muc, loai, so_tien)
+            self.date_index.add(user_id, format_timestamp(ts), danh_muc, loai, so_tien)
+        user_code = self.user_table.encode(user_id)
+        self.amounts.append(so_tien)
+        self.types.append(self.type_table.encode(loai))
+        self.categories.append(self.category_table.encode(danh_muc))
+        self.users.append(user_code)
+        self.notes.append(self.note_table.encode(str(ghi_chu or '')))
+        order = self.orders.get(user_code)
+        if order is None:
+            order = self.orders[user_code] = _TimeOrder()
+        order.add(self.timestamps[index], index)
+        self.all_order.add(self.timestamps[index], index)
+        return True
+
+    def ngay_gio(self, index: int) -> str:
+        raw = self.raw_dates.get(index)
+        return raw if raw is not None else format_timestamp(self.timestamps[index])
+
+class TransactionView(Mapping):
+    """1 giao dịch dạng dict chỉ đọc ('Ngày giờ', 'Loại', ...), giải mã từ cột khi truy cập"""
+
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns: _Columns, index: int):
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, key: str):
+        c, i = self._columns, self._index
+        if key == 'Ngày giờ':
+            return c.ngay_gio(i)
+        if key == 'Loại':
+            return c.type_table.values[c.types[i]]
+        if key == 'Số tiền':
+            return c.amounts[i]
+        if key == 'Danh mục':
+            return c.category_table.values[c.categories[i]]
+        if key == 'Ghi chú':
+            return c.note_table.values[c.notes[i]]
+        if key == 'User ID':
+            return c.user_table.values[c.users[i]]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+class ColumnarStore:
+    """
+    Bản sao trong bộ nhớ của sheet 'Giao dịch', lưu dạng cột
+
+    Mỗi dòng tốn ~36 byte (timestamp int64, số tiền float64, mã loại/danh mục/user/ghi chú)
+    thay vì 1 dict 6 key chuỗi. Thống kê đọc từ rollup/DateIndex như LocalReplica,
+    giao dịch gần nhất từ thứ tự thời gian theo user. Cùng interface với LocalReplica
+    (last_row, apply_rows, replace_all, get_*) nên dùng được khi không có SQLite.
+    """
+
+    # Số dòng header trên sheet (dòng dữ liệu đầu tiên là dòng 2)
+    HEADER_ROWS = 1
+
+    def __init__(self, reconcile_interval: int = 3600):
+        """
+        Khởi tạo store rỗng
+
+        Args:
+            reconcile_interval: Số giây giữa 2 lần đối chiếu toàn bộ sheet
+        """
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._columns = _Columns()
+        self._last_row = self.HEADER_ROWS
+        self._last_reconcile = 0.0
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    @property
+    def last_row(self) -> int:
+        """Số dòng cuối cùng trên sheet đã được đồng bộ (1 = chỉ có header)"""
+        with self._lock:
+            return self._last_row
+
+    def needs_reconcile(self) -> bool:
+        """Kiểm tra đã đến lúc đối chiếu toàn bộ sheet chưa"""
+        return time.time() - self._last_reconcile >= self.reconcile_interval
+
+    def apply_rows(self, start_row: int, rows: List[List]) -> int:
+        """
+        Ghi các dòng mới (tail), bỏ phần đã đồng bộ
+
+        Returns:
+            Số dòng đã ghi
+        """
+        rows = list(rows)
+        while rows and not any(rows[-1]):
+            rows.pop()
+        if not rows:
+            return 0
+        with self._lock:
+            if start_row <= self._last_row:
+                rows = rows[self._last_row + 1 - start_row:]
+                start_row = self._last_row + 1
+                if not rows:
+                    return 0
+            count = sum(self._columns.append(row) for row in rows)
+            self._last_row = start_row + len(rows) - 1
+        return count
+
+    def replace_all(self, rows: List[List]) -> int:
+        """
+        Thay toàn bộ dữ liệu bằng dữ liệu sheet (đối chiếu đầy đủ)
+
+        Returns:
+            Số dòng đã ghi
+        """
+        columns = _Columns()
+        count = sum(columns.append(row) for row in rows)
+        with self._lock:
+            self._columns = columns
+            self._last_row = self.HEADER_ROWS + len(rows)
+            self._last_reconcile = time.time()
+        return count
+
+    @property
+    def rollups(self) -> MonthlyRollups:
+        """Rollup theo tháng, cập nhật theo từng dòng (cho check_rollups)"""
+        with self._lock:
+            return self._columns.rollups
+
+    @classmethod
+    def build_rollups(cls, rows: List[List]) -> MonthlyRollups:
+        """Dựng rollup từ các dòng sheet (không gồm header), dùng để đối chiếu"""
+        rollups = MonthlyRollups()
+        for row in rows:
+            row = list(row) + [''] * (6 - len(row))
+            ngay_gio = str(row[0] or '')
+            if parse_timestamp(ngay_gio) is None:
+                continue
+            try:
+                so_tien = float(row[2] or 0)
+            except (TypeError, ValueError):
+                so_tien = 0.0
+            rollups.add(str(row[5] or ''), int(ngay_gio[0:4]), int(ngay_gio[5:7]),
+                        str(row[3] or ''), str(row[1] or ''), so_tien)
+        return rollups
+
+    @staticmethod
+    def _recent(columns: _Columns, user_id: Optional[str], start: int, end: int, limit: int,
+                month: Optional[int] = None) -> List[int]:
+        """
+        Chỉ số của `limit` dòng mới nhất trong [start, end) (cùng thời điểm thì dòng ghi sau trước)
+
+        month: lọc thêm theo tháng của mọi năm (khi không chỉ định năm)
+        """
+        if user_id:
+            user_code = columns.user_table.codes.get(str(user_id))
+            order = columns.orders.get(user_code) if user_code is not None else None
+        else:
+            order = columns.all_order
+        if order is None:
+            return []
+        if not month:
+            return order.newest(start, end, limit)
+        # Tháng không kèm năm: duyệt từ mới đến cũ tới khi đủ limit
+        periods = columns.periods
+        indices = []
+        for i in reversed(order.indices):
+            if periods[i] >= 0 and periods[i] % 12 == month - 1:
+                indices.append(i)
+                if len(indices) >= limit:
+                    break
+        return indices
+
+    def get_transactions(self, user_id: Optional[str] = None, limit: int = 100) -> List[TransactionView]:
+        """
+        Lấy giao dịch mới nhất trước
+
+        Returns:
+            List TransactionView (đọc như dict của get_all_records())
+        """
+        with self._lock:
+            columns = self._columns
+            indices = self._recent(columns, user_id, INVALID_TS, 2 ** 62, limit)
+        return [TransactionView(columns, i) for i in indices]
+
+    def get_statistics(self, user_id: Optional[str] = None, month: Optional[int] = None,
+                       year: Optional[int] = None) -> Dict:
+        """
+        Thống kê theo tháng/năm từ rollup (dòng có ngày sai format không được tính)
+
+        Returns:
+            Dict cùng format với GoogleSheetsService.get_statistics()
+        """
+        start, end, any_year_month = INVALID_TS + 1, 2 ** 62, month
+        if year:
+            first, last = (month, month) if month else (1, 12)
+            start = calendar.timegm((year, first, 1, 0, 0, 0))
+            end = calendar.timegm((year + last // 12, last % 12 + 1, 1, 0, 0, 0))
+            any_year_month = None
+        with self._lock:
+            columns = self._columns
+            stats = columns.rollups.statistics(user_id, month, year)
+            recent = self._recent(columns, user_id, start, end, 10, any_year_month)
+        stats['transactions'] = [TransactionView(columns, i) for i in recent]
+        return stats
+
+    def get_range_statistics(self, user_id: Optional[str], start: str, end: str) -> Dict:
+        """
+        Thống kê theo khoảng ngày [start, end) từ date index, O(log n) theo số giao dịch
+
+        Args:
+            user_id: ID người dùng (None = tất cả)
+            start: Mốc đầu (bao gồm), ví dụ '2026-03-01'
+            end: Mốc cuối (không bao gồm), ví dụ '2026-03-16'
+
+        Returns:
+            Dict cùng format với GoogleSheetsService.get_statistics()
+        """
+        with self._lock:
+            columns = self._columns
+            stats = columns.date_index.statistics(user_id, start, end)
+            recent = self._recent(columns, user_id, parse_timestamp(start), parse_timestamp(end), 10)
+        stats['transactions'] = [TransactionView(columns, i) for i in recent]
+        return stats
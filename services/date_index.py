@@ -0,0 +1,87 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+class DateIndex:
+    """
+    Index theo thời gian cho thống kê khoảng ngày bất kỳ
+
+    Mỗi (user_id, danh mục, loại) giữ 1 list 'Ngày giờ' đã sắp xếp và prefix sum số tiền:
+    tổng/số lượng trong [start, end) là 2 lần bisect + 1 phép trừ, O(log n) theo số giao dịch.
+    So sánh chuỗi 'YYYY-MM-DD HH:MM:SS' trực tiếp nên không cần strptime.
+    """
+
+    def __init__(self):
+        # user_id -> (danh_muc, loai) -> (keys đã sắp xếp, prefix sums dài len(keys) + 1)
+        self._data: Dict[str, Dict[Tuple[str, str], Tuple[List[str], List[float]]]] = {}
+
+    def add(self, user_id: str, ngay_gio: str, danh_muc: str, loai: str, so_tien: float) -> None:
+        """
+        Thêm 1 giao dịch
+
+        Giao dịch mới nhất (trường hợp thường gặp) chỉ cần append, O(1).
+        Giao dịch nhập bù ngày cũ phải cộng lại prefix sum phía sau, O(n).
+        """
+        cells = self._data.setdefault(str(user_id), {})
+        series = cells.get((danh_muc, loai))
+        if series is None:
+            series = cells[(danh_muc, loai)] = ([], [0.0])
+        keys, sums = series
+        if not keys or ngay_gio >= keys[-1]:
+            keys.append(ngay_gio)
+            sums.append(sums[-1] + so_tien)
+            return
+        pos = bisect_right(keys, ngay_gio)
+        keys.insert(pos, ngay_gio)
+        sums.insert(pos + 1, sums[pos] + so_tien)
+        for i in range(pos + 2, len(sums)):
+            sums[i] += so_tien
+
+    def clear(self) -> None:
+        """Xóa toàn bộ index"""
+        self._data = {}
+
+    def statistics(self, user_id: Optional[str], start: str, end: str) -> Dict:
+        """
+        Thống kê các giao dịch có 'Ngày giờ' trong [start, end)
+
+        Args:
+            user_id: ID người dùng (None = tất cả)
+            start: Mốc đầu (bao gồm), ví dụ '2026-03-01'
+            end: Mốc cuối (không bao gồm), ví dụ '2026-03-16'
+
+        Returns:
+            Dict cùng format với MonthlyRollups.statistics()
+        """
+        if user_id:
+            users = [self._data.get(str(user_id), {})]
+        else:
+            users = list(self._data.values())
+
+        total_thu = 0.0
+        total_chi = 0.0
+        so_luong = 0
+        danh_muc_stats = {}
+        for cells in users:
+            for (danh_muc, loai), (keys, sums) in cells.items():
+                lo = bisect_left(keys, start)
+                hi = bisect_left(keys, end, lo)
+                if hi <= lo:
+                    continue
+                total, count = sums[hi] - sums[lo], hi - lo
+                danh_muc = danh_muc or 'Khác'
+                if danh_muc not in danh_muc_stats:
+                    danh_muc_stats[danh_muc] = {'Thu': 0, 'Chi': 0, 'SoLuong': 0}
+                if loai == 'Thu':
+                    total_thu += total
+                elif loai == 'Chi':
+                    total_chi += total
+                danh_muc_stats[danh_muc][loai] = danh_muc_stats[danh_muc].get(loai, 0) + total
+                danh_muc_stats[danh_muc]['SoLuong'] += count
+                so_luong += count
+
+        return {
+            'total_thu': total_thu,
+            'total_chi': total_chi,
+            'so_luong': so_luong,
+            'danh_muc_stats': danh_muc_stats,
+        }
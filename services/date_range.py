@@ -0,0 +1,87 @@
+import re
+import unicodedata
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+
+# Các mẫu so khớp trên tin nhắn đã bỏ dấu + viết thường
+RANGE_PATTERN = re.compile(
+    r'(?:tu\s+)?(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\s*(?:den|toi|-)\s*(\d{1,2})/(\d{1,2})(?:/(\d{4}))?'
+)
+LAST_DAYS_PATTERN = re.compile(r'(\d+)\s*ngay\s*(?:qua|gan day|gan nhat|vua qua)')
+MAX_DAYS = 3660
+
+class DateRange(NamedTuple):
+    """Khoảng ngày [start, end) - end không bao gồm, label để hiển thị"""
+    start: date
+    end: date
+    label: str
+
+    @property
+    def last(self) -> date:
+        """Ngày cuối cùng (bao gồm) của khoảng"""
+        return self.end - timedelta(days=1)
+
+    def describe(self) -> str:
+        """Ví dụ 'Tuần này (13/10 - 17/10/2026)'"""
+        if self.start == self.last:
+            return f"{self.label} ({self.start:%d/%m/%Y})"
+        start = f"{self.start:%d/%m}" if self.start.year == self.last.year else f"{self.start:%d/%m/%Y}"
+        return f"{self.label} ({start} - {self.last:%d/%m/%Y})"
+
+def _fold(text: str) -> str:
+    """Bỏ dấu + viết thường ('Tuần này' -> 'tuan nay')"""
+    text = unicodedata.normalize('NFD', text.lower()).replace('đ', 'd')
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+
+def _make_date(day: str, month: str, year: Optional[str], default_year: int) -> Optional[date]:
+    try:
+        return date(int(year) if year else default_year, int(month), int(day))
+    except ValueError:
+        return None
+
+def parse_date_range(message: str, today: Optional[date] = None) -> Optional[DateRange]:
+    """
+    Đọc khoảng ngày trong lệnh thống kê
+
+    Hỗ trợ: 'hôm nay', 'hôm qua', 'tuần này', 'tuần trước', 'N ngày qua',
+    'từ 01/03 đến 15/03' (năm tùy chọn, mặc định năm hiện tại).
+
+    Args:
+        message: Nội dung tin nhắn (có dấu hoặc không dấu)
+        today: Ngày hiện tại (mặc định date.today())
+
+    Returns:
+        DateRange hoặc None nếu tin nhắn không nói tới khoảng ngày
+    """
+    today = today or date.today()
+    text = _fold(message)
+    tomorrow = today + timedelta(days=1)
+
+    match = RANGE_PATTERN.search(text)
+    if match:
+        d1, m1, y1, d2, m2, y2 = match.groups()
+        end = _make_date(d2, m2, y2 or y1, today.year)
+        start = _make_date(d1, m1, y1 or (end and str(end.year)), today.year)
+        if start is None or end is None:
+            return None
+        if start > end:
+            start, end = end, start
+        return DateRange(start, end + timedelta(days=1), "Khoảng ngày")
+
+    match = LAST_DAYS_PATTERN.search(text)
+    if match:
+        days = int(match.group(1))
+        if not 1 <= days <= MAX_DAYS:
+            return None
+        return DateRange(tomorrow - timedelta(days=days), tomorrow, f"{days} ngày qua")
+
+    monday = today - timedelta(days=today.weekday())
+    if 'tuan nay' in text:
+        return DateRange(monday, tomorrow, "Tuần này")
+    if 'tuan truoc' in text:
+        return DateRange(monday - timedelta(days=7), monday, "Tuần trước")
+    if 'hom nay' in text:
+        return DateRange(today, tomorrow, "Hôm nay")
+    if 'hom qua' in text:
+        return DateRange(today - timedelta(days=1), today, "Hôm qua")
+    return None
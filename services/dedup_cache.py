@@ -0,0 +1,110 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from utils.metrics import metrics
+from utils.logger import get_logger
+
+logger = get_logger('dedup')
+
+def webhook_event_key(data: Dict, user_id: str, message_text: str) -> str:
+    """
+    Lấy khóa định danh 1 sự kiện webhook để chống xử lý trùng
+
+    Ưu tiên ID có sẵn trong payload (message_id / msg_id / event_id);
+    nếu không có thì hash (người gửi, nội dung, timestamp).
+    """
+    message_obj = data.get('message', {}) or {}
+    for value in (message_obj.get('message_id'), message_obj.get('msg_id'), data.get('event_id')):
+        if value:
+            return f'id:{value}'
+    timestamp = data.get('timestamp') or message_obj.get('date') or message_obj.get('timestamp') or ''
+    raw = f'{user_id}|{message_text}|{timestamp}'
+    return 'hash:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class DedupCache:
+    """
+    Cache LRU có TTL ghi nhớ các sự kiện webhook đã nhận
+
+    Tùy chọn lưu xuống SQLite để vẫn nhận ra sự kiện trùng sau khi restart.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, db_path: Optional[str] = None):
+        """
+        Khởi tạo cache
+
+        Args:
+            max_size: Số khóa tối đa giữ trong bộ nhớ
+            ttl: Số giây 1 khóa còn được coi là trùng
+            db_path: File SQLite để lưu bền (None = chỉ trong bộ nhớ)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS seen_events (key TEXT PRIMARY KEY, ts REAL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_seen_events_ts ON seen_events (ts)')
+            self.conn.commit()
+
+    def _seen_in_db(self, key: str, now: float) -> bool:
+        row = self.conn.execute('SELECT ts FROM seen_events WHERE key = ?', (key,)).fetchone()
+        return row is not None and now - row[0] < self.ttl
+
+    def check_and_add(self, key: str) -> bool:
+        """
+        Kiểm tra khóa đã gặp chưa, đồng thời ghi nhận nếu chưa
+
+        Returns:
+            True nếu là sự kiện trùng (đã gặp trong TTL), False nếu là sự kiện mới
+        """
+        now = time.time()
+        with self._lock:
+            ts = self._entries.get(key)
+            if ts is not None and now - ts < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc('cache_hits_total', cache='dedup')
+                return True
+            if self.conn is not None and self._seen_in_db(key, now):
+                self._remember(key, now)
+                self.hits += 1
+                metrics.inc('cache_hits_total', cache='dedup')
+                return True
+            self._remember(key, now)
+            if self.conn is not None:
+                try:
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO seen_events (key, ts) VALUES (?, ?)', (key, now)
+                    )
+                    self.conn.execute('DELETE FROM seen_events WHERE ts < ?', (now - self.ttl,))
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Could not persist dedup key: %s", e)
+            return False
+
+    def discard(self, key: str):
+        """Quên 1 khóa (sự kiện chưa xử lý được) để lần Zalo gửi lại vẫn được xử lý"""
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.conn is not None:
+                try:
+                    self.conn.execute('DELETE FROM seen_events WHERE key = ?', (key,))
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Could not delete dedup key: %s", e)
+
+    def _remember(self, key: str, now: float):
+        self._entries[key] = now
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,12 +1,45 @@
 import gspread
+import requests
 from google.oauth2.service_account import Credentials
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
 import os
 import base64
-import tempfile
 import json
-from config import GOOGLE_CREDENTIALS_PATH, GOOGLE_SHEET_ID, SHEET_NAME_TRANSACTIONS, SHEET_NAME_CATEGORIES
+import re
+import threading
+from utils.metrics import metrics
+from utils.logger import get_logger
+from services.storage import TRANSACTION_HEADER, DEFAULT_CATEGORIES, transaction_row
+from config import (
+    GOOGLE_CREDENTIALS_PATH, GOOGLE_SHEET_ID, GOOGLE_SHEETS_API_BASE_URL,
+    SHEET_NAME_TRANSACTIONS, SHEET_NAME_CATEGORIES, SHEET_NAME_SUMMARY, SUMMARY_SHEET_ENABLED,
+    SHEET_NAME_ARCHIVE, TRANSACTION_PARTITIONS_ENABLED, PARTITION_ARCHIVE_AFTER_MONTHS,
+    LOCAL_REPLICA_ENABLED, LOCAL_REPLICA_PATH, LOCAL_REPLICA_RECONCILE_SECONDS, COLUMNAR_STORE_ENABLED,
+    WRITE_BUFFER_ENABLED, WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_MAX_DELAY_MS,
+    CATEGORY_CACHE_TTL_SECONDS,
+    COLD_START_CACHE_ENABLED, COLD_START_CACHE_DIR, COLD_START_METADATA_TTL_SECONDS,
+    SHEETS_READ_QUOTA_PER_MINUTE, SHEETS_WRITE_QUOTA_PER_MINUTE, SHEETS_QUOTA_BURST,
+    SHEETS_MAX_QUEUE_WAIT_SECONDS, SHEETS_MAX_RETRIES, SHEETS_RETRY_BACKOFF, SHEETS_MAX_BACKOFF,
+    STATS_CACHE_ENABLED, STATS_CACHE_MAX_ENTRIES, STATS_CACHE_MAX_BYTES, STATS_CACHE_TTL_SECONDS
+)
+
+logger = get_logger('sheets')
+
+class _RebasedSession(requests.Session):
+    """Session gửi request Sheets API tới base URL khác (server giả khi load test), không xác thực"""
+    
+    GOOGLE_BASE_URL = 'https://sheets.googleapis.com'
+    
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+    
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(self.GOOGLE_BASE_URL):
+            url = self.base_url + url[len(self.GOOGLE_BASE_URL):]
+        return super().request(method, url, *args, **kwargs)
+
 
 class GoogleSheetsService:
     """Service để tương tác với Google Sheets"""
@@ -18,40 +51,106 @@ class GoogleSheetsService:
             'https://www.googleapis.com/auth/drive'
         ]
         
-        # Hỗ trợ cả file và base64 (cho Vercel)
-        credentials_path, is_temp = self._get_credentials_path()
+        # Mọi lời gọi Sheets đi qua scheduler: xếp hàng theo quota, retry khi bị 429/5xx
+        from services.sheets_scheduler import SheetsScheduler
+        self.scheduler = SheetsScheduler(
+            read_per_minute=SHEETS_READ_QUOTA_PER_MINUTE,
+            write_per_minute=SHEETS_WRITE_QUOTA_PER_MINUTE,
+            burst=SHEETS_QUOTA_BURST,
+            max_retries=SHEETS_MAX_RETRIES,
+            retry_backoff=SHEETS_RETRY_BACKOFF,
+            max_backoff=SHEETS_MAX_BACKOFF,
+            max_wait=SHEETS_MAX_QUEUE_WAIT_SECONDS
+        )
+        # Cold start: token OAuth + metadata sheet được cache trong /tmp giữa các lần khởi động
+        self.cold_start_cache = None
+        if COLD_START_CACHE_ENABLED:
+            from services.cold_start_cache import ColdStartCache
+            self.cold_start_cache = ColdStartCache(COLD_START_CACHE_DIR, COLD_START_METADATA_TTL_SECONDS)
         
-        creds = Credentials.from_service_account_file(credentials_path, scopes=scope)
-        self.client = gspread.authorize(creds)
-        self.spreadsheet = self.client.open_by_key(GOOGLE_SHEET_ID)
+        # Token OAuth đã lưu vào cold start cache (so sánh để chỉ ghi file khi google-auth lấy token mới)
+        self._creds = None
+        self._saved_token = None
+        if GOOGLE_SHEETS_API_BASE_URL:
+            # Load test: nói chuyện với server giả, không cần credentials
+            self.client = gspread.Client(None, session=_RebasedSession(GOOGLE_SHEETS_API_BASE_URL))
+        else:
+            # Hỗ trợ cả file và base64 (cho Vercel)
+            self._creds = self._load_credentials(scope)
+            if self.cold_start_cache is not None and self.cold_start_cache.load_token(self._creds):
+                self._saved_token = self._creds.token
+            self.client = gspread.authorize(self._creds)
+        
+        # Chia partition theo tháng: sheet_transactions là partition của tháng hiện tại (ghi + replica),
+        # sheet_base là sheet 'Giao dịch' gốc (dữ liệu trước khi bật partition)
+        self.partitions = None
+        self.sheet_archive = None
+        self._partition_lock = threading.RLock()
+        # Mỗi lúc chỉ 1 lượt nén partition (thread nền hoặc gọi tay), tách khỏi _partition_lock để không chặn writer
+        self._archive_lock = threading.Lock()
+        self._hot_month = None
+        # Tháng của partition mà replica đang phản chiếu (None = sheet gốc, không chia partition)
+        self._replica_month = None
+        self._base_empty = False
         
         # Lấy hoặc tạo sheets
-        self._init_sheets()
+        self._open_spreadsheet()
+        self._save_token()
+        
+        # Local replica: đọc giao dịch/thống kê từ SQLite thay vì tải cả sheet
+        self.replica = None
+        if LOCAL_REPLICA_ENABLED:
+            try:
+                from services.local_replica import LocalReplica
+                self.replica = LocalReplica(LOCAL_REPLICA_PATH, LOCAL_REPLICA_RECONCILE_SECONDS, GOOGLE_SHEET_ID)
+            except Exception as e:
+                logger.warning("Could not open local replica %s: %s", LOCAL_REPLICA_PATH, e)
+        if self.replica is None and COLUMNAR_STORE_ENABLED:
+            # Không có SQLite: giữ lịch sử trong bộ nhớ dạng cột thay vì get_all_records() mỗi lần đọc
+            from services.columnar_store import ColumnarStore
+            self.replica = ColumnarStore(LOCAL_REPLICA_RECONCILE_SECONDS)
+        
+        # Cache danh mục + NLPProcessor dựng sẵn theo version
+        from services.category_cache import CategoryCache
+        self.category_cache = CategoryCache(
+            self._load_categories,
+            ttl=CATEGORY_CACHE_TTL_SECONDS,
+            fallback=[cat[0] for cat in DEFAULT_CATEGORIES]
+        )
         
-        # Lưu temp file path để cleanup sau
-        self._temp_creds_file = credentials_path if is_temp else None
+        # Cache báo cáo thống kê, bị xóa theo (user, kỳ) mỗi khi ghi giao dịch
+        self.stats_cache = None
+        if STATS_CACHE_ENABLED:
+            from services.stats_cache import StatsCache
+            self.stats_cache = StatsCache(
+                max_entries=STATS_CACHE_MAX_ENTRIES,
+                max_bytes=STATS_CACHE_MAX_BYTES,
+                ttl=STATS_CACHE_TTL_SECONDS
+            )
+        
+        # Write buffer: gom các add_transaction đồng thời thành 1 lần append_rows
+        self.write_buffer = None
+        if WRITE_BUFFER_ENABLED:
+            from services.write_buffer import WriteBuffer
+            self.write_buffer = WriteBuffer(
+                self._append_rows,
+                max_rows=WRITE_BUFFER_MAX_ROWS,
+                max_delay=WRITE_BUFFER_MAX_DELAY_MS / 1000
+            )
     
-    def _get_credentials_path(self) -> Tuple[str, bool]:
+    def _load_credentials(self, scope: List[str]) -> Credentials:
         """
-        Lấy đường dẫn credentials, hỗ trợ base64 cho Vercel
-        Returns: (path, is_temp_file)
+        Tạo credentials, hỗ trợ base64 cho Vercel (đọc thẳng trong bộ nhớ, không ghi file tạm)
         """
         # Kiểm tra base64 từ environment variable (cho Vercel)
         creds_base64 = os.getenv('GOOGLE_CREDENTIALS_BASE64')
         if creds_base64:
             try:
-                # Decode base64
-                creds_json = base64.b64decode(creds_base64).decode('utf-8')
-                
-                # Tạo file tạm
-                temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
-                temp_file.write(creds_json)
-                temp_file.close()
-                
-                return temp_file.name, True
+                info = json.loads(base64.b64decode(creds_base64).decode('utf-8'))
             except Exception as e:
-                print(f"Error decoding base64 credentials: {e}")
+                logger.error("Error decoding base64 credentials: %s", e)
                 raise
+            return Credentials.from_service_account_info(info, scopes=scope)
         
         # Fallback: sử dụng file path
         if not os.path.exists(GOOGLE_CREDENTIALS_PATH):
@@ -60,16 +159,65 @@ class GoogleSheetsService:
                 f"or ensure file exists: {GOOGLE_CREDENTIALS_PATH}"
             )
         
-        return GOOGLE_CREDENTIALS_PATH, False
+        return Credentials.from_service_account_file(GOOGLE_CREDENTIALS_PATH, scopes=scope)
     
-    def __del__(self):
-        """Cleanup temp file khi object bị destroy"""
-        if hasattr(self, '_temp_creds_file') and self._temp_creds_file:
-            try:
-                if os.path.exists(self._temp_creds_file):
-                    os.unlink(self._temp_creds_file)
-            except Exception as e:
-                print(f"Warning: Could not cleanup temp file {self._temp_creds_file}: {e}")
+    def _open_spreadsheet(self):
+        """
+        Mở spreadsheet và các worksheet
+        
+        Có metadata đã cache thì dựng Spreadsheet/Worksheet từ cache, không gọi API;
+        nếu không thì open_by_key + _init_sheets (tạo sheet nếu thiếu) rồi lưu lại metadata.
+        """
+        cache = self.cold_start_cache
+        metadata = cache.load_metadata(GOOGLE_SHEET_ID) if cache is not None else None
+        worksheets = (metadata or {}).get('worksheets', {})
+        required = [SHEET_NAME_TRANSACTIONS, SHEET_NAME_CATEGORIES]
+        if SUMMARY_SHEET_ENABLED:
+            required.append(SHEET_NAME_SUMMARY)
+        if TRANSACTION_PARTITIONS_ENABLED:
+            required.append(SHEET_NAME_ARCHIVE)
+        if all(title in worksheets for title in required):
+            # gspread 5.x đọc metadata trong Spreadsheet.__init__, nên tạo object không qua __init__
+            self.spreadsheet = gspread.Spreadsheet.__new__(gspread.Spreadsheet)
+            self.spreadsheet.client = self.client
+            self.spreadsheet._properties = dict(metadata['spreadsheet'])
+            sheets = {title: gspread.Worksheet(self.spreadsheet, props) for title, props in worksheets.items()}
+            self.sheet_transactions = sheets[SHEET_NAME_TRANSACTIONS]
+            self.sheet_categories = sheets[SHEET_NAME_CATEGORIES]
+            self.sheet_summary = sheets.get(SHEET_NAME_SUMMARY) if SUMMARY_SHEET_ENABLED else None
+            if TRANSACTION_PARTITIONS_ENABLED:
+                self.sheet_archive = sheets[SHEET_NAME_ARCHIVE]
+                self._init_partitions(sheets.values())
+            return
+        
+        self.spreadsheet = self.client.open_by_key(GOOGLE_SHEET_ID)
+        self._init_sheets()
+        self._save_metadata()
+    
+    def _save_metadata(self):
+        """Lưu properties của spreadsheet và các worksheet đang dùng vào cold start cache"""
+        if self.cold_start_cache is None:
+            return
+        sheets = [self.sheet_base if self.partitions is not None else self.sheet_transactions,
+                  self.sheet_categories, self.sheet_summary, self.sheet_archive]
+        if self.partitions is not None:
+            sheets.extend(self.partitions.worksheets.values())
+        self.cold_start_cache.save_metadata(GOOGLE_SHEET_ID, self.spreadsheet._properties, {
+            sheet.title: sheet._properties for sheet in sheets if sheet is not None
+        })
+    
+    def flush_writes(self):
+        """Ghi ngay các giao dịch đang chờ trong write buffer"""
+        if self.write_buffer is not None:
+            self.write_buffer.flush()
+    
+    def queue_stats(self) -> Dict:
+        """Số lời gọi Sheets đang chờ quota/retry (GET /queue)"""
+        return self.scheduler.stats()
+    
+    def close(self):
+        """Ghi nốt write buffer trước khi tắt server"""
+        self.flush_writes()
     
     def _init_sheets(self):
         """Khởi tạo các sheet nếu chưa có"""
@@ -84,9 +232,7 @@ class GoogleSheetsService:
                     cols=10
                 )
                 # Tạo header
-                self.sheet_transactions.append_row([
-                    'Ngày giờ', 'Loại', 'Số tiền', 'Danh mục', 'Ghi chú', 'User ID'
-                ])
+                self.sheet_transactions.append_row(TRANSACTION_HEADER)
             
             # Sheet danh mục
             try:
@@ -99,35 +245,414 @@ class GoogleSheetsService:
                 )
                 # Tạo header và danh mục mặc định
                 self.sheet_categories.append_row(['Tên danh mục', 'Loại', 'Mô tả'])
-                default_categories = [
-                    ['Ăn uống', 'Chi', ''],
-                    ['Lương', 'Thu', ''],
-                    ['Mua sắm', 'Chi', ''],
-                    ['Giao thông', 'Chi', ''],
-                    ['Giải trí', 'Chi', ''],
-                    ['Khác', 'Cả hai', '']
-                ]
-                for cat in default_categories:
+                for cat in DEFAULT_CATEGORIES:
                     self.sheet_categories.append_row(cat)
+            
+            # Partition theo tháng + sheet lưu trữ cho partition đã nén
+            if TRANSACTION_PARTITIONS_ENABLED:
+                from services.summary_sheet import ARCHIVE_HEADER
+                worksheets = self.spreadsheet.worksheets()
+                self.sheet_archive = next((w for w in worksheets if w.title == SHEET_NAME_ARCHIVE), None)
+                if self.sheet_archive is None:
+                    self.sheet_archive = self.spreadsheet.add_worksheet(
+                        title=SHEET_NAME_ARCHIVE,
+                        rows=1000,
+                        cols=len(ARCHIVE_HEADER)
+                    )
+                    self.sheet_archive.append_row(ARCHIVE_HEADER)
+                self._init_partitions(worksheets)
         
         except Exception as e:
             raise Exception(f"Error initializing sheets: {e}")
+        
+        # Sheet tổng hợp: không bắt buộc, lỗi thì thống kê vẫn đọc từ replica/sheet giao dịch
+        self.sheet_summary = None
+        if SUMMARY_SHEET_ENABLED:
+            try:
+                self.sheet_summary = self._init_summary_sheet()
+            except Exception as e:
+                logger.warning("Could not initialize summary sheet: %s", e)
+    
+    def _init_summary_sheet(self):
+        """Lấy sheet tổng hợp, nếu chưa có thì tạo và đặt công thức QUERY ở A2"""
+        from services.summary_sheet import SUMMARY_HEADER, summary_formula
+        try:
+            return self.spreadsheet.worksheet(SHEET_NAME_SUMMARY)
+        except gspread.exceptions.WorksheetNotFound:
+            pass
+        sheet = self.spreadsheet.add_worksheet(
+            title=SHEET_NAME_SUMMARY,
+            rows=1000,
+            cols=len(SUMMARY_HEADER)
+        )
+        sheet.append_row(SUMMARY_HEADER)
+        # update_acell ghi USER_ENTERED nên Sheets hiểu đây là công thức
+        sheet.update_acell('A2', summary_formula(self._summary_sources()))
+        return sheet
+    
+    def _summary_sources(self) -> List[str]:
+        """Các sheet giao dịch mà công thức tổng hợp cần đọc (sheet gốc + các partition còn lại)"""
+        if self.partitions is None:
+            return [SHEET_NAME_TRANSACTIONS]
+        return [SHEET_NAME_TRANSACTIONS] + self.partitions.titles()
+    
+    def _init_partitions(self, worksheets):
+        """Ghi nhận các partition hiện có (sheet_transactions chuyển sang partition tháng này ở lần dùng đầu)"""
+        from services.partitions import TransactionPartitions
+        self.sheet_base = self.sheet_transactions
+        self.partitions = TransactionPartitions(
+            self.spreadsheet, SHEET_NAME_TRANSACTIONS, TRANSACTION_HEADER, self._sheets_call, worksheets
+        )
+    
+    def _on_partitions_changed(self):
+        """
+        Sau khi tạo/xóa partition: đọc lại danh sách partition (instance khác có thể vừa tạo),
+        đặt lại công thức tổng hợp theo danh sách mới và lưu metadata
+        """
+        self.partitions.reload(self._sheets_call('read', 'worksheets', self.spreadsheet.worksheets))
+        if self._hot_month in self.partitions.worksheets:
+            self.sheet_transactions = self.partitions.worksheets[self._hot_month]
+        self._update_summary_formula()
+        self._save_metadata()
+    
+    def _update_summary_formula(self):
+        """Đặt lại công thức tổng hợp theo danh sách partition hiện tại"""
+        if self.sheet_summary is None:
+            return
+        from services.summary_sheet import summary_formula
+        self._sheets_call('write', 'update_acell', self.sheet_summary.update_acell,
+                          'A2', summary_formula(self._summary_sources()))
+    
+    def _partition_sheet(self, year: int, month: int) -> Tuple[gspread.Worksheet, bool]:
+        """
+        Worksheet partition của tháng, tạo nếu chưa có
+        
+        Returns:
+            (worksheet, True nếu instance này vừa tạo partition)
+        """
+        worksheet = self.partitions.get(year, month)
+        if worksheet is not None:
+            return worksheet, False
+        with self._partition_lock:
+            worksheet = self.partitions.get(year, month)
+            if worksheet is not None:
+                return worksheet, False
+            worksheet, created = self.partitions.create(year, month)
+            if created:
+                self._on_partitions_changed()
+                worksheet = self.partitions.get(year, month) or worksheet
+            return worksheet, created
+    
+    def _roll_partition(self):
+        """
+        Chuyển sheet ghi (và replica) sang partition của tháng hiện tại
+        
+        Chỉ làm việc khi sang tháng mới (hoặc lần dùng đầu của tiến trình). Instance tạo
+        partition mới sẽ nén các partition cũ ở background.
+        """
+        if self.partitions is None:
+            return
+        month = self.partitions.current_month()
+        if month == self._hot_month:
+            return
+        with self._partition_lock:
+            if month == self._hot_month:
+                return
+            self.sheet_transactions, created = self._partition_sheet(*month)
+            self._hot_month = month
+        if created and PARTITION_ARCHIVE_AFTER_MONTHS > 0:
+            threading.Thread(target=self.archive_partitions, name='partition-archive', daemon=True).start()
+    
+    def _replica_covers(self, start: Optional[str], end: Optional[str]) -> bool:
+        """Replica có đủ dữ liệu cho [start, end) không (khi chia partition, replica chỉ giữ tháng hiện tại)"""
+        if self.partitions is None:
+            return True
+        if start is None or end is None:
+            return False
+        from services.partitions import month_start, next_month
+        month = self.partitions.current_month()
+        return month_start(*month) <= start and end <= month_start(*next_month(*month))
+    
+    def _sheets_call(self, kind: str, op: str, func, *args, **kwargs):
+        """
+        Điểm chung cho mọi lời gọi gspread: qua scheduler (quota + retry), đếm số lần gọi và lỗi
+        
+        Args:
+            kind: 'read' hoặc 'write'
+            op: Tên thao tác (get_values, append_rows, ...) để gắn nhãn metrics
+            func: Hàm gspread cần gọi
+        """
+        metrics.inc('sheets_calls_total', kind=kind, op=op)
+        try:
+            result = self.scheduler.call(kind, op, func, *args, **kwargs)
+        except Exception as e:
+            metrics.inc('errors_total', source='sheets', op=op)
+            if self.cold_start_cache is not None and self.scheduler.error_status(e) in (400, 404):
+                # Có thể sheet đã bị đổi tên/xóa: lần khởi động sau đọc lại metadata
+                self.cold_start_cache.drop_metadata(GOOGLE_SHEET_ID)
+            raise
+        self._save_token()
+        return result
+    
+    def _save_token(self):
+        """
+        Lưu access token vào cold start cache khi google-auth vừa lấy token mới
+        
+        Gọi sau mỗi lời gọi Sheets thành công: token lấy lần đầu (kể cả khi metadata
+        đến từ cache, lúc khởi tạo chưa có request nào) và token được refresh khi hết hạn.
+        """
+        creds = self._creds
+        if creds is None or self.cold_start_cache is None or not creds.token or creds.token == self._saved_token:
+            return
+        self._saved_token = creds.token
+        self.cold_start_cache.save_token(creds)
+    
+    def sync_replica(self, full: bool = False) -> bool:
+        """
+        Đồng bộ local replica với sheet giao dịch
+        
+        Mặc định chỉ đọc các dòng được append sau dòng cuối đã biết (tail sync).
+        Đối chiếu toàn bộ khi full=True hoặc đã quá LOCAL_REPLICA_RECONCILE_SECONDS.
+        Khi chia partition, replica chỉ phản chiếu partition tháng hiện tại và
+        được nạp lại toàn bộ khi sang tháng mới.
+        
+        Returns:
+            True nếu replica sẵn sàng để đọc, False nếu không dùng được
+        """
+        if self.replica is None:
+            return False
+        try:
+            self._roll_partition()
+            if full or self.replica.needs_reconcile() or self._replica_month != self._hot_month:
+                hot_month = self._hot_month
+                values = self._sheets_call(
+                    'read', 'get_values', self.sheet_transactions.get_values,
+                    value_render_option='UNFORMATTED_VALUE'
+                )
+                self.replica.replace_all(values[self.replica.HEADER_ROWS:])
+                self._replica_month = hot_month
+                if self.stats_cache is not None:
+                    self.stats_cache.clear()
+            else:
+                start = self.replica.last_row + 1
+                values = self._sheets_call(
+                    'read', 'get_values', self.sheet_transactions.get_values,
+                    f'A{start}:F', value_render_option='UNFORMATTED_VALUE'
+                )
+                if self.replica.apply_rows(start, values):
+                    # Dòng do instance khác ghi
+                    self._invalidate_stats(values)
+            return True
+        except Exception as e:
+            logger.error("Error syncing local replica: %s", e)
+            return False
+    
+    def _append_rows(self, rows: List[List]):
+        """
+        Append các dòng vào sheet giao dịch (khi chia partition: partition theo tháng của từng dòng)
+        
+        Dòng không đọc được ngày đi vào partition tháng hiện tại.
+        """
+        if self.partitions is None:
+            return self._append_to(self.sheet_transactions, rows)
+        from services.rollups import MonthlyRollups
+        self._roll_partition()
+        groups: Dict[Tuple[int, int], List[List]] = {}
+        for row in rows:
+            month = MonthlyRollups.parse_period(str(row[0]))
+            if month is None or not 1 <= month[1] <= 12:
+                month = self._hot_month
+            groups.setdefault(month, []).append(row)
+        response = None
+        for month, group in groups.items():
+            sheet = self.sheet_transactions if month == self._hot_month else self._partition_sheet(*month)[0]
+            response = self._append_to(sheet, group)
+        return response
+    
+    def _append_to(self, sheet, rows: List[List]):
+        """
+        Append các dòng vào 1 sheet giao dịch và ghi thẳng vào replica nếu replica phản chiếu sheet đó
+        
+        Số dòng bắt đầu lấy từ updatedRange trong response của append_rows,
+        nên replica (và rollup theo tháng) được cập nhật ngay mà không cần đọc lại sheet.
+        Nếu dòng mới không nối tiếp replica (instance khác vừa ghi), để tail sync xử lý.
+        """
+        response = self._sheets_call('write', 'append_rows', sheet.append_rows, rows)
+        self._invalidate_stats(rows)
+        if self.replica is None or sheet.id != self.sheet_transactions.id or self._replica_month != self._hot_month:
+            return response
+        try:
+            updated_range = response.get('updates', {}).get('updatedRange', '')
+            match = re.search(r'![A-Z]+(\d+)', updated_range)
+            if match and int(match.group(1)) == self.replica.last_row + 1:
+                self.replica.apply_rows(int(match.group(1)), rows)
+        except Exception as e:
+            logger.warning("Could not write through to local replica: %s", e)
+        return response
+    
+    def _invalidate_stats(self, rows: List[List]):
+        """Xóa báo cáo thống kê đã cache của đúng user + kỳ có dòng mới"""
+        if self.stats_cache is None:
+            return
+        from services.rollups import MonthlyRollups
+        periods = set()
+        for row in rows:
+            if len(row) < 6 or not row[0]:
+                continue
+            period = MonthlyRollups.parse_period(str(row[0]))
+            periods.add((str(row[5]),) + (period or (None, None)))
+        for user_id, year, month in periods:
+            self.stats_cache.invalidate(user_id, year, month)
+    
+    def check_rollups(self, repair: bool = True) -> List[Dict]:
+        """
+        Kiểm tra tính nhất quán: dựng lại rollup từ toàn bộ sheet và so sánh
+        
+        Args:
+            repair: Nếu lệch thì đối chiếu lại toàn bộ replica từ sheet
+            
+        Returns:
+            List các ô lệch (rỗng nếu khớp)
+        """
+        if self.replica is None:
+            return []
+        self.sync_replica()
+        values = self._sheets_call(
+            'read', 'get_values', self.sheet_transactions.get_values,
+            value_render_option='UNFORMATTED_VALUE'
+        )
+        rows = values[self.replica.HEADER_ROWS:]
+        mismatches = self.replica.rollups.diff(self.replica.build_rollups(rows))
+        if mismatches:
+            logger.warning("Rollup mismatch: %s cells differ from sheet", len(mismatches))
+            if repair:
+                self.replica.replace_all(rows)
+                if self.stats_cache is not None:
+                    self.stats_cache.clear()
+        return mismatches
+    
+    def archive_partitions(self, keep_months: int = PARTITION_ARCHIVE_AFTER_MONTHS) -> List[str]:
+        """
+        Nén các partition cũ vào sheet lưu trữ rồi xóa partition
+        
+        Mỗi partition thành vài dòng tổng (user, tháng, danh mục, loại), kèm sheetId nguồn
+        nên chạy lại sau khi bị gián đoạn không cộng trùng. Thứ tự: ghi lưu trữ, bỏ partition
+        khỏi công thức tổng hợp, rồi mới xóa sheet (công thức không trỏ tới sheet đã xóa).
+        
+        Args:
+            keep_months: Số tháng gần nhất (kể cả tháng hiện tại) được giữ nguyên
+            
+        Returns:
+            Tên các partition đã nén
+        """
+        if self.partitions is None or keep_months <= 0:
+            return []
+        from services.summary_sheet import ARCHIVE_RANGE, archive_rows
+        if not self._archive_lock.acquire(blocking=False):
+            # Đang có lượt nén khác chạy
+            return []
+        try:
+            # Chỉ chụp danh sách partition dưới _partition_lock; đọc/ghi Sheets làm ngoài khóa
+            # để _partition_sheet/_roll_partition không phải chờ cả lượt nén
+            with self._partition_lock:
+                year, month = self.partitions.current_month()
+                cutoff = year * 12 + month - keep_months
+                old = [m for m in self.partitions.months() if m[0] * 12 + m[1] <= cutoff]
+                sheets = [self.partitions.get(*m) for m in old]
+            if not old:
+                return []
+            archived_ids = {
+                str(row[6]) for row in self._sheets_call(
+                    'read', 'get_values', self.sheet_archive.get_values, ARCHIVE_RANGE
+                ) if len(row) > 6
+            }
+            for sheet in sheets:
+                if str(sheet.id) in archived_ids:
+                    continue
+                values = self._sheets_call(
+                    'read', 'get_values', sheet.get_values, value_render_option='UNFORMATTED_VALUE'
+                )
+                rows = archive_rows(values[1:], sheet.id)
+                if rows:
+                    self._sheets_call('write', 'append_rows', self.sheet_archive.append_rows, rows)
+            
+            # Danh sách partition + công thức tổng hợp đổi cùng nhau, như khi tạo partition
+            with self._partition_lock:
+                self.partitions.discard(old)
+                self._update_summary_formula()
+            for sheet in sheets:
+                self._sheets_call('write', 'del_worksheet', self.spreadsheet.del_worksheet, sheet)
+            with self._partition_lock:
+                self._on_partitions_changed()
+        except Exception as e:
+            logger.error("Error archiving partitions: %s", e)
+            return []
+        finally:
+            self._archive_lock.release()
+        if self.stats_cache is not None:
+            self.stats_cache.clear()
+        titles = [sheet.title for sheet in sheets]
+        logger.info("Archived %s partitions: %s", len(titles), ', '.join(titles))
+        return titles
     
     def get_categories(self) -> List[str]:
         """
-        Lấy danh sách danh mục từ sheet
+        Lấy danh sách danh mục (qua cache, chỉ đọc sheet khi hết TTL)
+        
+        Returns:
+            List tên danh mục
+        """
+        return self.category_cache.get()[1]
+    
+    def get_nlp_processor(self):
+        """
+        Lấy NLPProcessor dựng sẵn cho danh mục hiện tại
+        
+        Returns:
+            NLPProcessor dùng chung giữa các tin nhắn
+        """
+        return self.category_cache.get_processor()
+    
+    def invalidate_categories(self):
+        """Buộc đọc lại sheet danh mục ở lần truy cập tiếp theo"""
+        self.category_cache.invalidate()
+    
+    def _load_categories(self) -> List[str]:
+        """
+        Đọc danh sách danh mục từ sheet
         
         Returns:
             List tên danh mục
         """
         try:
-            records = self.sheet_categories.get_all_records()
+            records = self._sheets_call('read', 'get_all_records', self.sheet_categories.get_all_records)
             categories = [record.get('Tên danh mục', '') for record in records if record.get('Tên danh mục')]
             return [cat for cat in categories if cat]  # Loại bỏ empty
         except Exception as e:
-            print(f"Error getting categories: {e}")
+            logger.error("Error getting categories: %s", e)
             return []
     
+    def add_transactions(self, transactions: List[Dict[str, any]], user_id: str = 'default') -> bool:
+        """
+        Thêm nhiều giao dịch bằng 1 lần append_rows (nhập hàng loạt)
+        
+        Args:
+            transactions: List dict chứa loai, so_tien, danh_muc, ghi_chu (và ngay_gio nếu có)
+            user_id: ID của người dùng
+            
+        Returns:
+            True nếu thành công, False nếu có lỗi
+        """
+        if not transactions:
+            return True
+        try:
+            # Không đi qua write buffer: lô đã đủ lớn, tách theo WRITE_BUFFER_MAX_ROWS chỉ tốn thêm lời gọi
+            self._append_rows([transaction_row(t, user_id) for t in transactions])
+            return True
+        except Exception as e:
+            logger.error("Error adding transactions: %s", e)
+            return False
+    
     def add_transaction(self, transaction: Dict[str, any], user_id: str = 'default') -> bool:
         """
         Thêm giao dịch vào sheet
@@ -140,19 +665,14 @@ class GoogleSheetsService:
             True nếu thành công, False nếu có lỗi
         """
         try:
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            row = [
-                now,                          # Ngày giờ
-                transaction.get('loai', ''),  # Loại
-                transaction.get('so_tien', 0), # Số tiền
-                transaction.get('danh_muc', ''), # Danh mục
-                transaction.get('ghi_chu', ''),  # Ghi chú
-                user_id                        # User ID
-            ]
-            self.sheet_transactions.append_row(row)
+            row = transaction_row(transaction, user_id)
+            if self.write_buffer is not None:
+                # Chờ batch chứa dòng này được flush để vẫn xác nhận được kết quả
+                return self.write_buffer.submit(row).result()
+            self._append_rows([row])
             return True
         except Exception as e:
-            print(f"Error adding transaction: {e}")
+            logger.error("Error adding transaction: %s", e)
             return False
     
     def get_transactions(self, user_id: str = 'default', limit: int = 100) -> List[Dict]:
@@ -167,7 +687,17 @@ class GoogleSheetsService:
             List các giao dịch
         """
         try:
-            records = self.sheet_transactions.get_all_records()
+            if self.sync_replica():
+                transactions = self.replica.get_transactions(user_id, limit)
+                if self.partitions is None or len(transactions) >= limit:
+                    return transactions
+                # Replica chỉ giữ tháng hiện tại: lấy thêm từ các partition cũ hơn, mới nhất trước
+                from services.partitions import month_start
+                return transactions + self._older_transactions(
+                    user_id, limit - len(transactions), month_start(*self._hot_month)
+                )
+            
+            records = self._read_records()
             
             if user_id:
                 records = [r for r in records if r.get('User ID') == user_id]
@@ -177,8 +707,230 @@ class GoogleSheetsService:
             
             return records[:limit]
         except Exception as e:
-            print(f"Error getting transactions: {e}")
+            logger.error("Error getting transactions: %s", e)
+            return []
+    
+    def _read_records(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """
+        get_all_records() của sheet giao dịch
+        
+        Khi chia partition chỉ đọc các partition giao với [start, end) và sheet gốc
+        (sheet gốc chỉ còn dữ liệu cũ, bỏ qua khi đã biết là rỗng).
+        """
+        if self.partitions is None:
+            return self._sheets_call('read', 'get_all_records', self.sheet_transactions.get_all_records)
+        records = []
+        for _, sheet in self.partitions.overlapping(start, end):
+            records.extend(self._sheets_call('read', 'get_all_records', sheet.get_all_records))
+        records.extend(self._base_records())
+        return records
+    
+    def _base_records(self) -> List[Dict]:
+        """Bản ghi của sheet 'Giao dịch' gốc khi đã chia partition (không còn ghi mới vào sheet này)"""
+        if self._base_empty:
             return []
+        records = self._sheets_call('read', 'get_all_records', self.sheet_base.get_all_records)
+        self._base_empty = not records
+        return records
+    
+    def _older_transactions(self, user_id: Optional[str], limit: int, before: str) -> List[Dict]:
+        """Giao dịch trước mốc before, đọc lần lượt các partition từ mới đến cũ cho tới khi đủ limit"""
+        def newest_first(records: List[Dict]) -> List[Dict]:
+            records = [r for r in records if (not user_id or r.get('User ID') == user_id)
+                       and str(r.get('Ngày giờ', '')) < before]
+            records.sort(key=lambda x: str(x.get('Ngày giờ', '')), reverse=True)
+            return records
+        
+        transactions = []
+        for _, sheet in self.partitions.overlapping(None, before):
+            if len(transactions) >= limit:
+                return transactions[:limit]
+            transactions.extend(newest_first(
+                self._sheets_call('read', 'get_all_records', sheet.get_all_records)
+            ))
+        if len(transactions) < limit:
+            transactions.extend(newest_first(self._base_records()))
+        return transactions[:limit]
+    
+    @staticmethod
+    def _summarize(transactions: List[Dict]) -> Dict:
+        """Tính thống kê từ các bản ghi get_all_records() đã lọc, mới nhất trước"""
+        total_thu = sum(float(t.get('Số tiền', 0)) for t in transactions if t.get('Loại') == 'Thu')
+        total_chi = sum(float(t.get('Số tiền', 0)) for t in transactions if t.get('Loại') == 'Chi')
+        so_luong = len(transactions)
+        
+        # Thống kê theo danh mục
+        danh_muc_stats = {}
+        for t in transactions:
+            danh_muc = t.get('Danh mục', 'Khác')
+            loai = t.get('Loại', '')
+            so_tien = float(t.get('Số tiền', 0))
+            
+            if danh_muc not in danh_muc_stats:
+                danh_muc_stats[danh_muc] = {'Thu': 0, 'Chi': 0, 'SoLuong': 0}
+            
+            danh_muc_stats[danh_muc][loai] += so_tien
+            danh_muc_stats[danh_muc]['SoLuong'] += 1
+        
+        return {
+            'total_thu': total_thu,
+            'total_chi': total_chi,
+            'so_luong': so_luong,
+            'danh_muc_stats': danh_muc_stats,
+            'transactions': transactions[:10]  # 10 giao dịch gần nhất
+        }
+    
+    def _summary_statistics(self, user_id: Optional[str], month: Optional[int], year: Optional[int]) -> Dict:
+        """Thống kê từ sheet tổng hợp (+ sheet lưu trữ): kích thước theo số (user, tháng, danh mục, loại)"""
+        from services.summary_sheet import SUMMARY_RANGE, summary_statistics
+        rows = self._sheets_call(
+            'read', 'get_values', self.sheet_summary.get_values,
+            SUMMARY_RANGE, value_render_option='UNFORMATTED_VALUE'
+        )
+        if rows and rows[0] and str(rows[0][0]).startswith('#'):
+            # Công thức lỗi (#REF!, #N/A...): không trả thống kê 0 như thể không có giao dịch
+            raise ValueError(f"summary sheet formula error: {rows[0][0]}")
+        return summary_statistics(rows + self._archive_rows(), user_id, month, year)
+    
+    def _archive_rows(self) -> List[List]:
+        """Các dòng của sheet lưu trữ (tổng hợp tĩnh của partition đã nén), rỗng nếu không chia partition"""
+        if self.sheet_archive is None:
+            return []
+        from services.summary_sheet import ARCHIVE_RANGE
+        return self._sheets_call(
+            'read', 'get_values', self.sheet_archive.get_values,
+            ARCHIVE_RANGE, value_render_option='UNFORMATTED_VALUE'
+        )
+    
+    @staticmethod
+    def _merge_statistics(stats: Dict, other: Dict) -> Dict:
+        """Cộng tổng thu/chi/số lượng và thống kê danh mục của other vào stats"""
+        for key in ('total_thu', 'total_chi', 'so_luong'):
+            stats[key] += other[key]
+        for danh_muc, values in other['danh_muc_stats'].items():
+            target = stats['danh_muc_stats'].setdefault(danh_muc, {'Thu': 0, 'Chi': 0, 'SoLuong': 0})
+            for key, value in values.items():
+                target[key] = target.get(key, 0) + value
+        return stats
+    
+    def _statistics(self, user_id: Optional[str], month: Optional[int], year: Optional[int]) -> Dict:
+        """Tính thống kê; ném exception nếu không đọc được dữ liệu (để không cache kết quả rỗng do lỗi)"""
+        from services.partitions import period_bounds
+        start, end = period_bounds(month, year)
+        covered = self._replica_covers(start, end)
+        if self.sheet_summary is not None and (not covered or self.replica is None or self.replica.needs_reconcile()):
+            # Replica chưa nạp (instance lạnh), đã cũ hoặc không giữ kỳ này:
+            # đọc sheet tổng hợp thay vì tải toàn bộ giao dịch
+            try:
+                return self._summary_statistics(user_id, month, year)
+            except Exception as e:
+                logger.warning("Could not read summary sheet, falling back to transactions: %s", e)
+        if covered and self.sync_replica():
+            return self.replica.get_statistics(user_id, month, year)
+        
+        records = self._read_records(start, end)
+        if user_id:
+            records = [r for r in records if r.get('User ID') == user_id]
+        records.sort(key=lambda x: x.get('Ngày giờ', ''), reverse=True)
+        transactions = records[:10000]
+        
+        # Lọc theo tháng/năm nếu có
+        if month or year:
+            filtered = []
+            for t in transactions:
+                date_str = t.get('Ngày giờ', '')
+                if date_str:
+                    try:
+                        date_obj = datetime.strptime(date_str.split()[0], '%Y-%m-%d')
+                        if month and date_obj.month != month:
+                            continue
+                        if year and date_obj.year != year:
+                            continue
+                        filtered.append(t)
+                    except:
+                        continue
+            transactions = filtered
+        
+        stats = self._summarize(transactions)
+        if self.sheet_archive is not None:
+            from services.summary_sheet import summary_statistics
+            self._merge_statistics(stats, summary_statistics(self._archive_rows(), user_id, month, year))
+        return stats
+    
+    def _range_statistics(self, user_id: Optional[str], start: str, end: str) -> Dict:
+        """
+        Thống kê theo khoảng ngày [start, end); ném exception nếu không đọc được dữ liệu
+        
+        Partition đã nén chỉ còn tổng theo tháng nên không tính vào thống kê theo ngày.
+        """
+        if self._replica_covers(start, end) and self.sync_replica():
+            return self.replica.get_range_statistics(user_id, start, end)
+        
+        records = self._read_records(start, end)
+        # 'YYYY-MM-DD HH:MM:SS' so sánh chuỗi được, không cần strptime
+        transactions = [
+            r for r in records
+            if (not user_id or r.get('User ID') == user_id) and start <= str(r.get('Ngày giờ', '')) < end
+        ]
+        transactions.sort(key=lambda x: str(x.get('Ngày giờ', '')), reverse=True)
+        return self._summarize(transactions)
+    
+    def _cached_report(self, key: Tuple, compute: Callable[[], Dict],
+                       render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        """Báo cáo qua stats cache: hit thì không gọi Google Sheets, lỗi đọc dữ liệu thì không cache"""
+        if self.stats_cache is not None:
+            cached = self.stats_cache.get(key)
+            if cached is not None:
+                return cached
+            version = self.stats_cache.version(key[0])
+        try:
+            stats = compute()
+        except Exception as e:
+            logger.error("Error getting statistics: %s", e)
+            stats = {'total_thu': 0, 'total_chi': 0, 'so_luong': 0, 'danh_muc_stats': {}, 'transactions': []}
+            return stats, render(stats)
+        text = render(stats)
+        if self.stats_cache is not None:
+            self.stats_cache.put(key, stats, text, version)
+        return stats, text
+    
+    def get_statistics_report(self, user_id: str, month: Optional[int], year: Optional[int],
+                              render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        """
+        Thống kê kèm nội dung phản hồi, qua cache (hit thì không gọi Google Sheets)
+        
+        Args:
+            user_id: ID người dùng
+            month: Tháng (None = tất cả)
+            year: Năm (None = tất cả)
+            render: Hàm dựng nội dung phản hồi từ dict thống kê
+            
+        Returns:
+            (stats, text)
+        """
+        return self._cached_report(
+            (str(user_id), month, year), lambda: self._statistics(user_id, month, year), render
+        )
+    
+    def get_range_statistics_report(self, user_id: str, start: date, end: date,
+                                    render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        """
+        Thống kê theo khoảng ngày kèm nội dung phản hồi, qua cache
+        
+        Args:
+            user_id: ID người dùng
+            start: Ngày đầu (bao gồm)
+            end: Ngày cuối (không bao gồm)
+            render: Hàm dựng nội dung phản hồi từ dict thống kê
+            
+        Returns:
+            (stats, text)
+        """
+        start_key, end_key = start.isoformat(), end.isoformat()
+        return self._cached_report(
+            (str(user_id), start_key, end_key),
+            lambda: self._range_statistics(user_id, start_key, end_key), render
+        )
     
     def get_statistics(self, user_id: str = 'default', month: Optional[int] = None, year: Optional[int] = None) -> Dict:
         """
@@ -193,52 +945,9 @@ class GoogleSheetsService:
             Dict chứa thống kê
         """
         try:
-            transactions = self.get_transactions(user_id, limit=10000)
-            
-            # Lọc theo tháng/năm nếu có
-            if month or year:
-                filtered = []
-                for t in transactions:
-                    date_str = t.get('Ngày giờ', '')
-                    if date_str:
-                        try:
-                            date_obj = datetime.strptime(date_str.split()[0], '%Y-%m-%d')
-                            if month and date_obj.month != month:
-                                continue
-                            if year and date_obj.year != year:
-                                continue
-                            filtered.append(t)
-                        except:
-                            continue
-                transactions = filtered
-            
-            # Tính toán
-            total_thu = sum(float(t.get('Số tiền', 0)) for t in transactions if t.get('Loại') == 'Thu')
-            total_chi = sum(float(t.get('Số tiền', 0)) for t in transactions if t.get('Loại') == 'Chi')
-            so_luong = len(transactions)
-            
-            # Thống kê theo danh mục
-            danh_muc_stats = {}
-            for t in transactions:
-                danh_muc = t.get('Danh mục', 'Khác')
-                loai = t.get('Loại', '')
-                so_tien = float(t.get('Số tiền', 0))
-                
-                if danh_muc not in danh_muc_stats:
-                    danh_muc_stats[danh_muc] = {'Thu': 0, 'Chi': 0, 'SoLuong': 0}
-                
-                danh_muc_stats[danh_muc][loai] += so_tien
-                danh_muc_stats[danh_muc]['SoLuong'] += 1
-            
-            return {
-                'total_thu': total_thu,
-                'total_chi': total_chi,
-                'so_luong': so_luong,
-                'danh_muc_stats': danh_muc_stats,
-                'transactions': transactions[:10]  # 10 giao dịch gần nhất
-            }
+            return self._statistics(user_id, month, year)
         except Exception as e:
-            print(f"Error getting statistics: {e}")
+            logger.error("Error getting statistics: %s", e)
             return {
                 'total_thu': 0,
                 'total_chi': 0,
@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.metrics import metrics
+
+class AsyncSheetsService:
+    """
+    Client Google Sheets awaitable cho handler async
+
+    gspread là thư viện đồng bộ, nên mọi lời gọi chạy trên 1 thread pool riêng
+    (không dùng chung default executor của event loop) và handler chỉ await kết quả:
+    1 request chờ Sheets không chặn các request khác. Số thread giới hạn
+    số thao tác Sheets đồng thời của instance.
+    """
+
+    def __init__(self, factory: Callable[[], 'GoogleSheetsService'], max_workers: int = 8):
+        """
+        Khởi tạo service
+
+        Args:
+            factory: Hàm trả về GoogleSheetsService (gọi lần đầu trong thread pool, không chặn event loop)
+            max_workers: Số thread tối đa cho các lời gọi Sheets
+        """
+        self._factory = factory
+        self._service = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='sheets')
+
+    @property
+    def service(self) -> 'GoogleSheetsService':
+        """GoogleSheetsService đồng bộ bên dưới (khởi tạo khi cần, chỉ gọi từ thread pool)"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = self._factory()
+        return self._service
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """
+        Chạy hàm đồng bộ trên thread pool của Sheets
+
+        Giữ contextvars của request (request_id, stage timing) và đo thời gian chờ thread.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def call():
+            metrics.observe('sheets_executor_wait_seconds', time.perf_counter() - submitted)
+            return context.run(func, *args, **kwargs)
+
+        return await loop.run_in_executor(self._executor, call)
+
+    async def _call(self, method: str, *args, **kwargs):
+        return await self.run(lambda: getattr(self.service, method)(*args, **kwargs))
+
+    async def add_transaction(self, transaction: Dict[str, any], user_id: str = 'default') -> bool:
+        """Thêm giao dịch (xem GoogleSheetsService.add_transaction)"""
+        return await self._call('add_transaction', transaction, user_id=user_id)
+
+    async def add_transactions(self, transactions: List[Dict[str, any]], user_id: str = 'default') -> bool:
+        """Thêm nhiều giao dịch bằng 1 lần append_rows"""
+        return await self._call('add_transactions', transactions, user_id=user_id)
+
+    async def get_transactions(self, user_id: str = 'default', limit: int = 100) -> List[Dict]:
+        """Lấy giao dịch mới nhất trước"""
+        return await self._call('get_transactions', user_id, limit)
+
+    async def get_statistics(self, user_id: str = 'default', month: Optional[int] = None,
+                             year: Optional[int] = None) -> Dict:
+        """Thống kê theo tháng/năm"""
+        return await self._call('get_statistics', user_id, month, year)
+
+    async def get_statistics_report(self, user_id: str, month: Optional[int], year: Optional[int],
+                                    render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        """Thống kê kèm nội dung phản hồi, qua stats cache"""
+        return await self._call('get_statistics_report', user_id, month, year, render)
+
+    async def get_range_statistics_report(self, user_id: str, start: date, end: date,
+                                          render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        """Thống kê theo khoảng ngày [start, end) kèm nội dung phản hồi"""
+        return await self._call('get_range_statistics_report', user_id, start, end, render)
+
+    async def get_categories(self) -> List[str]:
+        """Danh sách danh mục (qua category cache)"""
+        return await self._call('get_categories')
+
+    async def get_nlp_processor(self):
+        """NLPProcessor dựng sẵn cho danh mục hiện tại"""
+        return await self._call('get_nlp_processor')
+
+    async def flush_writes(self):
+        """Ghi ngay các giao dịch đang chờ trong write buffer"""
+        return await self._call('flush_writes')
+
+    def close(self, wait: bool = True):
+        """Dừng thread pool (chờ các lời gọi đang chạy xong)"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,139 @@
+from collections import deque, namedtuple
+from typing import Any, Iterable, List, Optional, Tuple
+
+Match = namedtuple('Match', ['start', 'end', 'keyword', 'value'])
+
+class KeywordMatcher:
+    """
+    Automaton Aho-Corasick để tìm nhiều từ khóa trong 1 lần duyệt tin nhắn
+
+    Dựng 1 lần cho mỗi bộ từ khóa/danh mục; chi phí tìm kiếm chỉ phụ thuộc
+    độ dài tin nhắn và số kết quả, không phụ thuộc số từ khóa.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]], word_boundary: bool = True):
+        """
+        Dựng automaton
+
+        Args:
+            keywords: Các cặp (từ khóa, giá trị trả về khi match); so khớp không phân biệt hoa thường
+            word_boundary: Chỉ nhận match nằm trọn trong ranh giới từ
+        """
+        self.word_boundary = word_boundary
+        # Mỗi node: dict ký tự -> node con; fail link; danh sách index từ khóa kết thúc tại node
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._keywords: List[Tuple[str, Any]] = []
+
+        seen = set()
+        for keyword, value in keywords:
+            keyword = (keyword or '').lower()
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            self._add(keyword, len(self._keywords))
+            self._keywords.append((keyword, value))
+        self._build_fail_links()
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def _add(self, keyword: str, index: int):
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(index)
+
+    def _build_fail_links(self):
+        """BFS để dựng fail link và gộp output theo fail link"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    @staticmethod
+    def _is_boundary(text: str, index: int) -> bool:
+        return index < 0 or index >= len(text) or not text[index].isalnum()
+
+    def find_all(self, text: str) -> List[Match]:
+        """
+        Tìm mọi match (có thể chồng nhau) trong text
+
+        Args:
+            text: Chuỗi cần tìm (nên đã lower())
+
+        Returns:
+            List Match(start, end, keyword, value) theo thứ tự vị trí kết thúc
+        """
+        matches = []
+        if not self._keywords:
+            return matches
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in output[node]:
+                keyword, value = self._keywords[index]
+                start = i - len(keyword) + 1
+                if self.word_boundary and not (
+                    self._is_boundary(text, start - 1) and self._is_boundary(text, i + 1)
+                ):
+                    continue
+                matches.append(Match(start, i + 1, keyword, value))
+        return matches
+
+    def find_longest(self, text: str) -> Optional[Match]:
+        """
+        Tìm match dài nhất (bằng nhau thì lấy match xuất hiện trước)
+
+        Returns:
+            Match hoặc None
+        """
+        best = None
+        for match in self.find_all(text):
+            length = match.end - match.start
+            if best is None or length > best.end - best.start or (
+                length == best.end - best.start and match.start < best.start
+            ):
+                best = match
+        return best
+
+    @staticmethod
+    def select_non_overlapping(matches: List[Match]) -> List[Match]:
+        """
+        Chọn các match không chồng nhau, ưu tiên match dài hơn (trái sang phải)
+
+        Returns:
+            List Match theo thứ tự vị trí bắt đầu
+        """
+        candidates = sorted(matches, key=lambda m: (m.start, -(m.end - m.start)))
+        selected = []
+        last_end = -1
+        for match in candidates:
+            if match.start >= last_end:
+                selected.append(match)
+                last_end = match.end
+        return selected
+
+    def find_non_overlapping(self, text: str) -> List[Match]:
+        """Tìm các match không chồng nhau trong text (xem select_non_overlapping)"""
+        return self.select_non_overlapping(self.find_all(text))
@@ -0,0 +1,322 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from services.rollups import MonthlyRollups
+from services.date_index import DateIndex
+
+class LocalReplica:
+    """
+    Bản sao SQLite cục bộ của sheet 'Giao dịch'
+
+    Mỗi dòng lưu kèm số dòng trên sheet (row_num) để đồng bộ tăng dần:
+    chỉ đọc các dòng mới được append sau dòng cuối cùng đã biết.
+    Rollup theo tháng được dựng 1 lần từ dữ liệu cũ và cộng dồn theo từng dòng mới.
+    DateIndex (thời gian đã sắp xếp + prefix sum) phục vụ thống kê theo khoảng ngày bất kỳ.
+    """
+
+    # Số dòng header trên sheet (dòng dữ liệu đầu tiên là dòng 2)
+    HEADER_ROWS = 1
+
+    def __init__(self, db_path: str, reconcile_interval: int = 3600, source_id: Optional[str] = None):
+        """
+        Khởi tạo replica
+
+        Args:
+            db_path: Đường dẫn file SQLite (ví dụ /tmp/botchitieu_replica.db)
+            reconcile_interval: Số giây giữa 2 lần đối chiếu toàn bộ sheet
+            source_id: ID spreadsheet được phản chiếu; file còn lại của spreadsheet khác thì bị xóa trắng
+        """
+        self.db_path = db_path
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            # WAL: đọc không bị chặn bởi ghi; synchronous=NORMAL vẫn an toàn với WAL và commit nhanh hơn
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+        except sqlite3.DatabaseError:
+            pass
+        self.rollups = MonthlyRollups()
+        self.date_index = DateIndex()
+        self._init_schema()
+        if source_id:
+            self._check_source(str(source_id))
+        self._load_rollups()
+
+    def _init_schema(self):
+        """Tạo bảng và index nếu chưa có"""
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS transactions (
+                    row_num INTEGER PRIMARY KEY,
+                    ngay_gio TEXT NOT NULL,
+                    year INTEGER,
+                    month INTEGER,
+                    loai TEXT,
+                    so_tien REAL,
+                    danh_muc TEXT,
+                    ghi_chu TEXT,
+                    user_id TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tx_user_date
+                    ON transactions (user_id, ngay_gio);
+                CREATE INDEX IF NOT EXISTS idx_tx_user_period
+                    ON transactions (user_id, year, month);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            self.conn.commit()
+
+    def _check_source(self, source_id: str):
+        """Dữ liệu trong file thuộc spreadsheet khác (đổi GOOGLE_SHEET_ID) thì xóa để sync đọc lại từ đầu"""
+        with self._lock:
+            current = self._get_meta('source_id')
+        if current == source_id:
+            return
+        if current or self.last_row > self.HEADER_ROWS:
+            self.replace_all([])
+        with self._lock:
+            self._set_meta('source_id', source_id)
+            self.conn.commit()
+
+    def _load_rollups(self):
+        """Dựng rollup và date index từ dữ liệu đã có trong SQLite (1 lần khi khởi tạo)"""
+        with self._lock:
+            self.rollups.clear()
+            self.date_index.clear()
+            rows = self.conn.execute(
+                'SELECT user_id, year, month, danh_muc, loai, SUM(so_tien), COUNT(*) '
+                'FROM transactions WHERE year IS NOT NULL '
+                'GROUP BY user_id, year, month, danh_muc, loai'
+            ).fetchall()
+            for user_id, year, month, danh_muc, loai, total, count in rows:
+                self.rollups.add(user_id, year, month, danh_muc, loai, total, count)
+            # Đọc theo thứ tự thời gian để index chỉ cần append
+            rows = self.conn.execute(
+                'SELECT user_id, ngay_gio, danh_muc, loai, so_tien FROM transactions '
+                'ORDER BY user_id, ngay_gio, row_num'
+            )
+            for user_id, ngay_gio, danh_muc, loai, so_tien in rows:
+                self.date_index.add(user_id, ngay_gio, danh_muc, loai, so_tien)
+
+    def _get_meta(self, key: str, default: str = '') -> str:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self.conn.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value))
+        )
+
+    @property
+    def last_row(self) -> int:
+        """Số dòng cuối cùng trên sheet đã được đồng bộ (1 = chỉ có header)"""
+        with self._lock:
+            return int(self._get_meta('last_row', str(self.HEADER_ROWS)))
+
+    def needs_reconcile(self) -> bool:
+        """Kiểm tra đã đến lúc đối chiếu toàn bộ sheet chưa"""
+        with self._lock:
+            last = float(self._get_meta('last_reconcile', '0'))
+        return time.time() - last >= self.reconcile_interval
+
+    @staticmethod
+    def _to_record(row_num: int, row: List) -> Optional[tuple]:
+        """Chuyển 1 dòng sheet thành tuple để insert, None nếu dòng rỗng"""
+        row = list(row) + [''] * (6 - len(row))
+        ngay_gio, loai, so_tien, danh_muc, ghi_chu, user_id = row[:6]
+        ngay_gio = str(ngay_gio or '')
+        if not ngay_gio:
+            return None
+        try:
+            so_tien = float(so_tien or 0)
+        except (TypeError, ValueError):
+            so_tien = 0.0
+        # 'YYYY-MM-DD HH:MM:SS' -> year, month (không cần strptime)
+        try:
+            year, month = int(ngay_gio[0:4]), int(ngay_gio[5:7])
+        except ValueError:
+            year, month = None, None
+        return (row_num, ngay_gio, year, month, str(loai or ''), so_tien,
+                str(danh_muc or ''), str(ghi_chu or ''), str(user_id or ''))
+
+    @classmethod
+    def build_rollups(cls, rows: List[List]) -> MonthlyRollups:
+        """Dựng rollup mới từ các dòng sheet (không gồm header), dùng để đối chiếu"""
+        rollups = MonthlyRollups()
+        for offset, row in enumerate(rows):
+            record = cls._to_record(cls.HEADER_ROWS + 1 + offset, row)
+            if record and record[2] is not None:
+                _, _, year, month, loai, so_tien, danh_muc, _, user_id = record
+                rollups.add(user_id, year, month, danh_muc, loai, so_tien)
+        return rollups
+
+    def _insert_rows(self, start_row: int, rows: List[List]) -> int:
+        records = []
+        for offset, row in enumerate(rows):
+            record = self._to_record(start_row + offset, row)
+            if record:
+                records.append(record)
+                _, ngay_gio, year, month, loai, so_tien, danh_muc, _, user_id = record
+                if year is not None:
+                    self.rollups.add(user_id, year, month, danh_muc, loai, so_tien)
+                self.date_index.add(user_id, ngay_gio, danh_muc, loai, so_tien)
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO transactions '
+            '(row_num, ngay_gio, year, month, loai, so_tien, danh_muc, ghi_chu, user_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            records
+        )
+        return len(records)
+
+    def apply_rows(self, start_row: int, rows: List[List]) -> int:
+        """
+        Ghi các dòng mới (tail) vào replica
+
+        Args:
+            start_row: Số dòng trên sheet của phần tử đầu tiên trong rows
+            rows: Danh sách giá trị các dòng (theo thứ tự cột của sheet)
+
+        Returns:
+            Số dòng đã ghi
+        """
+        # Bỏ các dòng rỗng ở cuối để không đẩy last_row vượt quá dữ liệu thật
+        rows = list(rows)
+        while rows and not any(rows[-1]):
+            rows.pop()
+        if not rows:
+            return 0
+        with self._lock:
+            # Bỏ phần đã đồng bộ để rollup không bị cộng trùng
+            last_row = int(self._get_meta('last_row', str(self.HEADER_ROWS)))
+            if start_row <= last_row:
+                rows = rows[last_row + 1 - start_row:]
+                start_row = last_row + 1
+                if not rows:
+                    return 0
+            count = self._insert_rows(start_row, rows)
+            self._set_meta('last_row', start_row + len(rows) - 1)
+            self.conn.commit()
+        return count
+
+    def replace_all(self, rows: List[List]) -> int:
+        """
+        Thay toàn bộ replica bằng dữ liệu sheet (đối chiếu đầy đủ)
+
+        Args:
+            rows: Tất cả các dòng dữ liệu (không gồm header)
+
+        Returns:
+            Số dòng đã ghi
+        """
+        start_row = self.HEADER_ROWS + 1
+        with self._lock:
+            self.conn.execute('DELETE FROM transactions')
+            self.rollups.clear()
+            self.date_index.clear()
+            count = self._insert_rows(start_row, rows)
+            self._set_meta('last_row', self.HEADER_ROWS + len(rows))
+            self._set_meta('last_reconcile', time.time())
+            self.conn.commit()
+        return count
+
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self.conn.close()
+
+    @staticmethod
+    def _row_to_dict(row: tuple) -> Dict:
+        """Chuyển dòng SQLite về format giống get_all_records()"""
+        return {
+            'Ngày giờ': row[0],
+            'Loại': row[1],
+            'Số tiền': row[2],
+            'Danh mục': row[3],
+            'Ghi chú': row[4],
+            'User ID': row[5],
+        }
+
+    def get_transactions(self, user_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """
+        Lấy giao dịch mới nhất trước, dùng index (user_id, ngay_gio)
+
+        Args:
+            user_id: Lọc theo user (None = tất cả)
+            limit: Số lượng giao dịch cần lấy
+
+        Returns:
+            List các giao dịch
+        """
+        sql = 'SELECT ngay_gio, loai, so_tien, danh_muc, ghi_chu, user_id FROM transactions'
+        params: list = []
+        if user_id:
+            sql += ' WHERE user_id = ?'
+            params.append(str(user_id))
+        sql += ' ORDER BY ngay_gio DESC, row_num DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def get_statistics(self, user_id: Optional[str] = None, month: Optional[int] = None,
+                       year: Optional[int] = None) -> Dict:
+        """
+        Tính thống kê từ rollup theo tháng, chỉ truy vấn SQL (có index) cho 10 giao dịch gần nhất
+
+        Returns:
+            Dict cùng format với GoogleSheetsService.get_statistics()
+        """
+        where = []
+        params: list = []
+        if user_id:
+            where.append('user_id = ?')
+            params.append(str(user_id))
+        if year:
+            where.append('year = ?')
+            params.append(year)
+        if month:
+            where.append('month = ?')
+            params.append(month)
+        where_sql = (' WHERE ' + ' AND '.join(where)) if where else ''
+
+        with self._lock:
+            stats = self.rollups.statistics(user_id, month, year)
+            recent = self.conn.execute(
+                'SELECT ngay_gio, loai, so_tien, danh_muc, ghi_chu, user_id FROM transactions'
+                + where_sql + ' ORDER BY ngay_gio DESC, row_num DESC LIMIT 10',
+                params
+            ).fetchall()
+
+        stats['transactions'] = [self._row_to_dict(r) for r in recent]
+        return stats
+
+    def get_range_statistics(self, user_id: Optional[str], start: str, end: str) -> Dict:
+        """
+        Thống kê theo khoảng ngày [start, end) từ date index, O(log n) theo số giao dịch
+
+        Args:
+            user_id: ID người dùng (None = tất cả)
+            start: Mốc đầu (bao gồm), ví dụ '2026-03-01'
+            end: Mốc cuối (không bao gồm), ví dụ '2026-03-16'
+
+        Returns:
+            Dict cùng format với GoogleSheetsService.get_statistics()
+        """
+        sql = ('SELECT ngay_gio, loai, so_tien, danh_muc, ghi_chu, user_id FROM transactions '
+               'WHERE ngay_gio >= ? AND ngay_gio < ?')
+        params: list = [start, end]
+        if user_id:
+            sql += ' AND user_id = ?'
+            params.append(str(user_id))
+        sql += ' ORDER BY ngay_gio DESC, row_num DESC LIMIT 10'
+
+        with self._lock:
+            stats = self.date_index.statistics(user_id, start, end)
+            recent = self.conn.execute(sql, params).fetchall()
+
+        stats['transactions'] = [self._row_to_dict(r) for r in recent]
+        return stats
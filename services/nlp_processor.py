@@ -1,149 +1,280 @@
 import re
-from typing import Dict, Optional, List
+from collections import deque, namedtuple
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, List, Union
+from services.keyword_matcher import KeywordMatcher
+
+# 1 đoạn đã phân loại trong tin nhắn (offset tính trên tin nhắn đã lower().strip())
+Span = namedtuple('Span', ['kind', 'start', 'end', 'text', 'value'])
 
 class NLPProcessor:
     """Xử lý ngôn ngữ tự nhiên để trích xuất thông tin giao dịch bằng regex"""
-    
+
     # Từ khóa cho loại giao dịch
     THU_KEYWORDS = ['thu', 'nhận', 'nhận được', 'lương', 'tiền lương', 'được', 'có']
     CHI_KEYWORDS = ['chi', 'chi tiêu', 'mua', 'trả', 'thanh toán', 'tốn', 'hết']
-    
+
+    # Từ thừa bị bỏ ở đầu ghi chú
+    FILLER_WORDS = frozenset(['cho', 'để', 'với', 'về', 'hôm', 'nay', 'qua'])
+
+    # Số tiền: số + đơn vị ("50k", "1.5 triệu", "5tr", "30 nghìn") hoặc số thuần ít nhất 4 chữ số
+    AMOUNT_PATTERN = re.compile(
+        r'(?P<number>\d+(?:\.\d+)?)\s*(?P<unit>k|tri[eệ]u|tr[iệ]u|tr|ngh[ìi]n)\b'
+        r'|\b(?P<plain>\d{4,})\b',
+        re.IGNORECASE
+    )
+    WORD_PATTERN = re.compile(r'\S+')
+
+    # Đơn vị chuẩn hóa -> hệ số; khi có nhiều số tiền, đơn vị đứng trước trong UNIT_PRIORITY được chọn
+    UNIT_MULTIPLIERS = {'k': 1000, 'triệu': 1000000, 'tr': 1000000, 'nghìn': 1000, '': 1}
+    UNIT_PRIORITY = ('k', 'triệu', 'tr', 'nghìn', '')
+
     def __init__(self, categories: List[str] = None):
         """
         Khởi tạo processor
-        
+
         Args:
             categories: Danh sách danh mục từ Google Sheets (nếu có)
         """
         self.categories = categories or []
-    
+        # Dựng automaton 1 lần cho bộ từ khóa và danh mục, dùng lại cho mọi tin nhắn
+        self._loai_matcher = KeywordMatcher(
+            [(kw, 'Thu') for kw in self.THU_KEYWORDS] + [(kw, 'Chi') for kw in self.CHI_KEYWORDS]
+        )
+        self._category_matcher = KeywordMatcher(
+            (category, category) for category in self.categories
+        )
+
     def process(self, message: str) -> Dict[str, any]:
         """
         Xử lý tin nhắn và trích xuất thông tin
-        
+
         Args:
             message: Tin nhắn từ người dùng
-            
+
         Returns:
-            Dict chứa: loai, so_tien, danh_muc, ghi_chu, is_valid
+            Dict chứa: loai, so_tien, danh_muc, ghi_chu, is_valid, spans
         """
         message_original = message
         message = message.lower().strip()
-        
-        # Trích xuất loại giao dịch
-        loai = self._extract_loai(message)
-        
-        # Trích xuất số tiền
-        so_tien = self._extract_so_tien(message)
-        
-        # Trích xuất danh mục (sẽ match với danh sách từ sheet)
-        danh_muc = self._extract_danh_muc(message)
-        
-        # Trích xuất ghi chú
-        ghi_chu = self._extract_ghi_chu(message, so_tien, danh_muc)
-        
+
+        # Tách tin nhắn 1 lần thành các span đã phân loại
+        spans = self.tokenize(message)
+
+        loai = self._extract_loai(spans)
+        so_tien = self._extract_so_tien(spans)
+        danh_muc = self._extract_danh_muc(spans)
+        ghi_chu = self._extract_ghi_chu(spans)
+
         # Validate
         is_valid = loai is not None and so_tien is not None and danh_muc is not None
-        
+
         return {
             'loai': loai,
             'so_tien': so_tien,
             'danh_muc': danh_muc,
             'ghi_chu': ghi_chu,
             'is_valid': is_valid,
-            'raw_message': message_original
+            'raw_message': message_original,
+            'spans': spans
         }
-    
-    def _extract_loai(self, message: str) -> Optional[str]:
-        """Trích xuất loại giao dịch (Thu/Chi)"""
-        # Kiểm tra từ khóa Thu trước (ưu tiên)
-        for keyword in self.THU_KEYWORDS:
-            if keyword in message:
-                return 'Thu'
-        
-        # Kiểm tra từ khóa Chi
-        for keyword in self.CHI_KEYWORDS:
-            if keyword in message:
-                return 'Chi'
-        
-        return None
-    
-    def _extract_so_tien(self, message: str) -> Optional[float]:
-        """Trích xuất số tiền từ tin nhắn"""
-        # Pattern 1: "50k", "100k", "1k", "1.5k"
-        pattern1 = r'(\d+(?:\.\d+)?)\s*k\b'
-        match = re.search(pattern1, message, re.IGNORECASE)
-        if match:
-            return float(match.group(1)) * 1000
-        
-        # Pattern 2: "5 triệu", "1.5 triệu", "5tr"
-        pattern2 = r'(\d+(?:\.\d+)?)\s*tr[iiệ]u\b'
-        match = re.search(pattern2, message, re.IGNORECASE)
-        if match:
-            return float(match.group(1)) * 1000000
-        
-        # Pattern 3: "5tr" (viết tắt)
-        pattern3 = r'(\d+(?:\.\d+)?)\s*tr\b'
-        match = re.search(pattern3, message, re.IGNORECASE)
-        if match:
-            return float(match.group(1)) * 1000000
-        
-        # Pattern 4: "30 nghìn", "100 nghìn", "30nghin"
-        pattern4 = r'(\d+(?:\.\d+)?)\s*ngh[ìi]n\b'
-        match = re.search(pattern4, message, re.IGNORECASE)
-        if match:
-            return float(match.group(1)) * 1000
-        
-        # Pattern 5: Số thuần túy "50000", "1000000" (ít nhất 4 chữ số)
-        pattern5 = r'\b(\d{4,})\b'
-        match = re.search(pattern5, message)
-        if match:
-            return float(match.group(1))
-        
-        return None
-    
-    def _extract_danh_muc(self, message: str) -> Optional[str]:
+
+    def parse_amount(self, text: str) -> Optional[float]:
+        """
+        Đọc số tiền từ 1 chuỗi ngắn ('50k', '1.5 triệu', '50000')
+
+        Returns:
+            Số tiền hoặc None nếu không đọc được
+        """
+        text = text.lower().strip()
+        so_tien = self._extract_so_tien(sorted(self._scan_amounts(text), key=lambda span: span.start))
+        if so_tien is None:
+            # Số thuần ngắn ('500') hoặc có dấu phân cách hàng nghìn ('50.000', '50,000')
+            digits = text.rstrip('đ').strip()
+            if not re.fullmatch(r'\d{1,3}(?:[.,]\d{3})*|\d+', digits):
+                return None
+            so_tien = float(re.sub(r'[.,]', '', digits))
+        return so_tien if so_tien > 0 else None
+
+    def process_many(self, messages: Iterable[str], stream: bool = False, processes: int = 0,
+                     chunk_size: int = 256) -> Union[List[Dict], Iterator[Dict]]:
+        """
+        Xử lý nhiều tin nhắn 1 lượt (import hàng loạt, parse lại tin nhắn cũ sau khi đổi luật)
+
+        Dùng chung matcher đã dựng sẵn; tin nhắn trùng nhau trong lô chỉ parse 1 lần.
+
+        Args:
+            messages: Danh sách (hoặc iterable) tin nhắn
+            stream: True = trả về generator, xử lý dần theo input
+            processes: > 1 thì chia lô cho process pool (chỉ đáng dùng với lô rất lớn)
+            chunk_size: Số tin nhắn mỗi lần gửi sang 1 process
+
+        Returns:
+            List (hoặc generator) kết quả như process(), đúng thứ tự input
+        """
+        if processes and processes > 1:
+            results = self._process_pool(messages, processes, chunk_size)
+        else:
+            results = self._process_iter(messages)
+        return results if stream else list(results)
+
+    def _process_iter(self, messages: Iterable[str], memo_size: int = 4096) -> Iterator[Dict]:
+        """Xử lý tuần tự, nhớ kết quả của các tin nhắn đã gặp trong lô"""
+        memo: Dict[str, Dict] = {}
+        process = self.process
+        for message in messages:
+            result = memo.get(message)
+            if result is None:
+                if len(memo) >= memo_size:
+                    memo.clear()
+                result = memo[message] = process(message)
+            yield dict(result)
+
+    def _process_pool(self, messages: Iterable[str], processes: int, chunk_size: int) -> Iterator[Dict]:
+        """Chia input thành từng chunk cho process pool, giữ thứ tự và giới hạn số chunk đang chờ"""
+        from concurrent.futures import ProcessPoolExecutor
+        iterator = iter(messages)
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_pool_worker,
+                                 initargs=(self.categories,)) as executor:
+            pending = deque()
+            while True:
+                chunk = list(islice(iterator, max(1, chunk_size)))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_process_chunk, chunk))
+                if len(pending) >= processes * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def tokenize(self, message: str) -> List[Span]:
+        """
+        Tách tin nhắn thành các span: amount, unit, type, category, filler, text
+
+        Args:
+            message: Tin nhắn đã lower().strip()
+
+        Returns:
+            List Span theo thứ tự vị trí bắt đầu
+        """
+        spans = self._scan_amounts(message)
+        spans += self._scan_categories(message)
+        spans += self._scan_keywords(message)
+        spans += self._scan_text(message, spans)
+        spans.sort(key=lambda span: (span.start, span.end))
+        return spans
+
+    @staticmethod
+    def _normalize_unit(unit: Optional[str]) -> str:
+        """Chuẩn hóa đơn vị tiền: 'k', 'triệu', 'tr', 'nghìn' hoặc '' (số thuần)"""
+        if not unit:
+            return ''
+        unit = unit.lower()
+        if unit in ('k', 'tr'):
+            return unit
+        if unit.startswith('tr'):
+            return 'triệu'
+        return 'nghìn'
+
+    def _scan_amounts(self, message: str) -> List[Span]:
+        """Tìm mọi số tiền (kèm span đơn vị) trong 1 lần finditer"""
+        spans = []
+        for match in self.AMOUNT_PATTERN.finditer(message):
+            if match.group('plain'):
+                spans.append(Span('amount', match.start(), match.end(), match.group('plain'),
+                                  float(match.group('plain'))))
+                continue
+            unit = self._normalize_unit(match.group('unit'))
+            spans.append(Span('amount', match.start('number'), match.end('number'),
+                              match.group('number'),
+                              float(match.group('number')) * self.UNIT_MULTIPLIERS[unit]))
+            spans.append(Span('unit', match.start('unit'), match.end('unit'),
+                              match.group('unit'), unit))
+        return spans
+
+    def _scan_categories(self, message: str) -> List[Span]:
+        """Tìm danh mục dài nhất và đánh dấu mọi lần xuất hiện của nó"""
+        if not self.categories:
+            return []
+        matches = self._category_matcher.find_all(message)
+        if not matches:
+            return []
+        best = max(matches, key=lambda m: (m.end - m.start, -m.start))
+        same = [m for m in matches if m.value == best.value]
+        return [
+            Span('category', m.start, m.end, message[m.start:m.end], m.value)
+            for m in KeywordMatcher.select_non_overlapping(same)
+        ]
+
+    def _scan_keywords(self, message: str) -> List[Span]:
+        """
+        Tìm từ khóa Thu/Chi (không chồng nhau, ưu tiên từ dài hơn)
+        Span từ khóa có thể nằm trong span danh mục, ví dụ 'mua' trong 'mua sắm'
+        """
+        return [
+            Span('type', m.start, m.end, message[m.start:m.end], m.value)
+            for m in KeywordMatcher.select_non_overlapping(self._loai_matcher.find_all(message))
+        ]
+
+    def _scan_text(self, message: str, spans: List[Span]) -> List[Span]:
+        """Phần còn lại (giữa các span) là free text; từ thừa ở đầu là filler"""
+        covered = sorted((span.start, span.end) for span in spans if span.end > span.start)
+        result = []
+        position = 0
+        leading = True
+        for start, end in covered + [(len(message), len(message))]:
+            if start > position:
+                for word in self.WORD_PATTERN.finditer(message, position, start):
+                    kind = 'filler' if leading and word.group() in self.FILLER_WORDS else 'text'
+                    leading = leading and kind == 'filler'
+                    result.append(Span(kind, word.start(), word.end(), word.group(), None))
+            position = max(position, end)
+        return result
+
+    def _extract_loai(self, spans: List[Span]) -> Optional[str]:
+        """Trích xuất loại giao dịch (Thu/Chi), Thu được ưu tiên nếu có cả hai"""
+        loai = None
+        for span in spans:
+            if span.kind == 'type':
+                if span.value == 'Thu':
+                    return 'Thu'
+                loai = span.value
+        return loai
+
+    def _extract_so_tien(self, spans: List[Span]) -> Optional[float]:
+        """Trích xuất số tiền: ưu tiên k > triệu > tr > nghìn > số thuần, rồi theo vị trí"""
+        best = None
+        for i, span in enumerate(spans):
+            if span.kind != 'amount':
+                continue
+            unit = ''
+            if i + 1 < len(spans) and spans[i + 1].kind == 'unit':
+                unit = spans[i + 1].value
+            rank = self.UNIT_PRIORITY.index(unit)
+            if best is None or rank < best[0]:
+                best = (rank, span.value)
+        return best[1] if best else None
+
+    def _extract_danh_muc(self, spans: List[Span]) -> Optional[str]:
         """
         Trích xuất danh mục từ tin nhắn
         Match với danh sách categories từ Google Sheets
         """
-        if not self.categories:
-            return None
-        
-        message_lower = message.lower()
-        
-        # Tìm category match (tìm từ dài nhất trước)
-        sorted_categories = sorted(self.categories, key=len, reverse=True)
-        
-        for category in sorted_categories:
-            category_lower = category.lower()
-            # Kiểm tra exact match hoặc partial match
-            if category_lower in message_lower:
-                return category  # Trả về tên gốc (có thể có chữ hoa)
-        
+        for span in spans:
+            if span.kind == 'category':
+                return span.value  # Trả về tên gốc (có thể có chữ hoa)
         return None
-    
-    def _extract_ghi_chu(self, message: str, so_tien: Optional[float], danh_muc: Optional[str]) -> str:
-        """Trích xuất ghi chú từ tin nhắn"""
-        ghi_chu = message
-        
-        # Loại bỏ số tiền
-        if so_tien:
-            # Loại bỏ pattern số tiền
-            ghi_chu = re.sub(r'(\d+(?:\.\d+)?)\s*(k|tr[iiệ]u|tr|ngh[ìi]n)\b', '', ghi_chu, flags=re.IGNORECASE)
-            ghi_chu = re.sub(r'\b\d{4,}\b', '', ghi_chu)
-        
-        # Loại bỏ từ khóa loại
-        for keyword in self.THU_KEYWORDS + self.CHI_KEYWORDS:
-            ghi_chu = re.sub(r'\b' + re.escape(keyword) + r'\b', '', ghi_chu, flags=re.IGNORECASE)
-        
-        # Loại bỏ danh mục
-        if danh_muc:
-            ghi_chu = re.sub(re.escape(danh_muc.lower()), '', ghi_chu, flags=re.IGNORECASE)
-        
-        # Loại bỏ các từ thừa và khoảng trắng
-        ghi_chu = re.sub(r'\s+', ' ', ghi_chu).strip()
-        ghi_chu = re.sub(r'^(cho|để|với|về|hôm|nay|qua)\s+', '', ghi_chu, flags=re.IGNORECASE)
-        
-        return ghi_chu if ghi_chu else ''
 
+    def _extract_ghi_chu(self, spans: List[Span]) -> str:
+        """Ghi chú là các từ free text còn lại sau khi bỏ số tiền, từ khóa, danh mục, từ thừa"""
+        return ' '.join(span.text for span in spans if span.kind == 'text')
+
+# Processor riêng của mỗi process trong pool (process_many với processes > 1)
+_pool_processor: Optional[NLPProcessor] = None
+
+def _init_pool_worker(categories: List[str]):
+    global _pool_processor
+    _pool_processor = NLPProcessor(categories=categories)
+
+def _process_chunk(messages: List[str]) -> List[Dict]:
+    return list(_pool_processor._process_iter(messages))
@@ -0,0 +1,132 @@
+import re
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Month = Tuple[int, int]
+
+def partition_title(base_title: str, year: int, month: int) -> str:
+    """Tên worksheet của 1 tháng, ví dụ 'Giao dịch 2026-10'"""
+    return f'{base_title} {year:04d}-{month:02d}'
+
+def parse_partition_title(base_title: str, title: str) -> Optional[Month]:
+    """(năm, tháng) nếu title là tên 1 partition của base_title, None nếu không phải"""
+    match = re.fullmatch(re.escape(base_title) + r' (\d{4})-(\d{2})', title)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    return (year, month) if 1 <= month <= 12 else None
+
+def month_start(year: int, month: int) -> str:
+    """Mốc đầu tháng dạng 'YYYY-MM-DD' (so sánh chuỗi được với cột Ngày giờ)"""
+    return f'{year:04d}-{month:02d}-01'
+
+def next_month(year: int, month: int) -> Month:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+def period_bounds(month: Optional[int], year: Optional[int]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Khoảng [start, end) của kỳ thống kê tháng/năm
+
+    Returns:
+        (start, end) dạng 'YYYY-MM-DD'; (None, None) nếu kỳ không giới hạn theo thời gian
+        (tất cả, hoặc chỉ có tháng mà không có năm)
+    """
+    if year and month:
+        return month_start(year, month), month_start(*next_month(year, month))
+    if year:
+        return month_start(year, 1), month_start(year + 1, 1)
+    return None, None
+
+class TransactionPartitions:
+    """
+    Các worksheet giao dịch chia theo tháng ('Giao dịch 2026-10', ...)
+
+    Mỗi giao dịch nằm ở partition của tháng trong cột Ngày giờ, nên truy vấn 1 kỳ
+    chỉ cần đọc các partition giao với kỳ đó. Danh sách partition lấy từ metadata
+    spreadsheet lúc khởi động, được cập nhật khi tạo/xóa partition.
+    """
+
+    def __init__(self, spreadsheet, base_title: str, header: List[str],
+                 sheets_call: Callable, worksheets: Iterable = ()):
+        """
+        Args:
+            spreadsheet: gspread.Spreadsheet
+            base_title: Tên sheet giao dịch gốc (tiền tố của tên partition)
+            header: Dòng header của partition mới
+            sheets_call: GoogleSheetsService._sheets_call (quota + retry + metrics)
+            worksheets: Các worksheet hiện có; worksheet không phải partition bị bỏ qua
+        """
+        self.spreadsheet = spreadsheet
+        self.base_title = base_title
+        self.header = header
+        self._sheets_call = sheets_call
+        self.worksheets: Dict[Month, object] = {}
+        self.reload(worksheets)
+
+    def reload(self, worksheets: Iterable) -> None:
+        """Thay danh sách partition bằng các worksheet partition trong worksheets"""
+        partitions = {}
+        for worksheet in worksheets:
+            month = parse_partition_title(self.base_title, worksheet.title)
+            if month is not None:
+                partitions[month] = worksheet
+        # Gán dict mới thay vì sửa tại chỗ: thread đang đọc không thấy danh sách dở dang
+        self.worksheets = partitions
+
+    def discard(self, months: Iterable[Month]) -> None:
+        """Bỏ các tháng khỏi danh sách (không xóa worksheet trên spreadsheet)"""
+        months = set(months)
+        self.worksheets = {month: ws for month, ws in self.worksheets.items() if month not in months}
+
+    def months(self) -> List[Month]:
+        """Các tháng đang có partition, cũ nhất trước"""
+        return sorted(self.worksheets)
+
+    def titles(self) -> List[str]:
+        return [worksheet.title for _, worksheet in sorted(self.worksheets.items())]
+
+    def get(self, year: int, month: int):
+        """Worksheet của tháng, None nếu chưa có"""
+        return self.worksheets.get((year, month))
+
+    def create(self, year: int, month: int) -> Tuple[object, bool]:
+        """
+        Tạo worksheet cho tháng (kèm header)
+
+        Returns:
+            (worksheet, True nếu vừa tạo; False nếu instance khác đã tạo trước)
+        """
+        import gspread
+        title = partition_title(self.base_title, year, month)
+        try:
+            worksheet = self._sheets_call('write', 'add_worksheet', self.spreadsheet.add_worksheet,
+                                          title=title, rows=1000, cols=len(self.header))
+        except gspread.exceptions.APIError:
+            # Instance khác vừa tạo partition này (danh sách partition của instance này đã cũ)
+            worksheet = self._sheets_call('read', 'worksheet', self.spreadsheet.worksheet, title)
+            self.worksheets = {**self.worksheets, (year, month): worksheet}
+            return worksheet, False
+        self._sheets_call('write', 'append_row', worksheet.append_row, self.header)
+        self.worksheets = {**self.worksheets, (year, month): worksheet}
+        return worksheet, True
+
+    def overlapping(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[Month, object]]:
+        """
+        Các partition giao với [start, end), mới nhất trước
+
+        Args:
+            start: Mốc đầu 'YYYY-MM-DD' (None = không giới hạn)
+            end: Mốc cuối 'YYYY-MM-DD', không bao gồm (None = không giới hạn)
+        """
+        result = []
+        for month, worksheet in sorted(self.worksheets.items(), reverse=True):
+            first = month_start(*month)
+            after = month_start(*next_month(*month))
+            if (end is None or first < end) and (start is None or after > start):
+                result.append((month, worksheet))
+        return result
+
+    @staticmethod
+    def current_month(now: Optional[datetime] = None) -> Month:
+        now = now or datetime.now()
+        return now.year, now.month
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Tuple
+
+class MonthlyRollups:
+    """
+    Tổng hợp thu chi theo (user_id, năm, tháng, danh mục, loại)
+
+    Mỗi ô giữ [tổng tiền, số giao dịch]. Thêm 1 giao dịch là O(1);
+    thống kê tháng/năm/toàn bộ chỉ duyệt số tháng có dữ liệu của user,
+    không phụ thuộc số dòng giao dịch.
+    """
+
+    def __init__(self):
+        # user_id -> (year, month) -> (danh_muc, loai) -> [so_tien, so_luong]
+        self._data: Dict[str, Dict[Tuple[int, int], Dict[Tuple[str, str], List]]] = {}
+
+    @staticmethod
+    def parse_period(ngay_gio: str) -> Optional[Tuple[int, int]]:
+        """Lấy (năm, tháng) từ chuỗi 'YYYY-MM-DD HH:MM:SS', None nếu sai format"""
+        try:
+            return int(ngay_gio[0:4]), int(ngay_gio[5:7])
+        except (TypeError, ValueError):
+            return None
+
+    def add(self, user_id: str, year: int, month: int, danh_muc: str, loai: str,
+            so_tien: float, so_luong: int = 1) -> None:
+        """Cộng 1 giao dịch (hoặc 1 nhóm đã tổng hợp) vào rollup"""
+        periods = self._data.setdefault(str(user_id), {})
+        cells = periods.setdefault((year, month), {})
+        cell = cells.get((danh_muc, loai))
+        if cell is None:
+            cells[(danh_muc, loai)] = [so_tien, so_luong]
+        else:
+            cell[0] += so_tien
+            cell[1] += so_luong
+
+    def clear(self) -> None:
+        """Xóa toàn bộ rollup"""
+        self._data = {}
+
+    def statistics(self, user_id: Optional[str] = None, month: Optional[int] = None,
+                   year: Optional[int] = None) -> Dict:
+        """
+        Tính thống kê từ rollup
+
+        Args:
+            user_id: ID người dùng (None = tất cả)
+            month: Tháng (None = tất cả)
+            year: Năm (None = tất cả)
+
+        Returns:
+            Dict chứa total_thu, total_chi, so_luong, danh_muc_stats
+        """
+        if user_id:
+            users = [self._data.get(str(user_id), {})]
+        else:
+            users = list(self._data.values())
+
+        total_thu = 0.0
+        total_chi = 0.0
+        so_luong = 0
+        danh_muc_stats = {}
+        for periods in users:
+            if month and year:
+                selected = [periods.get((year, month), {})]
+            else:
+                selected = [
+                    cells for (y, m), cells in periods.items()
+                    if (not year or y == year) and (not month or m == month)
+                ]
+            for cells in selected:
+                for (danh_muc, loai), (total, count) in cells.items():
+                    danh_muc = danh_muc or 'Khác'
+                    if danh_muc not in danh_muc_stats:
+                        danh_muc_stats[danh_muc] = {'Thu': 0, 'Chi': 0, 'SoLuong': 0}
+                    if loai == 'Thu':
+                        total_thu += total
+                    elif loai == 'Chi':
+                        total_chi += total
+                    danh_muc_stats[danh_muc][loai] = danh_muc_stats[danh_muc].get(loai, 0) + total
+                    danh_muc_stats[danh_muc]['SoLuong'] += count
+                    so_luong += count
+
+        return {
+            'total_thu': total_thu,
+            'total_chi': total_chi,
+            'so_luong': so_luong,
+            'danh_muc_stats': danh_muc_stats,
+        }
+
+    def snapshot(self) -> Dict[Tuple, Tuple[float, int]]:
+        """Trả về dạng phẳng {(user, năm, tháng, danh mục, loại): (tổng, số lượng)}"""
+        flat = {}
+        for user_id, periods in self._data.items():
+            for (year, month), cells in periods.items():
+                for (danh_muc, loai), (total, count) in cells.items():
+                    flat[(user_id, year, month, danh_muc, loai)] = (total, count)
+        return flat
+
+    def diff(self, other: 'MonthlyRollups', tolerance: float = 0.5) -> List[Dict]:
+        """
+        So sánh với 1 rollup khác (ví dụ rollup dựng lại từ sheet)
+
+        Returns:
+            List các ô lệch, mỗi phần tử gồm key, expected (other) và actual (self)
+        """
+        mine = self.snapshot()
+        theirs = other.snapshot()
+        mismatches = []
+        for key in set(mine) | set(theirs):
+            actual = mine.get(key, (0.0, 0))
+            expected = theirs.get(key, (0.0, 0))
+            if abs(actual[0] - expected[0]) > tolerance or actual[1] != expected[1]:
+                mismatches.append({'key': key, 'expected': expected, 'actual': actual})
+        return mismatches
@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+from utils.metrics import metrics
+from utils.logger import get_logger
+
+logger = get_logger('sheets')
+
+class SheetsQuotaError(Exception):
+    """Không lấy được lượt gọi Sheets trong thời gian chờ cho phép, hoặc hết số lần retry khi bị 429"""
+
+class TokenBucket:
+    """
+    Token bucket thread-safe, phục vụ theo thứ tự đến
+
+    Mỗi acquire() đặt trước 1 token (số token có thể âm), nên các request
+    xếp hàng lần lượt theo tốc độ quota thay vì cùng thức dậy tranh nhau.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        """
+        Args:
+            per_minute: Số lượt mỗi phút (0 = không giới hạn)
+            burst: Số lượt được dùng dồn ngay khi bucket đầy
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def acquire(self, max_wait: float) -> float:
+        """
+        Lấy 1 token, chờ nếu cần
+
+        Args:
+            max_wait: Số giây chờ tối đa
+
+        Returns:
+            Số giây đã chờ
+
+        Raises:
+            SheetsQuotaError: Nếu phải chờ lâu hơn max_wait
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                raise SheetsQuotaError(f"quota queue wait {wait:.1f}s exceeds {max_wait:.1f}s")
+            self._tokens -= 1
+            self._waiting += 1
+        try:
+            if wait > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        return wait
+
+    @property
+    def waiting(self) -> int:
+        """Số request đang chờ token"""
+        return self._waiting
+
+class SheetsScheduler:
+    """
+    Điểm chung cho mọi lời gọi Google Sheets: giới hạn theo quota đọc/ghi, retry khi bị 429/5xx
+
+    Quota Sheets API tính theo phút cho từng loại đọc/ghi, nên mỗi loại có 1 token bucket riêng.
+    Quá quota thì request xếp hàng (latency tăng) thay vì nhận 429 rồi báo lỗi cho user;
+    nếu vẫn bị 429/5xx (instance khác dùng chung quota) thì retry với backoff lũy thừa.
+    """
+
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    # Ghi (append_rows, add_worksheet, ...) không idempotent: 500/502/504 hay timeout khi đọc response
+    # có thể xảy ra sau khi Sheets đã ghi, retry sẽ ghi trùng. Chỉ retry khi chắc chắn request chưa được xử lý
+    WRITE_RETRY_STATUS_CODES = (429, 503)
+
+    def __init__(self, read_per_minute: float = 60, write_per_minute: float = 60, burst: int = 10,
+                 max_retries: int = 5, retry_backoff: float = 1.0, max_backoff: float = 32.0,
+                 max_wait: float = 30.0):
+        """
+        Khởi tạo scheduler
+
+        Args:
+            read_per_minute: Số lượt đọc mỗi phút của instance (0 = không giới hạn)
+            write_per_minute: Số lượt ghi mỗi phút của instance (0 = không giới hạn)
+            burst: Số lượt được dùng dồn ngay
+            max_retries: Số lần retry khi gặp 429/5xx hoặc lỗi kết nối (ghi: chỉ 429/503 và lỗi lúc connect)
+            retry_backoff: Thời gian chờ cơ sở (giây) cho lần retry đầu
+            max_backoff: Thời gian chờ tối đa giữa 2 lần thử
+            max_wait: Thời gian tối đa 1 request được xếp hàng chờ quota
+        """
+        self.buckets: Dict[str, TokenBucket] = {
+            'read': TokenBucket(read_per_minute, burst),
+            'write': TokenBucket(write_per_minute, burst),
+        }
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+
+    @staticmethod
+    def error_status(error: Exception) -> Optional[int]:
+        """HTTP status của lỗi gspread (APIError giữ requests.Response), None nếu không có"""
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None)
+
+    @staticmethod
+    def _connect_error(error: Exception) -> bool:
+        """Lỗi ở bước kết nối (timeout khi connect, bị từ chối, không phân giải được tên): request chưa tới Sheets"""
+        if isinstance(error, ConnectionRefusedError):
+            return True
+        try:
+            import requests
+            from urllib3.exceptions import NewConnectionError
+        except ImportError:
+            return False
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+            # requests bọc MaxRetryError, lý do thật nằm ở .reason
+            reason = getattr(error.args[0], 'reason', error.args[0])
+            return isinstance(reason, (NewConnectionError, ConnectionRefusedError))
+        return False
+
+    def _retryable(self, kind: str, error: Exception) -> bool:
+        status = self.error_status(error)
+        if kind == 'write':
+            if status is not None:
+                return status in self.WRITE_RETRY_STATUS_CODES
+            return self._connect_error(error)
+        if status is not None:
+            return status in self.RETRY_STATUS_CODES
+        # requests.ConnectionError / Timeout kế thừa OSError
+        return isinstance(error, OSError)
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Backoff lũy thừa có jitter, tôn trọng Retry-After"""
+        response = getattr(error, 'response', None)
+        retry_after = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass
+        return min(self.max_backoff, self.retry_backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+    def call(self, kind: str, op: str, func: Callable, *args, **kwargs):
+        """
+        Gọi func khi có lượt trong quota, retry nếu lỗi tạm thời
+
+        Args:
+            kind: 'read' hoặc 'write'
+            op: Tên thao tác để gắn nhãn metrics/log
+
+        Raises:
+            SheetsQuotaError: Chờ quota quá max_wait hoặc vẫn bị 429 sau max_retries lần
+            Exception: Lỗi không retry được (hoặc lỗi cuối cùng) từ func
+        """
+        bucket = self.buckets[kind]
+        for attempt in range(self.max_retries + 1):
+            with metrics.stage('sheets_queue_wait'):
+                waited = bucket.acquire(self.max_wait)
+            if waited:
+                metrics.inc('sheets_throttled_total', kind=kind)
+            try:
+                with metrics.stage(f'sheets_{kind}'):
+                    return func(*args, **kwargs)
+            except Exception as e:
+                status = self.error_status(e)
+                if not self._retryable(kind, e):
+                    raise
+                if attempt >= self.max_retries:
+                    if status == 429:
+                        raise SheetsQuotaError(f"{op}: still rate limited after {attempt + 1} attempts") from e
+                    raise
+                metrics.inc('sheets_retries_total', op=op, status=status or 'connection')
+                delay = self._retry_delay(attempt, e)
+                logger.warning("Sheets %s failed (status %s, attempt %d), retrying in %.2fs",
+                               op, status or 'connection', attempt + 1, delay)
+                time.sleep(delay)
+
+    def stats(self) -> Dict:
+        """Số request đang chờ quota theo loại"""
+        return {f'{kind}_waiting': bucket.waiting for kind, bucket in self.buckets.items()}
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple, Union
+from utils.metrics import metrics
+
+# (user_id, month, year) - month/year None = không lọc, giống tham số của get_statistics
+# hoặc (user_id, start, end) - khoảng ngày [start, end) dạng 'YYYY-MM-DD'
+StatsKey = Tuple[str, Optional[Union[int, str]], Optional[Union[int, str]]]
+
+class StatsCache:
+    """
+    Cache LRU cho báo cáo thống kê: giữ cả dict thống kê và nội dung phản hồi đã render
+
+    Entry bị xóa đúng lúc có giao dịch mới của user rơi vào kỳ đó (invalidate),
+    giới hạn theo số entry và tổng dung lượng ước tính.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 1048576, ttl: float = 300):
+        """
+        Khởi tạo cache
+
+        Args:
+            max_entries: Số báo cáo tối đa
+            max_bytes: Tổng dung lượng ước tính tối đa (byte)
+            ttl: Số giây tối đa 1 entry còn dùng được (chặn dữ liệu cũ khi instance khác ghi sheet)
+        """
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: 'OrderedDict[StatsKey, Tuple[Dict, str, int, float]]' = OrderedDict()
+        self._by_user: Dict[str, Set[StatsKey]] = {}
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _estimate_size(stats: Dict, text: str) -> int:
+        return len(text.encode('utf-8')) + len(json.dumps(stats, ensure_ascii=False, default=str).encode('utf-8'))
+
+    @staticmethod
+    def _matches(key: StatsKey, year: Optional[int], month: Optional[int]) -> bool:
+        """Kỳ (year, month) có nằm trong phạm vi của key không (None = mọi kỳ)"""
+        _, key_month, key_year = key
+        if year is None or month is None:
+            return True
+        if isinstance(key_month, str):
+            # Khoảng ngày giao với tháng: start trước đầu tháng sau và end sau ngày đầu tháng
+            period = f'{year:04d}-{month:02d}'
+            return key_month[:7] <= period and key_year > period + '-01'
+        return (key_month is None or key_month == month) and (key_year is None or key_year == year)
+
+    def _remove_locked(self, key: StatsKey):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[2]
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def version(self, user_id: str) -> Tuple[int, int]:
+        """Version dữ liệu của user, lấy trước khi tính thống kê để truyền vào put()"""
+        with self._lock:
+            return self._epoch, self._versions.get(str(user_id), 0)
+
+    def get(self, key: StatsKey) -> Optional[Tuple[Dict, str]]:
+        """
+        Lấy báo cáo đã cache
+
+        Returns:
+            (stats, text) hoặc None nếu chưa có / đã hết hạn
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[3] < self.ttl:
+                self._entries.move_to_end(key)
+                metrics.inc('cache_hits_total', cache='statistics')
+                return entry[0], entry[1]
+            if entry is not None:
+                self._remove_locked(key)
+        metrics.inc('cache_misses_total', cache='statistics')
+        return None
+
+    def put(self, key: StatsKey, stats: Dict, text: str, version: Tuple[int, int]):
+        """
+        Lưu báo cáo, bỏ qua nếu dữ liệu của user đã thay đổi kể từ lúc lấy version
+
+        Args:
+            key: (user_id, month, year) hoặc (user_id, start, end)
+            stats: Dict thống kê
+            text: Nội dung phản hồi đã render
+            version: Giá trị version(user_id) lấy trước khi tính stats
+        """
+        size = self._estimate_size(stats, text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if (self._epoch, self._versions.get(key[0], 0)) != version:
+                return
+            self._remove_locked(key)
+            self._entries[key] = (stats, text, size, time.monotonic())
+            self._by_user.setdefault(key[0], set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._entries)))
+
+    def invalidate(self, user_id: str, year: Optional[int] = None, month: Optional[int] = None):
+        """
+        Xóa các báo cáo của user có chứa kỳ (year, month)
+
+        Args:
+            user_id: User vừa có giao dịch mới
+            year, month: Kỳ của giao dịch (None = xóa mọi báo cáo của user)
+        """
+        user_id = str(user_id)
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for key in [k for k in self._by_user.get(user_id, ()) if self._matches(k, year, month)]:
+                self._remove_locked(key)
+
+    def clear(self):
+        """Xóa toàn bộ (sau khi đối chiếu lại cả sheet)"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_user.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,436 @@
+import threading
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Deque, Dict, List, Optional, Protocol, Tuple
+from config import (
+    STORAGE_BACKEND, STORAGE_SQLITE_PATH, STORAGE_MIRROR_TO_SHEETS,
+    STORAGE_MIRROR_BATCH_SIZE, STORAGE_MIRROR_RETRY_SECONDS
+)
+from utils.logger import get_logger
+
+logger = get_logger('storage')
+
+TRANSACTION_HEADER = ['Ngày giờ', 'Loại', 'Số tiền', 'Danh mục', 'Ghi chú', 'User ID']
+
+# Danh mục mặc định: dùng khi tạo sheet 'Danh mục' và cho engine cục bộ chưa có danh mục nào
+DEFAULT_CATEGORIES = [
+    ['Ăn uống', 'Chi', ''],
+    ['Lương', 'Thu', ''],
+    ['Mua sắm', 'Chi', ''],
+    ['Giao thông', 'Chi', ''],
+    ['Giải trí', 'Chi', ''],
+    ['Khác', 'Cả hai', '']
+]
+
+# Mirror chạy trên instance mới (store rỗng): nạp tối đa chừng này giao dịch cũ từ Google Sheets
+MIRROR_SEED_LIMIT = 1_000_000
+
+def transaction_row(transaction: Dict[str, any], user_id: str) -> List:
+    """Dòng giao dịch theo thứ tự TRANSACTION_HEADER (ngay_gio có sẵn khi nhập bù, nếu không lấy thời điểm hiện tại)"""
+    return [
+        transaction.get('ngay_gio') or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),  # Ngày giờ
+        transaction.get('loai', ''),  # Loại
+        transaction.get('so_tien', 0), # Số tiền
+        transaction.get('danh_muc', ''), # Danh mục
+        transaction.get('ghi_chu', ''),  # Ghi chú
+        user_id                        # User ID
+    ]
+
+def _empty_statistics() -> Dict:
+    return {'total_thu': 0, 'total_chi': 0, 'so_luong': 0, 'danh_muc_stats': {}, 'transactions': []}
+
+class TransactionStorage(Protocol):
+    """
+    Interface chung của nơi lưu giao dịch (GoogleSheetsService, SQLiteStorage, MemoryStorage, MirroredStorage)
+
+    Handler chỉ dùng các method này, nên đổi backend bằng STORAGE_BACKEND không phải sửa handler.
+    Giao dịch trả về theo format get_all_records() của sheet ('Ngày giờ', 'Loại', ...),
+    thống kê theo format GoogleSheetsService.get_statistics().
+    """
+
+    def add_transaction(self, transaction: Dict[str, any], user_id: str = 'default') -> bool: ...
+
+    def add_transactions(self, transactions: List[Dict[str, any]], user_id: str = 'default') -> bool: ...
+
+    def get_transactions(self, user_id: str = 'default', limit: int = 100) -> List[Dict]: ...
+
+    def get_statistics(self, user_id: str = 'default', month: Optional[int] = None,
+                       year: Optional[int] = None) -> Dict: ...
+
+    def get_statistics_report(self, user_id: str, month: Optional[int], year: Optional[int],
+                              render: Callable[[Dict], str]) -> Tuple[Dict, str]: ...
+
+    def get_range_statistics_report(self, user_id: str, start: date, end: date,
+                                    render: Callable[[Dict], str]) -> Tuple[Dict, str]: ...
+
+    def get_categories(self) -> List[str]: ...
+
+    def get_nlp_processor(self): ...
+
+    def invalidate_categories(self): ...
+
+    def flush_writes(self): ...
+
+    def queue_stats(self) -> Dict: ...
+
+    def close(self): ...
+
+class LocalStorage:
+    """
+    Lưu giao dịch trên 1 store cục bộ, không gọi Google Sheets
+
+    Store là LocalReplica (SQLite) hoặc ColumnarStore (bộ nhớ): cùng interface
+    last_row/apply_rows/get_*, số dòng chỉ dùng làm khóa tăng dần. Thống kê đọc từ
+    rollup/DateIndex có sẵn của store nên không cần stats cache.
+    """
+
+    def __init__(self, store, categories: Optional[List[str]] = None):
+        """
+        Args:
+            store: LocalReplica hoặc ColumnarStore
+            categories: Danh mục ban đầu (None = DEFAULT_CATEGORIES)
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._categories = list(categories or [cat[0] for cat in DEFAULT_CATEGORIES])
+        # Danh mục chỉ đổi qua set_categories, nên không cần hết hạn theo thời gian
+        from services.category_cache import CategoryCache
+        self.category_cache = CategoryCache(lambda: list(self._categories), ttl=float('inf'))
+
+    def is_empty(self) -> bool:
+        return self.store.last_row <= self.store.HEADER_ROWS
+
+    def append_rows(self, rows: List[List]) -> int:
+        """Ghi các dòng (thứ tự TRANSACTION_HEADER) bằng 1 lần apply_rows (1 executemany + 1 commit với SQLite)"""
+        with self._lock:
+            return self.store.apply_rows(self.store.last_row + 1, rows)
+
+    def add_transactions(self, transactions: List[Dict[str, any]], user_id: str = 'default') -> bool:
+        """
+        Thêm nhiều giao dịch trong 1 lần ghi
+
+        Returns:
+            True nếu thành công, False nếu có lỗi
+        """
+        if not transactions:
+            return True
+        try:
+            self.append_rows([transaction_row(t, user_id) for t in transactions])
+            return True
+        except Exception as e:
+            logger.error("Error adding transactions: %s", e)
+            return False
+
+    def add_transaction(self, transaction: Dict[str, any], user_id: str = 'default') -> bool:
+        return self.add_transactions([transaction], user_id)
+
+    def get_transactions(self, user_id: str = 'default', limit: int = 100) -> List[Dict]:
+        try:
+            return self.store.get_transactions(user_id, limit)
+        except Exception as e:
+            logger.error("Error getting transactions: %s", e)
+            return []
+
+    def get_statistics(self, user_id: str = 'default', month: Optional[int] = None,
+                       year: Optional[int] = None) -> Dict:
+        try:
+            return self.store.get_statistics(user_id, month, year)
+        except Exception as e:
+            logger.error("Error getting statistics: %s", e)
+            return _empty_statistics()
+
+    def get_statistics_report(self, user_id: str, month: Optional[int], year: Optional[int],
+                              render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        stats = self.get_statistics(user_id, month, year)
+        return stats, render(stats)
+
+    def get_range_statistics_report(self, user_id: str, start: date, end: date,
+                                    render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        """Thống kê theo khoảng ngày [start, end) kèm nội dung phản hồi"""
+        try:
+            stats = self.store.get_range_statistics(user_id, start.isoformat(), end.isoformat())
+        except Exception as e:
+            logger.error("Error getting statistics: %s", e)
+            stats = _empty_statistics()
+        return stats, render(stats)
+
+    def get_categories(self) -> List[str]:
+        return self.category_cache.get()[1]
+
+    def get_nlp_processor(self):
+        return self.category_cache.get_processor()
+
+    def invalidate_categories(self):
+        self.category_cache.invalidate()
+
+    def set_categories(self, categories: List[str]):
+        """Thay danh sách danh mục (NLPProcessor được dựng lại ở lần dùng tiếp theo nếu có thay đổi)"""
+        categories = [cat for cat in categories if cat]
+        if categories and categories != self._categories:
+            self._categories = categories
+            self.category_cache.invalidate()
+
+    def flush_writes(self):
+        """Không có gì phải chờ: mỗi lần ghi đã vào store trước khi trả về"""
+
+    def queue_stats(self) -> Dict:
+        return {}
+
+    def close(self):
+        """Store cục bộ không giữ dữ liệu chờ ghi"""
+
+class SQLiteStorage(LocalStorage):
+    """
+    Engine SQLite: bảng transactions của LocalReplica (index theo user + ngày/tháng, WAL),
+    mỗi lần ghi là 1 executemany + 1 commit. Dữ liệu còn nguyên sau khi khởi động lại.
+    """
+
+    def __init__(self, db_path: str, categories: Optional[List[str]] = None):
+        from services.local_replica import LocalReplica
+        super().__init__(LocalReplica(db_path), categories)
+
+    def close(self):
+        """Đóng kết nối SQLite"""
+        self.store.close()
+
+class MemoryStorage(LocalStorage):
+    """Engine trong bộ nhớ (ColumnarStore): nhanh nhất, mất dữ liệu khi tắt process - dùng cho test/benchmark"""
+
+    def __init__(self, categories: Optional[List[str]] = None):
+        from services.columnar_store import ColumnarStore
+        super().__init__(ColumnarStore(), categories)
+
+class MirroredStorage:
+    """
+    Ghi vào engine cục bộ trước, sao chép sang Google Sheets ở background
+
+    Request chỉ chờ lần ghi cục bộ; mọi lần đọc (giao dịch, thống kê, danh mục) cũng từ engine cục bộ.
+    1 thread đẩy hàng đợi lên Sheets theo lô (nhóm theo user, mỗi nhóm 1 lần add_transactions),
+    lỗi thì giữ thứ tự và thử lại sau STORAGE_MIRROR_RETRY_SECONDS. Danh mục lấy từ sheet 'Danh mục'.
+    Store cục bộ rỗng (instance mới, engine memory) thì nạp lịch sử từ Sheets trước khi sao chép;
+    giao dịch mới trong lúc chưa nạp xong được giữ lại và ghi cục bộ ngay sau lịch sử.
+
+    Hàng đợi chỉ nằm trong bộ nhớ: process bị kill thì các giao dịch chưa sao chép chỉ còn ở
+    engine cục bộ. Chỉ dùng cho server thường trực (trên Vercel function bị đóng băng sau response).
+    """
+
+    def __init__(self, local: LocalStorage, remote_factory: Callable[[], TransactionStorage],
+                 batch_size: int = 200, retry_delay: float = 5.0):
+        """
+        Args:
+            local: Engine cục bộ (SQLiteStorage/MemoryStorage)
+            remote_factory: Hàm tạo GoogleSheetsService (gọi trong thread sao chép, không chặn request)
+            batch_size: Số giao dịch tối đa mỗi lượt sao chép
+            retry_delay: Số giây chờ trước khi thử lại khi Sheets lỗi
+        """
+        self.local = local
+        self.remote = None
+        self._remote_factory = remote_factory
+        self.batch_size = max(1, batch_size)
+        self.retry_delay = retry_delay
+        self._needs_seed = local.is_empty()
+        self._pending: Deque[Tuple[str, Dict]] = deque()
+        # Dòng ghi trong lúc chưa nạp xong lịch sử (ghi cục bộ sau lịch sử để giữ thứ tự)
+        self._held: List[List] = []
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.replicated = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name='storage-mirror', daemon=True)
+        self._thread.start()
+
+    def add_transactions(self, transactions: List[Dict[str, any]], user_id: str = 'default') -> bool:
+        """
+        Ghi cục bộ rồi xếp hàng sao chép sang Sheets
+
+        Returns:
+            Kết quả ghi cục bộ (lỗi sao chép không làm request thất bại)
+        """
+        if not transactions:
+            return True
+        # Chốt ngày giờ 1 lần để bản trên Sheets trùng với bản cục bộ
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        stamped = [{**t, 'ngay_gio': t.get('ngay_gio') or now} for t in transactions]
+        with self._cond:
+            if self._needs_seed:
+                # Chưa nạp xong lịch sử: giữ lại, _connect ghi cục bộ ngay sau lịch sử
+                self._held.extend(transaction_row(t, user_id) for t in stamped)
+                self._pending.extend((user_id, t) for t in stamped)
+                self._cond.notify_all()
+                return True
+        if not self.local.add_transactions(stamped, user_id):
+            return False
+        with self._cond:
+            self._pending.extend((user_id, t) for t in stamped)
+            self._cond.notify_all()
+        return True
+
+    def add_transaction(self, transaction: Dict[str, any], user_id: str = 'default') -> bool:
+        return self.add_transactions([transaction], user_id)
+
+    def get_transactions(self, user_id: str = 'default', limit: int = 100) -> List[Dict]:
+        return self.local.get_transactions(user_id, limit)
+
+    def get_statistics(self, user_id: str = 'default', month: Optional[int] = None,
+                       year: Optional[int] = None) -> Dict:
+        return self.local.get_statistics(user_id, month, year)
+
+    def get_statistics_report(self, user_id: str, month: Optional[int], year: Optional[int],
+                              render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        return self.local.get_statistics_report(user_id, month, year, render)
+
+    def get_range_statistics_report(self, user_id: str, start: date, end: date,
+                                    render: Callable[[Dict], str]) -> Tuple[Dict, str]:
+        return self.local.get_range_statistics_report(user_id, start, end, render)
+
+    def get_categories(self) -> List[str]:
+        return self.local.get_categories()
+
+    def get_nlp_processor(self):
+        return self.local.get_nlp_processor()
+
+    def invalidate_categories(self):
+        if self.remote is not None:
+            self.remote.invalidate_categories()
+        self.local.invalidate_categories()
+
+    def _connect(self):
+        """Tạo GoogleSheetsService (lần đầu), nạp lịch sử nếu store cục bộ rỗng, cập nhật danh mục"""
+        if self.remote is None:
+            self.remote = self._remote_factory()
+        if self._needs_seed:
+            # _read_records báo lỗi thay vì trả [] như get_transactions: lỗi thì lần sau nạp lại
+            records = self.remote._read_records()
+            records.sort(key=lambda record: str(record.get('Ngày giờ', '')))
+            rows = [[record.get(column, '') for column in TRANSACTION_HEADER]
+                    for record in records[-MIRROR_SEED_LIMIT:]]
+            with self._cond:
+                self.local.append_rows(rows + self._held)
+                self._held = []
+                self._needs_seed = False
+            logger.info("Loaded %s transactions from Google Sheets into local storage", len(rows))
+        # Đọc qua cache danh mục của GoogleSheetsService: chỉ gọi Sheets khi hết TTL
+        self.local.set_categories(self.remote.get_categories())
+
+    def _try_connect(self) -> bool:
+        try:
+            self._connect()
+            return True
+        except Exception as e:
+            logger.warning("Could not connect to Google Sheets for mirroring: %s", e)
+            return False
+
+    def _replicate(self, batch: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict]]:
+        """
+        Ghi 1 lô lên Sheets
+
+        Returns:
+            Các giao dịch chưa ghi được (nhóm user đã ghi xong không bị ghi lại khi thử lại)
+        """
+        groups: Dict[str, List[Dict]] = {}
+        for user_id, transaction in batch:
+            groups.setdefault(user_id, []).append(transaction)
+        if not self._try_connect():
+            return batch
+        remaining = []
+        for user_id, transactions in groups.items():
+            if remaining or not self.remote.add_transactions(transactions, user_id=user_id):
+                remaining.extend((user_id, t) for t in transactions)
+        return remaining
+
+    def _run(self):
+        # Kết nối sớm để lấy danh mục/lịch sử trước khi có giao dịch đầu tiên,
+        # chưa nạp được lịch sử thì thử lại cả khi không có giao dịch nào chờ sao chép
+        while not self._try_connect() and self._needs_seed:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self.retry_delay)
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._inflight = len(batch)
+            remaining = self._replicate(batch)
+            with self._cond:
+                self._inflight = 0
+                self.replicated += len(batch) - len(remaining)
+                # Trả phần lỗi về đầu hàng đợi, giữ thứ tự ghi
+                self._pending.extendleft(reversed(remaining))
+                self._cond.notify_all()
+                if remaining:
+                    self.failures += 1
+                    if self._closed:
+                        return
+                    self._cond.wait(self.retry_delay)
+
+    def pending(self) -> int:
+        """Số giao dịch chưa sao chép sang Sheets"""
+        with self._cond:
+            return len(self._pending) + self._inflight
+
+    def flush_writes(self, timeout: float = 30) -> bool:
+        """
+        Chờ hàng đợi sao chép rỗng
+
+        Returns:
+            True nếu mọi giao dịch đã lên Sheets trước khi hết timeout
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._pending and not self._inflight, timeout)
+            return not self._pending and not self._inflight
+
+    def queue_stats(self) -> Dict:
+        stats = self.remote.queue_stats() if self.remote is not None else {}
+        with self._cond:
+            stats.update({
+                'mirror_pending': len(self._pending) + self._inflight,
+                'mirror_replicated': self.replicated,
+                'mirror_failures': self.failures,
+            })
+        return stats
+
+    def close(self, timeout: float = 30):
+        """Sao chép nốt hàng đợi (tối đa timeout giây) rồi dừng thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        left = self.pending()
+        if self._held:
+            logger.warning("%s transactions were not saved: history was never loaded from Google Sheets",
+                           len(self._held))
+        elif left:
+            logger.warning("%s transactions were saved locally but not mirrored to Google Sheets", left)
+        if self.remote is not None:
+            self.remote.close()
+        self.local.close()
+
+def create_storage() -> TransactionStorage:
+    """
+    Tạo nơi lưu giao dịch theo STORAGE_BACKEND ('sheets' | 'sqlite' | 'memory')
+
+    sqlite/memory kèm STORAGE_MIRROR_TO_SHEETS=true thì ghi cục bộ và sao chép sang Google Sheets.
+    """
+    if STORAGE_BACKEND == 'sheets':
+        from services.google_sheets import GoogleSheetsService
+        return GoogleSheetsService()
+    if STORAGE_BACKEND == 'sqlite':
+        local = SQLiteStorage(STORAGE_SQLITE_PATH)
+    elif STORAGE_BACKEND == 'memory':
+        local = MemoryStorage()
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    if not STORAGE_MIRROR_TO_SHEETS:
+        return local
+
+    def remote_factory():
+        from services.google_sheets import GoogleSheetsService
+        return GoogleSheetsService()
+
+    return MirroredStorage(local, remote_factory, batch_size=STORAGE_MIRROR_BATCH_SIZE,
+                           retry_delay=STORAGE_MIRROR_RETRY_SECONDS)
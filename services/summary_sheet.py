@@ -0,0 +1,98 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+from services.rollups import MonthlyRollups
+
+# Dòng 1 của sheet tổng hợp; dữ liệu do công thức ở A2 tự tính
+SUMMARY_HEADER = ['User ID', 'Tháng', 'Danh mục', 'Loại', 'Tổng tiền', 'Số giao dịch']
+SUMMARY_RANGE = 'A2:F'
+# Sheet lưu trữ: tổng hợp tĩnh của các partition đã nén, cột cuối là sheetId của partition nguồn
+ARCHIVE_HEADER = SUMMARY_HEADER + ['Nguồn']
+ARCHIVE_RANGE = 'A2:G'
+
+def summary_formula(source_titles: List[str]) -> str:
+    """
+    Công thức QUERY tổng hợp các sheet giao dịch theo (user, tháng 'YYYY-MM', danh mục, loại)
+
+    Google Sheets tự tính lại mỗi khi sheet giao dịch thay đổi, nên mọi instance
+    (và cả dòng nhập tay) đều thấy cùng 1 tổng hợp mà không phải tự cập nhật.
+    Cột ngày giờ có thể là chuỗi (ghi RAW) hoặc ngày thật (nhập tay), nên lấy tháng theo cả 2 kiểu.
+
+    Args:
+        source_titles: Sheet giao dịch gốc và các partition theo tháng (nếu có)
+    """
+    sheets = ["'" + title.replace("'", "''") + "'" for title in source_titles]
+
+    def column(letter: str) -> str:
+        refs = [f'{sheet}!{letter}2:{letter}' for sheet in sheets]
+        return refs[0] if len(refs) == 1 else '{' + '; '.join(refs) + '}'
+
+    columns = ', '.join([
+        f"TO_TEXT({column('F')})",
+        f"IF(ISNUMBER({column('A')}), TEXT({column('A')}, \"yyyy-mm\"), LEFT({column('A')}, 7))",
+        column('D'),
+        column('B'),
+        f"IFERROR({column('C')} * 1, 0)",
+    ])
+    query = ("select Col1, Col2, Col3, Col4, sum(Col5), count(Col5) where Col2 <> '' "
+             "group by Col1, Col2, Col3, Col4 label sum(Col5) '', count(Col5) ''")
+    return f'=QUERY(ARRAYFORMULA({{{columns}}}), "{query}", 0)'
+
+def summary_rollups(rows: List[List], user_id: Optional[str] = None) -> MonthlyRollups:
+    """
+    Dựng MonthlyRollups từ các dòng của sheet tổng hợp
+
+    Args:
+        rows: Giá trị vùng SUMMARY_RANGE (UNFORMATTED_VALUE)
+        user_id: Chỉ lấy dòng của user này (None = tất cả)
+    """
+    rollups = MonthlyRollups()
+    for row in rows:
+        row = list(row) + [''] * (6 - len(row))
+        row_user, period, danh_muc, loai, total, count = row[:6]
+        if user_id and str(row_user) != str(user_id):
+            continue
+        parsed = MonthlyRollups.parse_period(str(period))
+        if parsed is None:
+            continue
+        try:
+            rollups.add(str(row_user), parsed[0], parsed[1], str(danh_muc), str(loai),
+                        float(total or 0), int(float(count or 0)))
+        except (TypeError, ValueError):
+            continue
+    return rollups
+
+def archive_rows(values: List[List], source_id) -> List[List]:
+    """
+    Nén các dòng giao dịch (không gồm header) thành dòng lưu trữ theo (user, tháng, danh mục, loại)
+
+    Args:
+        values: Giá trị các dòng của 1 partition
+        source_id: sheetId của partition, để lần nén lại không cộng trùng
+    """
+    groups = defaultdict(lambda: [0.0, 0])
+    for row in values:
+        row = list(row) + [''] * (6 - len(row))
+        ngay_gio, loai, so_tien, danh_muc, _, user_id = row[:6]
+        if MonthlyRollups.parse_period(str(ngay_gio or '')) is None:
+            continue
+        try:
+            so_tien = float(so_tien or 0)
+        except (TypeError, ValueError):
+            so_tien = 0.0
+        cell = groups[(str(user_id), str(ngay_gio)[:7], str(danh_muc), str(loai))]
+        cell[0] += so_tien
+        cell[1] += 1
+    return [list(key) + cell + [str(source_id)] for key, cell in sorted(groups.items())]
+
+def summary_statistics(rows: List[List], user_id: Optional[str], month: Optional[int],
+                       year: Optional[int]) -> Dict:
+    """
+    Thống kê tháng/năm từ sheet tổng hợp (và sheet lưu trữ, cùng format 6 cột đầu)
+
+    Returns:
+        Dict cùng format với GoogleSheetsService.get_statistics(); 'transactions' rỗng
+        vì sheet tổng hợp không giữ từng giao dịch
+    """
+    stats = summary_rollups(rows, user_id).statistics(user_id, month, year)
+    stats['transactions'] = []
+    return stats
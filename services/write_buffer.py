@@ -0,0 +1,126 @@
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+from utils.logger import get_logger
+
+logger = get_logger('sheets')
+
+class WriteBuffer:
+    """
+    Bộ đệm ghi: gom nhiều dòng lại và ghi bằng 1 lần append_rows
+
+    Mỗi dòng được submit nhận về 1 Future, kết quả là True/False
+    tùy lần flush chứa dòng đó thành công hay không.
+    Chỉ có 1 dòng chờ thì flush ngay (instance vắng/serverless không phải chờ lô không bao giờ đầy);
+    các dòng đến trong lúc đang flush được gom vào lần append_rows tiếp theo.
+    """
+
+    def __init__(self, flush_func: Callable[[List[List]], None],
+                 max_rows: int = 20, max_delay: float = 0.2):
+        """
+        Khởi tạo bộ đệm
+
+        Args:
+            flush_func: Hàm ghi 1 batch dòng (ví dụ worksheet.append_rows), raise nếu lỗi
+            max_rows: Flush ngay khi số dòng chờ đạt ngưỡng này
+            max_delay: Số giây tối đa 1 dòng được phép chờ trước khi flush khi có nhiều dòng cùng chờ
+        """
+        self.flush_func = flush_func
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[List, Future, float]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        atexit.register(self.close)
+
+    def submit(self, row: List) -> Future:
+        """
+        Thêm 1 dòng vào hàng chờ
+
+        Args:
+            row: Giá trị các cột của dòng cần ghi
+
+        Returns:
+            Future trả về True nếu dòng đã được ghi, False nếu lỗi
+        """
+        future = Future()
+        item = (row, future, time.monotonic())
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._pending.append(item)
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='sheets-write-buffer', daemon=True
+                    )
+                    self._thread.start()
+                self._cond.notify()
+        if closed:
+            # Đang shutdown: ghi trực tiếp, không qua worker
+            self._flush_batch([item])
+        return future
+
+    @property
+    def pending_count(self) -> int:
+        """Số dòng đang chờ flush"""
+        with self._cond:
+            return len(self._pending)
+
+    def _take_batch(self) -> List[Tuple[List, Future, float]]:
+        batch = self._pending[:self.max_rows]
+        self._pending = self._pending[self.max_rows:]
+        return batch
+
+    def _run(self):
+        """Worker: không có writer nào khác thì flush ngay, có thì chờ đủ số dòng hoặc hết thời gian"""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0][2] + self.max_delay
+                while 1 < len(self._pending) < self.max_rows and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch: List[Tuple[List, Future, float]]):
+        """Ghi 1 batch và báo kết quả cho từng dòng"""
+        if not batch:
+            return
+        try:
+            self.flush_func([row for row, _, _ in batch])
+            ok = True
+        except Exception as e:
+            logger.error("Error flushing %s buffered rows: %s", len(batch), e)
+            ok = False
+        for _, future, _ in batch:
+            future.set_result(ok)
+
+    def flush(self):
+        """Flush toàn bộ dòng đang chờ ngay trên thread hiện tại"""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._flush_batch(batch)
+
+    def close(self):
+        """Dừng worker và flush các dòng còn lại (gọi khi process shutdown)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=10)
+        self.flush()
@@ -1,25 +1,151 @@
 import requests
-from typing import Optional
-import os
-from config import ZALO_ACCESS_TOKEN, ZALO_OA_ID
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple
+import random
+import time
+from utils.metrics import metrics
+from utils.logger import get_logger, debug_sampled
+from config import (
+    ZALO_ACCESS_TOKEN, ZALO_OA_ID, ZALO_USE_NEW_API,
+    ZALO_POOL_SIZE, ZALO_MAX_RETRIES, ZALO_RETRY_BACKOFF, ZALO_MAX_BACKOFF, ZALO_TIMEOUT, ZALO_API_BASE_URL
+)
 
-class ZaloBotService:
-    """Service để tương tác với Zalo Bot API"""
+logger = get_logger('zalo')
+
+class BaseZaloBotService:
+    """Cấu hình endpoint, payload và chính sách retry dùng chung cho client sync và async"""
+    
+    # Status code được retry (rate limit / lỗi server tạm thời). Lỗi mạng chỉ retry khi chưa kết nối được:
+    # sendMessage không idempotent, timeout khi đọc response có thể là tin đã gửi, retry sẽ gửi trùng
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
     
     def __init__(self):
-        """Khởi tạo service"""
+        """Khởi tạo cấu hình"""
         self.access_token = ZALO_ACCESS_TOKEN
         self.oa_id = ZALO_OA_ID
+        self.max_retries = ZALO_MAX_RETRIES
+        self.retry_backoff = ZALO_RETRY_BACKOFF
+        self.max_backoff = ZALO_MAX_BACKOFF
+        self.timeout = ZALO_TIMEOUT
+        self.pool_size = ZALO_POOL_SIZE
         
-        # Hỗ trợ cả Zalo Bot Platform mới và API cũ
+        # Hỗ trợ cả Zalo Bot Platform mới và API cũ (chọn 1 lần khi khởi tạo)
         # Zalo Bot Platform: https://bot-api.zaloplatforms.com/bot${BOT_TOKEN}/sendMessage
         # API cũ: https://openapi.zalo.me/v2.0/oa/message
-        use_new_api = os.getenv('ZALO_USE_NEW_API', 'false').lower() == 'true'
-        if use_new_api:
-            # URL sẽ được tạo động với BOT_TOKEN trong send_text_message
-            self.api_base = 'https://bot-api.zaloplatforms.com'
+        self.use_new_api = ZALO_USE_NEW_API
+        if self.use_new_api:
+            self.api_base = (ZALO_API_BASE_URL or 'https://bot-api.zaloplatforms.com').rstrip('/')
+            self.api_url = f'{self.api_base}/bot{self.access_token}/sendMessage'
+            self.photo_url = f'{self.api_base}/bot{self.access_token}/sendPhoto'
+            self.headers = {'Content-Type': 'application/json'}
         else:
-            self.api_url = 'https://openapi.zalo.me/v2.0/oa/message'
+            self.api_base = (ZALO_API_BASE_URL or 'https://openapi.zalo.me').rstrip('/')
+            self.api_url = f'{self.api_base}/v2.0/oa/message'
+            self.photo_url = self.api_url
+            self.headers = {
+                'access_token': self.access_token or '',
+                'Content-Type': 'application/json'
+            }
+    
+    def _text_payload(self, user_id: str, message: str) -> Dict:
+        """Payload gửi tin nhắn text theo API đang dùng"""
+        if self.use_new_api:
+            # Zalo Bot Platform API mới theo tài liệu chính thức
+            return {
+                'chat_id': user_id,
+                'text': message
+            }
+        # API cũ
+        return {
+            'recipient': {'user_id': user_id},
+            'message': {'text': message}
+        }
+    
+    def _image_payload(self, user_id: str, image_url: str) -> Dict:
+        """Payload gửi hình ảnh theo API đang dùng"""
+        if self.use_new_api:
+            return {
+                'chat_id': user_id,
+                'photo': image_url
+            }
+        return {
+            'recipient': {'user_id': user_id},
+            'message': {
+                'attachment': {
+                    'type': 'image',
+                    'payload': {
+                        'url': image_url
+                    }
+                }
+            }
+        }
+    
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        """Thời gian chờ trước lần thử tiếp theo: backoff lũy thừa có jitter, tôn trọng Retry-After (tối đa max_backoff)"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return max(0.0, min(self.max_backoff, float(retry_after)))
+                except ValueError:
+                    pass
+        return min(self.max_backoff, self.retry_backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+class ZaloBotService(BaseZaloBotService):
+    """Service để tương tác với Zalo Bot API"""
+    
+    def __init__(self):
+        """Khởi tạo service"""
+        super().__init__()
+        
+        # Session dùng chung: giữ kết nối keep-alive, không bắt tay TCP+TLS lại mỗi lần gửi
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.headers)
+    
+    @staticmethod
+    def _connect_error(error: Exception) -> bool:
+        """Lỗi ở bước kết nối (timeout khi connect, bị từ chối, không phân giải được tên): request chưa được gửi"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if isinstance(error, requests.ConnectionError) and error.args:
+            from urllib3.exceptions import NewConnectionError
+            # requests bọc MaxRetryError, lý do thật nằm ở .reason
+            reason = getattr(error.args[0], 'reason', error.args[0])
+            return isinstance(reason, (NewConnectionError, ConnectionRefusedError))
+        return False
+    
+    def _post(self, url: str, data: Dict) -> Tuple[Optional[requests.Response], Optional[Exception]]:
+        """
+        POST qua session dùng chung, retry khi gặp 429/5xx hoặc lỗi lúc kết nối
+        
+        Returns:
+            (response cuối cùng hoặc None, exception cuối cùng hoặc None)
+        """
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            metrics.inc('zalo_calls_total')
+            try:
+                with metrics.stage('zalo_send'):
+                    response = self.session.post(url, json=data, timeout=self.timeout)
+                error = None
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    return response, None
+                metrics.inc('errors_total', source='zalo', status=response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.inc('errors_total', source='zalo', status='connection')
+                if not self._connect_error(e):
+                    return None, e
+                response = None
+                error = e
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                logger.warning("Zalo request failed (attempt %d), retrying in %.2fs", attempt + 1, delay)
+                time.sleep(delay)
+        return response, error
     
     def send_text_message(self, user_id: str, message: str) -> bool:
         """
@@ -33,59 +159,30 @@ class ZaloBotService:
             True nếu thành công, False nếu có lỗi
         """
         if not self.access_token:
-            print("ZALO_ACCESS_TOKEN not configured")
+            logger.error("ZALO_ACCESS_TOKEN not configured")
             return False
         
-        # Hỗ trợ cả API mới và cũ
-        use_new_api = os.getenv('ZALO_USE_NEW_API', 'false').lower() == 'true'
-        
-        if use_new_api:
-            # Zalo Bot Platform API mới theo tài liệu chính thức
-            # URL: https://bot-api.zaloplatforms.com/bot${BOT_TOKEN}/sendMessage
-            api_url = f'{self.api_base}/bot{self.access_token}/sendMessage'
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            data = {
-                'chat_id': user_id,
-                'text': message
-            }
-        else:
-            api_url = self.api_url
-            # API cũ
-            headers = {
-                'access_token': self.access_token,
-                'Content-Type': 'application/json'
-            }
-            data = {
-                'recipient': {'user_id': user_id},
-                'message': {'text': message}
-            }
+        data = self._text_payload(user_id, message)
         
         try:
-            print(f"🔗 Sending to: {api_url}")
-            print(f"📤 Headers: {headers}")
-            print(f"📤 Data: {data}")
-            
-            response = requests.post(api_url, json=data, headers=headers, timeout=10)
-            print(f"📥 Response status: {response.status_code}")
-            print(f"📥 Response body: {response.text[:500]}")
+            response, error = self._post(self.api_url, data)
+            if response is None:
+                raise error
+            # Không log headers/URL (chứa token); body chỉ ghi khi bật DEBUG và theo sampling
+            debug_sampled(logger, "Zalo response %s: %.500s", response.status_code, response.text)
             
             if response.status_code == 200:
                 result = response.json()
                 if result.get('ok') == True:
-                    print("✅ Message sent successfully")
                     return True
                 else:
-                    print(f"⚠️  API returned ok=false: {result}")
+                    logger.warning("API returned ok=false: %s", result)
                     return False
             else:
-                print(f"❌ Error response: {response.status_code} - {response.text[:500]}")
+                logger.warning("Error response: %s - %.500s", response.status_code, response.text)
                 return False
         except Exception as e:
-            print(f"❌ Error sending Zalo message: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error sending Zalo message: %s", e)
             return False
     
     def send_image(self, user_id: str, image_url: str) -> bool:
@@ -100,30 +197,16 @@ class ZaloBotService:
             True nếu thành công, False nếu có lỗi
         """
         if not self.access_token:
-            print("ZALO_ACCESS_TOKEN not configured")
+            logger.error("ZALO_ACCESS_TOKEN not configured")
             return False
         
-        headers = {
-            'access_token': self.access_token,
-            'Content-Type': 'application/json'
-        }
-        
-        data = {
-            'recipient': {'user_id': user_id},
-            'message': {
-                'attachment': {
-                    'type': 'image',
-                    'payload': {
-                        'url': image_url
-                    }
-                }
-            }
-        }
+        data = self._image_payload(user_id, image_url)
         
         try:
-            response = requests.post(self.api_url, json=data, headers=headers, timeout=10)
+            response, error = self._post(self.photo_url, data)
+            if response is None:
+                raise error
             return response.status_code == 200
         except Exception as e:
-            print(f"Error sending Zalo image: {e}")
+            logger.error("Error sending Zalo image: %s", e)
             return False
-
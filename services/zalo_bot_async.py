@@ -0,0 +1,167 @@
+import asyncio
+from typing import Dict, Iterable, Optional, Tuple
+from services.zalo_bot import BaseZaloBotService
+from utils.metrics import metrics
+from utils.logger import get_logger
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = get_logger('zalo')
+
+class AsyncZaloBotService(BaseZaloBotService):
+    """
+    Client Zalo bất đồng bộ (httpx.AsyncClient) cho các handler async
+
+    Gửi tin không chặn event loop; send_many gửi song song nhiều user
+    với giới hạn số request đồng thời.
+    """
+
+    def __init__(self, concurrency: int = 10):
+        """
+        Khởi tạo service
+
+        Args:
+            concurrency: Số request đồng thời tối đa mặc định cho send_many
+        """
+        if not HTTPX_AVAILABLE:
+            raise ImportError("httpx is required for AsyncZaloBotService. Install with: pip install httpx")
+        super().__init__()
+        self.concurrency = max(1, concurrency)
+        self._client: Optional['httpx.AsyncClient'] = None
+
+    def _get_client(self) -> 'httpx.AsyncClient':
+        """Tạo AsyncClient khi cần (phải tạo trong event loop đang chạy)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            )
+        return self._client
+
+    async def _post(self, url: str, data: Dict) -> Tuple[Optional['httpx.Response'], Optional[Exception]]:
+        """
+        POST bất đồng bộ, retry khi gặp 429/5xx hoặc lỗi lúc kết nối
+
+        Returns:
+            (response cuối cùng hoặc None, exception cuối cùng hoặc None)
+        """
+        client = self._get_client()
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            metrics.inc('zalo_calls_total')
+            try:
+                with metrics.stage('zalo_send'):
+                    response = await client.post(url, json=data)
+                error = None
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    return response, None
+                metrics.inc('errors_total', source='zalo', status=response.status_code)
+            except httpx.TransportError as e:
+                metrics.inc('errors_total', source='zalo', status='connection')
+                # Chỉ retry khi request chưa được gửi (ConnectError/ConnectTimeout/PoolTimeout);
+                # ReadTimeout, RemoteProtocolError... có thể là tin đã gửi
+                if not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+                    return None, e
+                response = None
+                error = e
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                logger.warning("Zalo request failed (attempt %d), retrying in %.2fs", attempt + 1, delay)
+                await asyncio.sleep(delay)
+        return response, error
+
+    async def send_text_message(self, user_id: str, message: str) -> bool:
+        """
+        Gửi tin nhắn text về Zalo
+
+        Args:
+            user_id: ID người dùng
+            message: Nội dung tin nhắn
+
+        Returns:
+            True nếu thành công, False nếu có lỗi
+        """
+        if not self.access_token:
+            logger.error("ZALO_ACCESS_TOKEN not configured")
+            return False
+
+        try:
+            response, error = await self._post(self.api_url, self._text_payload(user_id, message))
+            if response is None:
+                raise error
+            if response.status_code == 200:
+                result = response.json()
+                if result.get('ok') == True:
+                    return True
+                logger.warning("API returned ok=false: %s", result)
+                return False
+            logger.warning("Error response: %s - %.500s", response.status_code, response.text)
+            return False
+        except Exception as e:
+            logger.error("Error sending Zalo message: %s", e)
+            return False
+
+    async def send_image(self, user_id: str, image_url: str) -> bool:
+        """
+        Gửi hình ảnh về Zalo
+
+        Args:
+            user_id: ID người dùng
+            image_url: URL của hình ảnh (phải là public URL)
+
+        Returns:
+            True nếu thành công, False nếu có lỗi
+        """
+        if not self.access_token:
+            logger.error("ZALO_ACCESS_TOKEN not configured")
+            return False
+
+        try:
+            response, error = await self._post(self.photo_url, self._image_payload(user_id, image_url))
+            if response is None:
+                raise error
+            return response.status_code == 200
+        except Exception as e:
+            logger.error("Error sending Zalo image: %s", e)
+            return False
+
+    async def send_many(self, user_ids: Iterable[str], message: str,
+                        concurrency: Optional[int] = None) -> Dict[str, bool]:
+        """
+        Gửi cùng 1 tin nhắn tới nhiều user song song
+
+        Tổng thời gian xấp xỉ request chậm nhất (trong giới hạn concurrency),
+        thay vì tổng thời gian của tất cả request.
+
+        Args:
+            user_ids: Danh sách ID người dùng
+            message: Nội dung tin nhắn
+            concurrency: Số request đồng thời tối đa (None = self.concurrency)
+
+        Returns:
+            Dict user_id -> True/False
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def send_one(user_id: str) -> bool:
+            async with semaphore:
+                return await self.send_text_message(user_id, message)
+
+        results = await asyncio.gather(*(send_one(user_id) for user_id in user_ids))
+        return dict(zip(user_ids, results))
+
+    async def aclose(self):
+        """Đóng connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,136 @@
+"""
+Logging có cấu trúc (JSON mỗi dòng), lọc theo level, format lười và che token
+
+- Dùng logger.debug('... %s', x): chỉ format khi level được bật
+- debug_sampled() chỉ ghi 1 phần sự kiện debug khối lượng lớn (LOG_DEBUG_SAMPLE_RATE)
+- request_log() gom request ID + thời gian từng stage, ghi đúng 1 dòng JSON khi request kết thúc
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import LOG_LEVEL, LOG_DEBUG_SAMPLE_RATE, LOG_JSON
+
+# Che token trong URL Zalo Bot Platform (/bot<TOKEN>/...) và các trường access_token
+_REDACT_PATTERNS = (
+    (re.compile(r'(?<!/)(/bot)[^/\s\'"]+'), r'\1***'),
+    (re.compile(r'((?:access_token|token|secret)[\'"]?\s*[:=]\s*[\'"]?)[^\'",\s}]+', re.IGNORECASE), r'\1***'),
+)
+
+_request_context: contextvars.ContextVar = contextvars.ContextVar('botchitieu_request', default=None)
+
+def redact(text: str) -> str:
+    """Che token/secret trong chuỗi log"""
+    for pattern, replacement in _REDACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi record thành 1 dòng JSON, tự gắn request_id nếu đang trong request"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': redact(record.getMessage()),
+        }
+        context = _request_context.get()
+        if context is not None:
+            payload['request_id'] = context['request_id']
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload['exc'] = redact(self.formatException(record.exc_info))
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Format dạng text cho local dev, vẫn che token"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        context = _request_context.get()
+        if context is not None:
+            text = f"[{context['request_id']}] {text}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + json.dumps(fields, ensure_ascii=False, default=str)
+        return redact(text)
+
+_configured = False
+
+def get_logger(name: str = 'botchitieu') -> logging.Logger:
+    """Lấy logger đã cấu hình (handler stdout, level theo LOG_LEVEL)"""
+    global _configured
+    root = logging.getLogger('botchitieu')
+    if not _configured:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_JSON else TextFormatter('%(levelname)s %(name)s: %(message)s'))
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
+        root.propagate = False
+        _configured = True
+    if name == 'botchitieu' or name.startswith('botchitieu.'):
+        return logging.getLogger(name)
+    return logging.getLogger(f'botchitieu.{name}')
+
+def debug_sampled(logger: logging.Logger, msg: str, *args, rate: Optional[float] = None):
+    """Ghi log debug cho sự kiện khối lượng lớn, chỉ giữ 1 phần theo tỉ lệ sampling"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() < (LOG_DEBUG_SAMPLE_RATE if rate is None else rate):
+        logger.debug(msg, *args)
+
+def record_stage(stage: str, seconds: float):
+    """Cộng thời gian 1 stage vào request hiện tại (nếu có)"""
+    context = _request_context.get()
+    if context is not None:
+        stages = context['stages']
+        stages[stage] = stages.get(stage, 0.0) + seconds * 1000
+
+def request_active() -> bool:
+    """Đang ở trong 1 request_log hay không"""
+    return _request_context.get() is not None
+
+def annotate(**fields):
+    """Thêm trường vào dòng log tổng kết của request hiện tại"""
+    context = _request_context.get()
+    if context is not None:
+        context['fields'].update(fields)
+
+@contextmanager
+def request_log(logger: logging.Logger, request_id: Optional[str] = None, **fields):
+    """
+    Bao 1 request: gắn request_id cho mọi log bên trong và ghi 1 dòng tổng kết khi kết thúc
+
+    Args:
+        logger: Logger để ghi dòng tổng kết
+        request_id: ID có sẵn (ví dụ header X-Request-ID), None = tự sinh
+        fields: Trường thêm vào dòng tổng kết (route, ...)
+    """
+    context = {
+        'request_id': request_id or uuid.uuid4().hex[:12],
+        'stages': {},
+        'fields': dict(fields),
+    }
+    token = _request_context.set(context)
+    start = time.perf_counter()
+    try:
+        yield context
+    finally:
+        summary: Dict = {
+            'event': 'request',
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+            'stages_ms': {k: round(v, 3) for k, v in context['stages'].items()},
+        }
+        summary.update(context['fields'])
+        logger.info('request done', extra={'fields': summary})
+        _request_context.reset(token)
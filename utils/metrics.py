@@ -0,0 +1,156 @@
+"""
+Đo thời gian theo từng stage và đếm số lần gọi Sheets/Zalo, lỗi, cache hit
+Xuất theo định dạng Prometheus text cho endpoint /metrics
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+
+from config import METRICS_ENABLED
+from utils.logger import record_stage, request_active
+
+PREFIX = 'botchitieu_'
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class _NoopTimer:
+    """Timer rỗng khi metrics bị tắt (không đo gì)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_TIMER = _NoopTimer()
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'stage', 'start')
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, labels: LabelKey, stage: str = None):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.registry.enabled:
+            self.registry._observe(self.name, self.labels, elapsed)
+        if self.stage is not None:
+            # Gộp vào dòng log tổng kết của request (utils.logger.request_log)
+            record_stage(self.stage, elapsed)
+        return False
+
+class _Summary:
+    """Tổng, số lần và cửa sổ mẫu gần nhất để tính p50/p95/p99"""
+    __slots__ = ('total', 'count', 'samples')
+
+    def __init__(self, window: int):
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=window)
+
+class MetricsRegistry:
+    """Registry counter + summary (thread-safe), render ra Prometheus text format"""
+
+    def __init__(self, enabled: bool = True, window: int = 1024):
+        """
+        Args:
+            enabled: Tắt thì mọi lời gọi đều là no-op
+            window: Số mẫu gần nhất giữ lại cho mỗi summary để tính quantile
+        """
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, _Summary]] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Tăng counter"""
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Ghi 1 mẫu thời gian vào summary"""
+        if not self.enabled:
+            return
+        self._observe(name, self._key(labels), seconds)
+
+    def _observe(self, name: str, key: LabelKey, seconds: float):
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = _Summary(self.window)
+            summary.total += seconds
+            summary.count += 1
+            summary.samples.append(seconds)
+
+    def timer(self, name: str, **labels):
+        """Context manager đo thời gian 1 khối code"""
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name, self._key(labels))
+
+    def stage(self, stage: str):
+        """Đo thời gian 1 stage của webhook (verify_signature, nlp, sheets_read, ...)"""
+        if not self.enabled and not request_active():
+            return _NOOP_TIMER
+        return _Timer(self, 'stage_seconds', (('stage', stage),), stage)
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = key + extra
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+    @staticmethod
+    def _quantile(sorted_samples, q: float) -> float:
+        if not sorted_samples:
+            return 0.0
+        index = min(len(sorted_samples) - 1, int(q * len(sorted_samples)))
+        return sorted_samples[index]
+
+    def render(self) -> str:
+        """Xuất toàn bộ metrics theo Prometheus text format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {PREFIX}{name} counter')
+                for key, value in series.items():
+                    lines.append(f'{PREFIX}{name}{self._format_labels(key)} {value}')
+            for name, series in sorted(self._summaries.items()):
+                lines.append(f'# TYPE {PREFIX}{name} summary')
+                for key, summary in series.items():
+                    samples = sorted(summary.samples)
+                    for q in QUANTILES:
+                        labels = self._format_labels(key, (('quantile', str(q)),))
+                        lines.append(f'{PREFIX}{name}{labels} {self._quantile(samples, q):.6f}')
+                    lines.append(f'{PREFIX}{name}_sum{self._format_labels(key)} {summary.total:.6f}')
+                    lines.append(f'{PREFIX}{name}_count{self._format_labels(key)} {summary.count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Xóa toàn bộ số liệu"""
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+# Registry dùng chung cho cả process
+metrics = MetricsRegistry(enabled=METRICS_ENABLED)